@@ -1,15 +1,15 @@
-import uiautomation as auto
+import argparse
 import re
 import time
 import subprocess
 import sys
 import os
-import ctypes
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
-try:
-    ctypes.windll.shcore.SetProcessDpiAwareness(1)
-except Exception:
-    ctypes.windll.user32.SetProcessDPIAware()
+import ChallengePreflight
+import SolverStats
+import UiBackend
 
 # --- CONFIGURATION & MAPPINGS ---
 
@@ -32,6 +32,24 @@ RANK_TO_CODE = {
 
 COLUMN_PREFIXES = ["i", "ii", "iii", "iv", "v", "vi", "vii", "viii"]
 
+# Worker threads for the challenge (A*) search of boards DifficultyModel
+# predicts to be hard; the others run the single-threaded solver.
+SOLVER_THREADS = os.cpu_count() or 1
+# Hard memory cap for the solver in MB; 0 leaves the search unbounded.
+SOLVER_MEMORY_MB = 0
+# Compare whole states when detecting duplicates instead of trusting the hash
+# key (slower; the solver's stats count the look-alikes it tells apart).
+SOLVER_EXACT_DUPLICATES = False
+# Time for the quick next-move hint shown while the full solve runs; 0 skips it.
+HINT_BUDGET_MS = 50
+# Full solves running at once when several windows are assisted (--all); the
+# solver threads are split between them.
+SOLVER_WORKERS = 2
+
+WINDOW_REGEX = ".*Solitaire.*"
+
+SOLVER_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "Test", "freecell", "solver")
+
 # --- VISION LOGIC ---
 
 def parse_card_name(name):
@@ -43,13 +61,6 @@ def parse_card_name(name):
         return (NAME_TO_RANK[rank_str], NAME_TO_SUIT[suit_str])
     return None
 
-def get_sorted_children(control):
-    if not control.Exists(0, 0):
-        return []
-    children = control.GetChildren()
-    children.sort(key=lambda c: c.BoundingRectangle.left)
-    return children
-
 def scrape_challenge_info(window):
     challenge_code = "00"
     moves_limit = "0"
@@ -205,11 +216,176 @@ def scrape_challenge_info(window):
 
     return challenge_code, moves_limit
 
-def scrape_game_state():
+def find_windows():
+    """Native handles of every open Solitaire window."""
+    auto = UiBackend.get_auto()
+    handles = []
+    for control in auto.GetRootControl().GetChildren():
+        if control.ControlTypeName == "WindowControl" and re.match(WINDOW_REGEX, control.Name):
+            handles.append(control.NativeWindowHandle)
+    return handles
+
+def get_window(handle=None):
+    """The Solitaire window with this native handle, or the first one."""
+    auto = UiBackend.get_auto()
+    if handle:
+        return auto.ControlFromHandle(handle)
+    return auto.WindowControl(searchDepth=1, RegexName=WINDOW_REGEX)
+
+# A capture taken while cards are animating can miss a card or see one twice.
+# Captures are checked before solving, and the groups that don't add up are
+# read again up to this many times, this far apart.
+CAPTURE_RETRIES = 5
+CAPTURE_RETRY_SECONDS = 0.1
+
+NUM_CARDS = 52
+
+class BoardCapture:
+    """Reads the board of one window, reusing what hasn't changed since the
+    last capture. A tableau column is fingerprinted by the runtime ids of its
+    cards and only read again when that changes; the free cells and
+    foundations keep their elements, so their names are always read. Each
+    element's name and rect is fetched at most once per read."""
+
+    def __init__(self):
+        # key -> (runtime ids, children sorted left to right)
+        self.orders = {}
+        # column key -> (runtime ids, cards top to bottom)
+        self.columns = {}
+        # Keys read from UIA (rather than the cache) by the last pass
+        self.fresh = set()
+
+    def runtime_ids(self, children):
+        return tuple(tuple(child.GetRuntimeId()) for child in children)
+
+    def sorted_children(self, key, container):
+        """Children of a container sorted left to right; rects are only read
+        when the children changed."""
+        if not container.Exists(0, 0):
+            return []
+        children = container.GetChildren()
+        ids = self.runtime_ids(children)
+        cached = self.orders.get(key)
+        if cached and cached[0] == ids:
+            return cached[1]
+        lefts = [child.BoundingRectangle.left for child in children]
+        ordered = [child for _, child in sorted(zip(lefts, children), key=lambda pair: pair[0])]
+        self.orders[key] = (ids, ordered)
+        return ordered
+
+    def read_slots(self, key, group, kid):
+        """Card in each slot of a free cell or foundation group; `kid` picks the
+        child card when the slot itself isn't named after one."""
+        cards = []
+        for slot in self.sorted_children(key, group):
+            card_val = parse_card_name(slot.Name)
+            if not card_val:
+                kids = slot.GetChildren()
+                if kids:
+                    card_val = parse_card_name(kids[kid].Name)
+            cards.append(card_val)
+        self.fresh.add(key)
+        return cards
+
+    def read_column(self, key, column):
+        children = column.GetChildren()
+        ids = self.runtime_ids(children)
+        cached = self.columns.get(key)
+        if cached and cached[0] == ids:
+            return cached[1]
+        read = [(child.BoundingRectangle.top, child.Name) for child in children]
+        read.sort(key=lambda pair: pair[0])
+        cards = [val for val in (parse_card_name(name) for _, name in read) if val]
+        self.columns[key] = (ids, cards)
+        self.fresh.add(key)
+        return cards
+
+    def read(self, window):
+        tableau_group = window.GroupControl(AutomationId="Group_Tableau")
+        freecell_group = window.GroupControl(AutomationId="Group_Free")
+        foundation_group = window.GroupControl(AutomationId="Group_Foundation")
+
+        self.fresh = set()
+        groups = {
+            "freecells": self.read_slots("freecells", freecell_group, 0),
+            "foundation": self.read_slots("foundation", foundation_group, -1),
+        }
+        for idx, stack in enumerate(self.sorted_children("tableau", tableau_group)):
+            groups[("column", idx)] = self.read_column(("column", idx), stack)
+        return groups
+
+    def forget(self, keys):
+        for key in keys:
+            self.columns.pop(key, None)
+            self.orders.pop(key, None)
+
+    def capture(self, window):
+        """(freecells, foundation, tableau) of a consistent board, or None."""
+        for attempt in range(CAPTURE_RETRIES + 1):
+            groups = self.read(window)
+            problems, suspects = check_board(groups)
+            if not problems:
+                columns = [groups[key] for key in sorted(k for k in groups if k[0] == "column")]
+                return groups["freecells"], groups["foundation"], columns
+            print(f"Inconsistent capture: {'; '.join(problems)}")
+            if attempt == CAPTURE_RETRIES:
+                break
+            self.forget(suspects)
+            if attempt == CAPTURE_RETRIES - 1:
+                # Last try: don't trust anything cached.
+                self.forget(list(self.columns) + ["tableau"])
+            # A card in flight is missing until it lands; the column it lands
+            # in changes its fingerprint and is read again on the next pass.
+            time.sleep(CAPTURE_RETRY_SECONDS)
+        return None
+
+def check_board(groups):
+    """(problems, suspect group keys) of a read board: every card must be in
+    exactly one place, counting the cards under each foundation top, and each
+    foundation pile holds its own suit."""
+    problems = []
+    suspects = set()
+    places = {}
+    suits = {}
+    for top in groups["foundation"]:
+        if not top:
+            continue
+        rank, suit = top
+        if suit in suits:
+            problems.append(f"two foundation piles of suit {suit}")
+            suspects.add("foundation")
+        suits[suit] = rank
+        for below in range(1, rank + 1):
+            places.setdefault((below, suit), []).append("foundation")
+    for key, cards in groups.items():
+        if key == "foundation":
+            continue
+        for card in cards:
+            if card:
+                places.setdefault(card, []).append(key)
+
+    columns = [key for key in groups if key[0] == "column"]
+    if len(columns) != len(COLUMN_PREFIXES):
+        problems.append(f"{len(columns)} tableau columns")
+        suspects.add("tableau")
+    for card, keys in places.items():
+        if len(keys) > 1:
+            problems.append(f"{encode_card(card)} seen {len(keys)} times")
+            suspects.update(keys)
+    if len(places) != NUM_CARDS:
+        problems.append(f"{len(places)} of {NUM_CARDS} cards found")
+    return problems, suspects
+
+# BoardCapture per window handle, so later captures of a window only read
+# what changed.
+board_captures = {}
+
+def scrape_game_state(window=None):
     """Scrapes the window and returns a raw dictionary of data"""
+    if window is None:
+        window = get_window()
     # Force focus to Solitaire
-    window = auto.WindowControl(searchDepth=1, RegexName=".*Solitaire.*")
-    if not window.Exists(0, 1):
+    if not window or not window.Exists(0, 1):
         return None
     
     # window.SetFocus() 
@@ -217,52 +393,18 @@ def scrape_game_state():
     # Scrape Challenge Info
     challenge_code, moves_limit = scrape_challenge_info(window)
 
-    # Connect to Groups
-    tableau_group = window.GroupControl(AutomationId="Group_Tableau")
-    freecell_group = window.GroupControl(AutomationId="Group_Free")
-    foundation_group = window.GroupControl(AutomationId="Group_Foundation")
+    board = board_captures.setdefault(window.NativeWindowHandle, BoardCapture()).capture(window)
+    if board is None:
+        return None
+    freecells, foundation, tableau = board
 
     state = {
-        "freecells": [],
-        "foundation": [],
-        "tableau": [],
+        "freecells": freecells,
+        "foundation": foundation,
+        "tableau": tableau,
         "challenge": challenge_code,
         "moves": moves_limit
     }
-
-    # 1. READ FREECELLS
-    fc_elements = get_sorted_children(freecell_group)
-    for cell in fc_elements:
-        card_val = parse_card_name(cell.Name)
-        if not card_val:
-            kids = cell.GetChildren()
-            if kids:
-                card_val = parse_card_name(kids[0].Name)
-        state["freecells"].append(card_val)
-
-    # 2. READ FOUNDATIONS
-    found_elements = get_sorted_children(foundation_group)
-    for pile in found_elements:
-        card_val = parse_card_name(pile.Name)
-        if not card_val:
-            kids = pile.GetChildren()
-            if kids:
-                card_val = parse_card_name(kids[-1].Name)
-        state["foundation"].append(card_val)
-
-    # 3. READ TABLEAU
-    tab_stacks = get_sorted_children(tableau_group)
-    for stack in tab_stacks:
-        col_cards = []
-        card_elements = get_sorted_children(stack)
-        card_elements.sort(key=lambda c: c.BoundingRectangle.top)
-        
-        for card_el in card_elements:
-            val = parse_card_name(card_el.Name)
-            if val:
-                col_cards.append(val)
-        state["tableau"].append(col_cards)
-
     return state
 
 def encode_card(card_tuple):
@@ -304,63 +446,327 @@ def generate_encoded_string(state):
 
     return fc_str + fo_str + tab_str + challenge_str
 
-def main():
-    print("Solitaire Capture & Solve running...")
+# Deal lookups run here, off the capture's critical path: the first one builds
+# the on-disk cache of all deals, which takes a while.
+DEAL_LOOKUP = ThreadPoolExecutor(max_workers=1, thread_name_prefix="deal")
+
+def recognize_deal(state):
+    """Numbered deal the captured tableau comes from, or None."""
+    try:
+        import DealRecognition
+    except ImportError:
+        # Deal recognition needs numpy; without it every board is searched.
+        return None
+    deal, matches = DealRecognition.recognize(state["tableau"])
+    if deal is not None:
+        print(f"Recognized deal #{deal} ({matches}/52 cards in place)")
+    return deal
+
+def start_deal_lookup(state):
+    """Starts recognize_deal in the background for a full solve, where the
+    deal number labels the stored solution and the stats if the lookup is
+    done by the time the solver starts; returns a future, or None for
+    challenges, which skip the lookup."""
+    if state.get("challenge", "00") != "00":
+        return None
+    return DEAL_LOOKUP.submit(recognize_deal, state)
+
+def parse_steps(output):
+    steps = []
+    for line in output.splitlines():
+        # Strip ANSI codes
+        clean_line = re.sub(r'\x1b\[[0-9;]*m', '', line)
+        if clean_line.startswith("Step"):
+            steps.append(clean_line.strip())
+    return steps
+
+def write_steps(steps_file, steps):
+    # The compiled plan goes first: the overlay reloads when the steps file
+    # changes and only uses a plan file written for the same steps.
+    import SolutionOverlay
+    SolutionOverlay.save_plan(SolutionOverlay.plan_file_for(steps_file), SolutionOverlay.compile_plan(steps))
+    # Write to a temporary file first so the overlay never reads a partial plan.
+    tmp_file = steps_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        for step in steps:
+            f.write(step + "\n")
+    os.replace(tmp_file, steps_file)
+
+def solver_path():
+    """solver.exe on Windows; the same sources built as `solver` elsewhere."""
+    exe_path = os.path.join(SOLVER_DIR, "solver.exe")
+    if os.name != "nt" and not os.path.exists(exe_path):
+        return os.path.join(SOLVER_DIR, "solver")
+    return exe_path
+
+def solver_threads(encoded_string, available=SOLVER_THREADS):
+    """Threads for the solver on a board: more than one only if the board is
+    predicted to take long enough for the parallel search to pay off."""
+    try:
+        import DifficultyModel
+    except ImportError:
+        # The difficulty model needs numpy; without it every board runs serial.
+        return 1
+    config = DifficultyModel.choose_config(encoded_string, DifficultyModel.predict([encoded_string])[0], available)
+    return int(config[config.index("-t") + 1]) if "-t" in config else 1
+
+def solver_command(deal=None, threads=1):
+    solver_args = [solver_path(), "-t", str(threads)]
+    if deal is not None:
+        solver_args += ["-d", str(deal)]
+    if SOLVER_MEMORY_MB > 0:
+        solver_args += ["-m", str(SOLVER_MEMORY_MB)]
+    if SOLVER_EXACT_DUPLICATES:
+        solver_args.append("-x")
+    return solver_args
+
+def run_solver(solver_args, encoded_string):
+    """Runs the solver and records its stats. Returns (output, start, end)."""
+    start = time.perf_counter()
+    result = subprocess.run(solver_args + [encoded_string], capture_output=True, text=True)
+    end = time.perf_counter()
+    stats = SolverStats.parse_stats(result.stdout)
+    if stats:
+        SolverStats.record_stats(stats, encoded_string)
+    return result.stdout, start, end
+
+class SolverPool:
+    """Full solves for every session, run on SOLVER_WORKERS threads in the
+    order asked for. A board already being solved for one window (two windows
+    on the same deal) is solved once; the solver's Solutions store is shared
+    by all runs as well."""
+    def __init__(self, workers=SOLVER_WORKERS):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="solver")
+        self.lock = threading.Lock()
+        self.runs = {}
+
+    def submit(self, solver_args, encoded_string):
+        key = (tuple(solver_args), encoded_string)
+        with self.lock:
+            if key not in self.runs:
+                self.runs[key] = self.executor.submit(run_solver, solver_args, encoded_string)
+            return self.runs[key]
+
+    def shutdown(self):
+        self.executor.shutdown(wait=True)
+
+def preflight(encoded_string, log=print):
+    """Checks the challenge against its move limit. Returns None if it can't
+    be met, else (extra solver args, whether a hint is worth running): close to
+    the limit the hint is skipped and the solver gets the bound up front."""
+    verdict, bound = ChallengePreflight.preflight(encoded_string)
+    if verdict != ChallengePreflight.UNLIMITED:
+        log(ChallengePreflight.describe(encoded_string, verdict, bound))
+    if verdict == ChallengePreflight.IMPOSSIBLE:
+        return None
+    if verdict == ChallengePreflight.BORDERLINE:
+        return ["-b", str(bound)], False
+    return [], True
+
+def solve_headless(encoded_string, hint_ms=0, solver=None):
+    """Solves an encoded board without touching the UI and prints the steps.
+    Returns a process exit code."""
+    checked = preflight(encoded_string, log=lambda message: print(message, file=sys.stderr))
+    if checked is None:
+        return 1
+    extra_args, hint_ok = checked
+    solver_args = solver_command(threads=solver_threads(encoded_string)) + extra_args
+    if solver:
+        solver_args[0] = solver
+    if hint_ms > 0 and hint_ok:
+        solver_args += ["-H", str(hint_ms)]
+    try:
+        output, _, _ = run_solver(solver_args, encoded_string)
+    except FileNotFoundError:
+        print(f"Error: solver not found at {solver_args[0]}", file=sys.stderr)
+        return 2
+
+    steps = parse_steps(output)
+    for step in steps:
+        print(step)
+    if not steps:
+        print("No solution found or parsing failed.", file=sys.stderr)
+        return 1
+    return 0
+
+def steps_file_for(handle=None):
+    name = f"current_solution_{handle}.txt" if handle else "current_solution.txt"
+    return os.path.join(os.path.dirname(__file__), name)
+
+def launch_overlay(steps_file, handle=None, hint=False):
+    overlay_script = os.path.join(os.path.dirname(__file__), "SolutionOverlay.py")
+    overlay_args = ["python", overlay_script, steps_file]
+    if handle:
+        overlay_args += ["--window", str(handle)]
+    if hint:
+        overlay_args.append("--hint")
+    subprocess.Popen(overlay_args)
+
+def capture_and_solve(handle=None, pool=None, metrics=None):
+    """Captures one window and solves it. With a pool (several windows), the
+    full solve waits its turn there and `metrics` gets this session's times."""
+    log = print
+    if handle is not None:
+        log = lambda *args: print(f"[window {handle}]", *[str(arg).lstrip("\n") for arg in args])
+    if metrics is None:
+        metrics = {}
+    log("Solitaire Capture & Solve running...")
     
-    state = scrape_game_state()
+    start = time.perf_counter()
+    state = scrape_game_state(get_window(handle))
+    metrics["scrape_ms"] = (time.perf_counter() - start) * 1000
     
-    if state:
+    if not state:
+        log("Could not capture a consistent board.")
+    else:
         encoded_string = generate_encoded_string(state)
         
         # Remove any backticks (PowerShell escape characters) that might have gotten into the string
         encoded_string = encoded_string.replace('`', '')
         
-        print(f"\nCaptured State:")
-        print(encoded_string)
+        log(f"\nCaptured State:")
+        log(encoded_string)
         
-        print("\nRunning Solver...")
+        checked = preflight(encoded_string, log)
+        if checked is None:
+            metrics["total_ms"] = (time.perf_counter() - start) * 1000
+            return
+        extra_args, hint_ok = checked
+
+        log("\nRunning Solver...")
         try:
-            solver_path = os.path.join(os.path.dirname(__file__), "Test", "freecell", "solver", "solver.exe")
-            print(f"Solver Path: {os.path.abspath(solver_path)}")
+            log(f"Solver Path: {solver_path()}")
             
             # Run Solver
-            result = subprocess.run([solver_path, encoded_string], capture_output=True, text=True)
-            output = result.stdout
-            print("--- Raw Solver Output ---")
-            print(output)
-            print("-------------------------")
+            available = SOLVER_THREADS if pool is None else max(1, SOLVER_THREADS // SOLVER_WORKERS)
+            threads = solver_threads(encoded_string, available)
+            deal_lookup = start_deal_lookup(state)
+
+            steps_file = steps_file_for(handle)
+            overlay_launched = False
+
+            # Show a next move straight away; the overlay picks up the full plan
+            # from the same file once the solve below finishes. Hints run on
+            # the session's own thread so they never queue behind full solves.
+            if HINT_BUDGET_MS > 0 and hint_ok:
+                hint_start = time.perf_counter()
+                hint_args = solver_command(None, threads) + extra_args + ["-H", str(HINT_BUDGET_MS)]
+                hint_output, _, _ = run_solver(hint_args, encoded_string)
+                metrics["hint_ms"] = (time.perf_counter() - hint_start) * 1000
+                hint_steps = parse_steps(hint_output)
+                if hint_steps:
+                    log(f"Hint: {hint_steps[-1]}")
+                    write_steps(steps_file, hint_steps)
+                    log("Launching Overlay...")
+                    launch_overlay(steps_file, handle, hint=True)
+                    overlay_launched = True
+
+            # The label is only worth having if it costs the solve nothing.
+            deal = deal_lookup.result() if deal_lookup and deal_lookup.done() else None
+            solver_args = solver_command(deal, threads) + extra_args
+            submitted = time.perf_counter()
+            if pool is None:
+                output, solve_start, solve_end = run_solver(solver_args, encoded_string)
+                log("--- Raw Solver Output ---")
+                log(output)
+                log("-------------------------")
+            else:
+                output, solve_start, solve_end = pool.submit(solver_args, encoded_string).result()
+            metrics["queue_ms"] = max(0.0, solve_start - submitted) * 1000
+            metrics["solve_ms"] = (solve_end - solve_start) * 1000
             
             # Parse Steps
-            steps = []
-            for line in output.splitlines():
-                # Strip ANSI codes
-                clean_line = re.sub(r'\x1b\[[0-9;]*m', '', line)
-                if clean_line.startswith("Step"):
-                    steps.append(clean_line.strip())
+            steps = parse_steps(output)
+            metrics["steps"] = len(steps)
             
             if steps:
-                print(f"Found {len(steps)} steps.")
+                log(f"Found {len(steps)} steps.")
                 
                 # Write to file
-                steps_file = os.path.join(os.path.dirname(__file__), "current_solution.txt")
-                with open(steps_file, "w") as f:
-                    for step in steps:
-                        f.write(step + "\n")
+                write_steps(steps_file, steps)
                 
-                print(f"Solution saved to {steps_file}")
+                log(f"Solution saved to {steps_file}")
                 
                 # Launch Overlay
-                overlay_script = os.path.join(os.path.dirname(__file__), "SolutionOverlay.py")
-                print("Launching Overlay...")
-                subprocess.Popen(["python", overlay_script, steps_file])
+                if not overlay_launched:
+                    log("Launching Overlay...")
+                    launch_overlay(steps_file, handle)
                 
             else:
-                print("No solution found or parsing failed.")
+                log("No solution found or parsing failed.")
+                if overlay_launched:
+                    # An empty plan tells the hint overlay no full plan is coming.
+                    write_steps(steps_file, [])
 
         except FileNotFoundError:
-            print("Error: solver.exe not found.")
+            log("Error: solver.exe not found.")
         except Exception as e:
-            print(f"Error running solver: {e}")
+            log(f"Error running solver: {e}")
+    metrics["total_ms"] = (time.perf_counter() - start) * 1000
+
+def run_session(handle, pool, metrics):
+    # Each window's UIA calls run on its own thread, so a slow window only
+    # delays itself.
+    try:
+        with UiBackend.thread_initializer():
+            capture_and_solve(handle, pool, metrics)
+    except Exception as e:
+        print(f"[window {handle}] Error: {e}")
+
+def print_session_metrics(metrics):
+    print("\nSession latency (ms):")
+    print(f"  {'window':>10} {'scrape':>8} {'hint':>8} {'queue':>8} {'solve':>8} {'total':>8} {'steps':>6}")
+    for handle, m in metrics.items():
+        row = [f"{m[key]:8.0f}" if key in m else f"{'-':>8}"
+               for key in ("scrape_ms", "hint_ms", "queue_ms", "solve_ms", "total_ms")]
+        print(f"  {handle:>10} {' '.join(row)} {m.get('steps', '-'):>6}")
+
+def capture_all():
+    """Assists every open Solitaire window at once."""
+    handles = find_windows()
+    if not handles:
+        print("No Solitaire windows found.")
+        return
+    print(f"Found {len(handles)} Solitaire windows.")
+
+    pool = SolverPool()
+    metrics = {handle: {} for handle in handles}
+    sessions = [threading.Thread(target=run_session, args=(handle, pool, metrics[handle]),
+                                 name=f"session-{handle}")
+                for handle in handles]
+    for session in sessions:
+        session.start()
+    for session in sessions:
+        session.join()
+    pool.shutdown()
+    print_session_metrics(metrics)
+
+def main():
+    parser = argparse.ArgumentParser(description="Capture the Solitaire FreeCell board and solve it")
+    commands = parser.add_subparsers(dest="command")
+
+    solve = commands.add_parser("solve", help="solve an encoded board without the UI")
+    board = solve.add_mutually_exclusive_group(required=True)
+    board.add_argument("--board", help="encoded board, as printed under 'Captured State'")
+    board.add_argument("--stdin", action="store_true", help="read the encoded board from stdin")
+    solve.add_argument("--hint", type=int, default=0, metavar="MS",
+                       help="only find a next move within this many milliseconds")
+    solve.add_argument("--solver", help="solver executable to run")
+
+    windows = parser.add_mutually_exclusive_group()
+    windows.add_argument("--window", type=int, metavar="HANDLE", help="capture this window (native handle)")
+    windows.add_argument("--all", action="store_true", help="capture and solve every Solitaire window")
+
+    args = parser.parse_args()
+    if args.command == "solve":
+        encoded_string = sys.stdin.read() if args.stdin else args.board
+        encoded_string = encoded_string.strip().replace('`', '')
+        return solve_headless(encoded_string, args.hint, args.solver)
+    if args.all:
+        capture_all()
+    else:
+        capture_and_solve(args.window)
+    return 0
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
@@ -0,0 +1,161 @@
+import sys
+
+# Checks a challenge's goal against its move limit before anything is solved.
+# The bound mirrors ChallengeHeuristic::LowerBound in the solver (without the
+# pattern database): under a move limit auto play is off, so every card the
+# goal needs on the foundation costs a move, and every sorted run covering
+# one of those cards must be moved off it at least once.
+
+RANKS = "123456789tjqk"
+SUITS = "cdhs"
+COLUMN_PREFIXES = ["i", "ii", "iii", "iv", "v", "vi", "vii", "viii"]
+
+# A limit at most this many moves above the bound is borderline: the solver
+# searches exactly (see kBorderlineSlack in solver.cc) and the hint is skipped.
+BORDERLINE_SLACK = 2
+
+FEASIBLE = "feasible"
+BORDERLINE = "borderline"
+IMPOSSIBLE = "impossible"
+UNLIMITED = "unlimited"
+
+
+def card_index(code):
+    """Card id (rank * 4 + suit) of a two character card code, or -1 for "00"."""
+    rank = RANKS.find(code[0].lower())
+    suit = SUITS.find(code[1].lower())
+    if rank < 0 or suit < 0:
+        return -1
+    return rank * 4 + suit
+
+
+def parse_board(encoded_string):
+    """Returns (reserve, foundation, columns, challenge, move_limit) of an
+    encoded board; cards are card ids and empty slots are left out."""
+    parts = encoded_string.split("$")
+    deck = parts[0]
+    challenge = parts[1] if len(parts) > 2 else "00"
+    try:
+        move_limit = int(parts[2]) if len(parts) > 2 else 0
+    except ValueError:
+        move_limit = 0
+
+    reserve = [c for c in (card_index(deck[i:i + 2]) for i in range(0, 8, 2)) if c >= 0]
+    foundation = [c for c in (card_index(deck[i:i + 2]) for i in range(8, 16, 2)) if c >= 0]
+
+    # Cards never start with "i" or "v", so a column runs until the next prefix.
+    columns = []
+    pos = 16
+    for col in range(8):
+        if not deck.startswith(COLUMN_PREFIXES[col], pos):
+            raise ValueError(f"Bad board, expected column {COLUMN_PREFIXES[col]} at {pos}: {encoded_string}")
+        pos += len(COLUMN_PREFIXES[col])
+        column = []
+        while pos < len(deck) and deck[pos] not in "iv":
+            column.append(card_index(deck[pos:pos + 2]))
+            pos += 2
+        columns.append(column)
+    return reserve, foundation, columns, challenge, move_limit
+
+
+def parse_targets(challenge):
+    """Returns (targets, required_count) for a challenge code like "3h" (that
+    card) or "52" (two of the fives); targets are (rank, suit) pairs and the
+    list is empty if the code can't be parsed, like ParseTargets in the solver."""
+    if len(challenge) != 2:
+        return [], 0
+    rank_char, type_char = challenge[0].lower(), challenge[1].lower()
+    rank = 0 if rank_char == "a" else RANKS.find(rank_char)
+    if rank < 0:
+        return [], 0
+    if type_char.isdigit():
+        return [(rank, suit) for suit in range(4)], int(type_char)
+    if type_char in SUITS:
+        return [(rank, SUITS.index(type_char))], 1
+    return [], 0
+
+
+def is_below(card, parent):
+    """True if `card` can sit on `parent` in the tableau."""
+    red = lambda c: SUITS[c % 4] in "dh"
+    return red(card) != red(parent) and card // 4 + 1 == parent // 4
+
+
+def lower_bound(foundation, columns, targets, count):
+    """Fewest moves that can bring `count` of the targets to the foundation."""
+    played = [0] * 4
+    for card in foundation:
+        played[card % 4] = card // 4 + 1
+
+    best = None
+    for mask in range(1, 1 << len(targets)):
+        if bin(mask).count("1") != count:
+            continue
+        # Highest rank needed per suit, -1 if the suit is not part of the goal.
+        needed = [-1] * 4
+        for i, (rank, suit) in enumerate(targets):
+            if mask & (1 << i):
+                needed[suit] = max(needed[suit], rank)
+        chain_cards = sum(max(0, needed[s] + 1 - played[s]) for s in range(4))
+        in_chain = lambda card: card // 4 <= needed[card % 4]
+
+        total_runs = 0
+        for column in columns:
+            chain_rows = [j for j, card in enumerate(column) if in_chain(card)]
+            if not chain_rows:
+                continue
+            deepest = chain_rows[0]
+            run_has_blocker = False
+            for j in range(len(column) - 1, deepest, -1):
+                if not in_chain(column[j]):
+                    run_has_blocker = True
+                # The run ends at j unless card j sits on a matching parent.
+                if j - 1 == deepest or not is_below(column[j], column[j - 1]):
+                    total_runs += run_has_blocker
+                    run_has_blocker = False
+        bound = chain_cards + total_runs
+        best = bound if best is None else min(best, bound)
+    return best or 0
+
+
+def preflight(encoded_string):
+    """Returns (verdict, bound) for an encoded board: IMPOSSIBLE if its move
+    limit is below the bound (or the code asks for more cards than it names),
+    BORDERLINE if the limit leaves at most BORDERLINE_SLACK spare moves,
+    FEASIBLE otherwise, and UNLIMITED for full solves and challenges without
+    a limit."""
+    _, foundation, columns, challenge, move_limit = parse_board(encoded_string)
+    if challenge == "00":
+        return UNLIMITED, 0
+    targets, count = parse_targets(challenge)
+    if not targets or count > len(targets):
+        return IMPOSSIBLE, 0
+    if move_limit <= 0:
+        return UNLIMITED, 0
+    bound = lower_bound(foundation, columns, targets, count)
+    if bound > move_limit:
+        return IMPOSSIBLE, bound
+    if move_limit - bound <= BORDERLINE_SLACK:
+        return BORDERLINE, bound
+    return FEASIBLE, bound
+
+
+def describe(encoded_string, verdict, bound):
+    parts = encoded_string.split("$")
+    goal = f"${parts[1]}${parts[2]}" if len(parts) > 2 else ""
+    if verdict == IMPOSSIBLE:
+        if bound:
+            return f"Challenge {goal} is impossible: it needs at least {bound} moves."
+        return f"Challenge {goal} is impossible: its goal can't be met."
+    if verdict == UNLIMITED:
+        return f"Challenge {goal or '$00$0'} has no move limit to check."
+    return f"Challenge {goal} needs at least {bound} moves ({verdict})."
+
+
+if __name__ == "__main__":
+    status = 0
+    for board in sys.argv[1:]:
+        verdict, bound = preflight(board)
+        print(describe(board, verdict, bound))
+        status = max(status, verdict == IMPOSSIBLE)
+    sys.exit(status)
@@ -0,0 +1,252 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+import SolverStats
+
+# Classic numbered deals (Microsoft FreeCell): card id = rank * 4 + suit,
+# dealt row by row into 8 columns from a linear congruential shuffle.
+DEAL_RANKS = "123456789tjqk"
+DEAL_SUITS = "cdhs"
+NUM_CARDS = 52
+MAX_DEAL = 1000000
+
+COLUMN_PREFIXES = ["i", "ii", "iii", "iv", "v", "vi", "vii", "viii"]
+
+# A captured tableau must agree with the deal in this many of its 52 starting
+# positions. A fresh deal matches all of them, a few moves in still well over
+# this, and unrelated deals agree in about one.
+MIN_MATCHES = 30
+
+# Deals are generated in blocks of this many rows and cached on disk.
+BLOCK_SIZE = 100000
+CACHE_DIR = os.path.join(tempfile.gettempdir(), "freecell_deals")
+# Blocks already read this run, by cache path (all ten are about 52 MB).
+LOADED_BLOCKS = {}
+
+# The solver stops itself at the time budget and checkpoints its search (-T),
+# so the next presolve of the deal resumes it; it is only killed if it is
+# still running this many seconds later.
+STOP_GRACE_SECONDS = 30
+
+
+def generate_deal(deal):
+    """Returns the 52 card ids of `deal` in dealing order."""
+    seed = deal
+    cards = list(range(NUM_CARDS))
+    order = []
+    for left in range(NUM_CARDS, 0, -1):
+        seed = (seed * 214013 + 2531011) & 0xFFFFFFFF
+        j = ((seed >> 16) & 0x7FFF) % left
+        order.append(cards[j])
+        cards[j] = cards[left - 1]
+    return order
+
+
+def generate_deals(start, stop):
+    """Vectorized generate_deal for deals start..stop-1, as an int8 array."""
+    count = stop - start
+    seeds = np.arange(start, stop, dtype=np.uint64)
+    cards = np.tile(np.arange(NUM_CARDS, dtype=np.int8), (count, 1))
+    order = np.empty((count, NUM_CARDS), dtype=np.int8)
+    rows = np.arange(count)
+    for i, left in enumerate(range(NUM_CARDS, 0, -1)):
+        seeds = (seeds * 214013 + 2531011) & 0xFFFFFFFF
+        j = ((seeds >> 16) & 0x7FFF) % left
+        j = j.astype(np.intp)
+        order[:, i] = cards[rows, j]
+        cards[rows, j] = cards[:, left - 1]
+    return order
+
+
+def card_code(card_id):
+    return DEAL_RANKS[card_id // 4] + DEAL_SUITS[card_id % 4]
+
+
+def card_id(card_tuple):
+    """Card id of a captured (rank, suit) tuple as built by CaptureAndSolve."""
+    rank, suit = card_tuple
+    return (rank - 1) * 4 + DEAL_SUITS.index(suit)
+
+
+def deal_encoded_string(deal, challenge="00", moves=0):
+    """Encoded solver input for the starting layout of `deal`."""
+    order = generate_deal(deal)
+    encoded = "00" * 8
+    for col in range(8):
+        encoded += COLUMN_PREFIXES[col]
+        encoded += "".join(card_code(c) for c in order[col::8])
+    return f"{encoded}${challenge}${moves}"
+
+
+def load_block(block):
+    """Deals block*BLOCK_SIZE+1 .. (block+1)*BLOCK_SIZE, cached on disk and
+    kept in memory once read."""
+    path = os.path.join(CACHE_DIR, f"deals_{block}.npy")
+    deals = LOADED_BLOCKS.get(path)
+    if deals is not None:
+        return deals
+    if os.path.exists(path):
+        try:
+            deals = np.load(path)
+        except (OSError, ValueError):
+            pass
+    if deals is None:
+        start = block * BLOCK_SIZE + 1
+        deals = generate_deals(start, min(start + BLOCK_SIZE, MAX_DEAL + 1))
+        try:
+            os.makedirs(CACHE_DIR, exist_ok=True)
+            np.save(path, deals)
+        except OSError:
+            pass
+    LOADED_BLOCKS[path] = deals
+    return deals
+
+
+def tableau_positions(tableau):
+    """Deal positions and card ids of a captured tableau (columns of tuples)."""
+    positions = []
+    ids = []
+    for col, column in enumerate(tableau[:8]):
+        for row, card in enumerate(column):
+            position = row * 8 + col
+            if card is None or position >= NUM_CARDS:
+                break
+            positions.append(position)
+            ids.append(card_id(card))
+    return np.array(positions, dtype=np.intp), np.array(ids, dtype=np.int8)
+
+
+def recognize(tableau, max_deal=MAX_DEAL, min_matches=MIN_MATCHES):
+    """Returns (deal, matches) for the deal the tableau was dealt from, or
+    (None, best matches) if no deal up to max_deal agrees enough."""
+    positions, ids = tableau_positions(tableau)
+    if len(positions) < min_matches:
+        return None, 0
+
+    best_deal, best_matches = None, 0
+    for block in range((max_deal - 1) // BLOCK_SIZE + 1):
+        deals = load_block(block)
+        matches = (deals[:, positions] == ids).sum(axis=1)
+        row = int(matches.argmax())
+        if matches[row] > best_matches:
+            best_deal = block * BLOCK_SIZE + 1 + row
+            best_matches = int(matches[row])
+            if best_matches == len(positions):
+                break
+    if best_matches < min_matches:
+        return None, best_matches
+    return best_deal, best_matches
+
+
+def solutions_dir(cwd):
+    """Solution store used by the solver when run from `cwd`."""
+    alt_dir = os.path.join(cwd, "Test", "freecell", "Solutions")
+    if os.path.exists(os.path.join(alt_dir, "sol_0")):
+        return alt_dir
+    return os.path.join(cwd, "..", "Solutions")
+
+
+def stored_decks(directory):
+    """First lines of the stored solutions, i.e. the solved deck strings."""
+    decks = set()
+    n = 0
+    while True:
+        path = os.path.join(directory, f"sol_{n}")
+        if not os.path.exists(path):
+            break
+        with open(path) as f:
+            decks.add(f.readline().strip())
+        n += 1
+    return decks
+
+
+def presolve_one(deal, encoded_string, cwd, config, timeout):
+    """Runs the solver on one deal for up to `timeout` seconds; returns True
+    if it saved a solution."""
+    import CaptureAndSolve
+
+    try:
+        result = subprocess.run([CaptureAndSolve.solver_path(), "-d", str(deal), "-T", str(timeout)] + config + [encoded_string],
+                                capture_output=True, text=True, cwd=cwd,
+                                timeout=timeout + STOP_GRACE_SECONDS)
+    except subprocess.TimeoutExpired:
+        return False
+    stats = SolverStats.parse_stats(result.stdout)
+    if stats:
+        SolverStats.record_stats(stats, encoded_string)
+    return "Saved encoded solution" in result.stdout
+
+
+def presolve(start, stop, challenge="00", moves=0, timeout=600, workers=1):
+    """Solves deals start..stop-1 into the solution store, skipping stored ones.
+    Deals run slowest first as predicted by DifficultyModel, each with a time
+    budget from the same prediction (at most `timeout` seconds). A deal that
+    runs out of time leaves a checkpoint, which the next presolve resumes."""
+    import DifficultyModel
+
+    cwd = os.path.dirname(os.path.abspath(__file__))
+    store = solutions_dir(cwd)
+    os.makedirs(store, exist_ok=True)
+    stored = stored_decks(store)
+
+    deals = []
+    boards = []
+    skipped = 0
+    for deal in range(start, stop):
+        encoded_string = deal_encoded_string(deal, challenge, moves)
+        if encoded_string in stored:
+            skipped += 1
+            continue
+        deals.append(deal)
+        boards.append(encoded_string)
+
+    model = DifficultyModel.load_model()
+    predicted = DifficultyModel.predict(boards, model)
+    solved = failed = 0
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {}
+        for i in DifficultyModel.order_queue(boards, model):
+            config = DifficultyModel.choose_config(boards[i], predicted[i])
+            budget = DifficultyModel.time_budget(boards[i], predicted[i], model, timeout)
+            futures[executor.submit(presolve_one, deals[i], boards[i], cwd, config, budget)] = i
+        for future in as_completed(futures):
+            i = futures[future]
+            ok = future.result()
+            if ok:
+                solved += 1
+            else:
+                failed += 1
+            print(f"Deal {deals[i]}: {'solved' if ok else 'not solved'} (predicted {predicted[i]:.1f} s)")
+    print(f"Presolved {solved}, already stored {skipped}, failed {failed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Numbered FreeCell deals")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    show = commands.add_parser("show", help="print the encoded layout of a deal")
+    show.add_argument("deal", type=int)
+
+    solve = commands.add_parser("presolve", help="solve a range of deals into the solution store")
+    solve.add_argument("start", type=int)
+    solve.add_argument("stop", type=int, help="first deal not solved")
+    solve.add_argument("--challenge", default="00")
+    solve.add_argument("--moves", type=int, default=0)
+    solve.add_argument("--timeout", type=int, default=600, help="at most this many seconds per deal")
+    solve.add_argument("--workers", type=int, default=1, help="deals solved at once")
+
+    args = parser.parse_args()
+    if args.command == "show":
+        print(deal_encoded_string(args.deal))
+    else:
+        presolve(args.start, args.stop, args.challenge, args.moves, args.timeout, args.workers)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,255 @@
+import argparse
+import json
+import math
+import os
+import sys
+
+import numpy as np
+
+import ChallengePreflight
+import DealRecognition
+import SolverStats
+
+# Predicts how long the solver takes on a board from a few layout features, so
+# batch jobs can start the slowest boards first (no stragglers at the end of a
+# run), give each board a time budget and choose the solver configuration.
+# Boards are featurized in bulk: the encoded strings are parsed into card
+# arrays once and every feature is computed over the whole batch.
+
+MODEL_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "difficulty_model.json")
+
+FEATURES = [
+    "disorder",          # adjacent tableau pairs that are not a valid build
+    "max_column_disorder",
+    "buried_low",        # cards stacked on top of aces, twos and threes
+    "freecells_used",
+    "empty_columns",
+    "cards_left",        # cards not yet on the foundation
+    "target_depth",      # cards covering what the challenge still needs
+    "move_limit",
+]
+
+# Cards below this rank (aces, twos, threes) have to come out early.
+LOW_RANK = 3
+
+# Full solves run the beam search, challenges run A*; they get separate fits.
+SEARCHES = ["beam", "astar"]
+
+# Below this many recorded runs of a search the prior below is used as is.
+MIN_FIT_RUNS = 20
+RIDGE = 1e-3
+
+# Used until enough runs are recorded: log(seconds) = weights . [1, features].
+PRIOR = {
+    "beam": {"weights": [-1.0, 0.02, 0.05, 0.02, 0.1, -0.2, 0.0, 0.0, 0.0], "sigma": 1.0},
+    "astar": {"weights": [-2.0, 0.02, 0.05, 0.01, 0.2, -0.3, 0.0, 0.05, -0.005], "sigma": 1.5},
+}
+
+# Time budgets: the prediction plus this many standard deviations of the fit.
+BUDGET_SIGMAS = 2.0
+MIN_BUDGET_SECONDS = 5
+MAX_BUDGET_SECONDS = 600
+
+# A* boards predicted to take longer than this get all solver threads.
+PARALLEL_SECONDS = 2.0
+
+RED_SUITS = [DealRecognition.DEAL_SUITS.index(s) for s in "dh"]
+
+
+def board_arrays(encoded_strings):
+    """Parses a batch of boards into arrays: columns (N, 8, depth) of card ids
+    padded with -1, reserve (N, 4), foundation (N, 4) top cards, challenge
+    targets (N, 2) as (rank, suit or -1 for "any N"), required count and move
+    limits."""
+    boards = [ChallengePreflight.parse_board(s) for s in encoded_strings]
+    count = len(boards)
+    depth = max([len(column) for board in boards for column in board[2]] + [1])
+
+    columns = np.full((count, 8, depth), -1, dtype=np.int8)
+    reserve = np.full((count, 4), -1, dtype=np.int8)
+    foundation = np.full((count, 4), -1, dtype=np.int8)
+    targets = np.full((count, 2), -1, dtype=np.int8)
+    required = np.zeros(count, dtype=np.int8)
+    move_limits = np.zeros(count, dtype=np.int32)
+    for n, (board_reserve, board_foundation, board_columns, challenge, move_limit) in enumerate(boards):
+        reserve[n, :len(board_reserve)] = board_reserve
+        foundation[n, :len(board_foundation)] = board_foundation
+        for col, column in enumerate(board_columns):
+            columns[n, col, :len(column)] = column
+        move_limits[n] = move_limit
+        if challenge != "00" and len(challenge) == 2:
+            rank = 0 if challenge[0].lower() == "a" else DealRecognition.DEAL_RANKS.find(challenge[0].lower())
+            if challenge[1].isdigit():
+                targets[n] = (rank, -1)
+                required[n] = int(challenge[1])
+            else:
+                targets[n] = (rank, DealRecognition.DEAL_SUITS.find(challenge[1].lower()))
+                required[n] = 1
+    return columns, reserve, foundation, targets, required, move_limits
+
+
+def extract_features(encoded_strings):
+    """Feature matrix (N, len(FEATURES)) for a batch of encoded boards."""
+    columns, reserve, foundation, targets, required, move_limits = board_arrays(encoded_strings)
+    count = len(columns)
+    present = columns >= 0
+    lengths = present.sum(axis=2)
+    ranks = columns // 4
+    red = np.isin(columns % 4, RED_SUITS)
+
+    # A pair breaks the run unless the upper card is one lower in the other colour.
+    pairs = present[:, :, 1:]
+    builds = (ranks[:, :, 1:] == ranks[:, :, :-1] - 1) & (red[:, :, 1:] != red[:, :, :-1])
+    column_disorder = (pairs & ~builds).sum(axis=2)
+
+    # Cards on top of each card; free cells and the foundation count as zero.
+    covered = np.zeros((count, DealRecognition.NUM_CARDS), dtype=np.int32)
+    n, col, row = np.nonzero(present)
+    covered[n, columns[n, col, row]] = lengths[n, col] - 1 - row
+    card_ranks = np.arange(DealRecognition.NUM_CARDS) // 4
+    buried_low = covered[:, card_ranks < LOW_RANK].sum(axis=1)
+
+    # Cost of getting a suit up to a rank: the cards covering every card up to it.
+    suit_cost = np.cumsum(covered.reshape(count, 13, 4), axis=1)
+    rows = np.arange(count)
+    target_rank = np.maximum(targets[:, 0], 0)
+    single = suit_cost[rows, target_rank, np.maximum(targets[:, 1], 0)]
+    cheapest = np.sort(suit_cost[rows, target_rank, :], axis=1)
+    any_suit = (cheapest * (np.arange(4) < required[:, None])).sum(axis=1)
+    target_depth = np.where(targets[:, 0] < 0, suit_cost[:, -1, :].sum(axis=1),
+                            np.where(targets[:, 1] < 0, any_suit, single))
+
+    on_foundation = np.where(foundation >= 0, foundation // 4 + 1, 0).sum(axis=1)
+    features = np.stack([
+        column_disorder.sum(axis=1),
+        column_disorder.max(axis=1),
+        buried_low,
+        (reserve >= 0).sum(axis=1),
+        (lengths == 0).sum(axis=1),
+        DealRecognition.NUM_CARDS - on_foundation,
+        target_depth,
+        move_limits,
+    ], axis=1)
+    return features.astype(np.float64)
+
+
+def search_kinds(encoded_strings):
+    """The search the solver runs on each board: beam for full solves, A* for challenges."""
+    kinds = []
+    for s in encoded_strings:
+        parts = s.split("$")
+        kinds.append("astar" if len(parts) > 2 and parts[1] != "00" else "beam")
+    return kinds
+
+
+def fit(records):
+    """Fits log(solve seconds) per search from solver stats records that carry
+    their board. Searches with too few runs keep the prior."""
+    model = {"features": FEATURES}
+    for search in SEARCHES:
+        runs = [r for r in records
+                if r.get("board") and r.get("result") == "solved"
+                and r.get("search", "").endswith(search)]
+        if len(runs) < MIN_FIT_RUNS:
+            model[search] = dict(PRIOR[search], runs=len(runs))
+            continue
+        x = extract_features([r["board"] for r in runs])
+        x = np.hstack([np.ones((len(x), 1)), x])
+        seconds = np.array([sum(r.get("phase_seconds", {}).values()) for r in runs])
+        y = np.log(np.maximum(seconds, 1e-3))
+        # A little ridge keeps constant columns (e.g. move_limit on beam runs) at zero.
+        weights = np.linalg.solve(x.T @ x + RIDGE * np.eye(x.shape[1]), x.T @ y)
+        sigma = float(np.sqrt(np.mean((x @ weights - y) ** 2)))
+        model[search] = {"weights": weights.tolist(), "sigma": sigma, "runs": len(runs)}
+    return model
+
+
+def save_model(model, path=MODEL_FILE):
+    with open(path, "w") as f:
+        json.dump(model, f, indent=2)
+
+
+def load_model(path=MODEL_FILE):
+    """The fitted model, or the prior if none has been saved yet."""
+    try:
+        with open(path) as f:
+            model = json.load(f)
+        if model.get("features") == FEATURES:
+            return model
+        print(f"Ignoring {path}: fitted on different features")
+    except (OSError, ValueError):
+        pass
+    return dict(PRIOR, features=FEATURES)
+
+
+def predict(encoded_strings, model=None):
+    """Predicted solve seconds for each board, as an array."""
+    model = model or load_model()
+    if not encoded_strings:
+        return np.zeros(0)
+    x = extract_features(encoded_strings)
+    x = np.hstack([np.ones((len(x), 1)), x])
+    weights = np.array([model[kind]["weights"] for kind in search_kinds(encoded_strings)])
+    return np.exp((x * weights).sum(axis=1))
+
+
+def order_queue(encoded_strings, model=None):
+    """Indices of the boards, predicted slowest first."""
+    return [int(i) for i in np.argsort(-predict(encoded_strings, model), kind="stable")]
+
+
+def time_budget(encoded_string, predicted_seconds, model=None, limit=MAX_BUDGET_SECONDS):
+    """Seconds to allow a solve before giving up on it."""
+    model = model or load_model()
+    sigma = model[search_kinds([encoded_string])[0]]["sigma"]
+    budget = predicted_seconds * math.exp(BUDGET_SIGMAS * sigma)
+    return min(limit, max(MIN_BUDGET_SECONDS, math.ceil(budget)))
+
+
+def choose_config(encoded_string, predicted_seconds, threads=os.cpu_count() or 1):
+    """Extra solver flags for a board. The search itself follows from the
+    challenge; what can be tuned is the thread count of A*, which only pays
+    off once the search runs long enough to amortize the worker startup."""
+    if search_kinds([encoded_string])[0] == "beam":
+        return []
+    return ["-t", str(threads if predicted_seconds >= PARALLEL_SECONDS else 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solver difficulty model")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    fit_parser = commands.add_parser("fit", help="fit the model on recorded solver runs")
+    fit_parser.add_argument("--stats", default=SolverStats.STATS_FILE)
+
+    rank = commands.add_parser("rank", help="predict solve times, slowest first")
+    rank.add_argument("boards", nargs="*", help="encoded boards")
+    rank.add_argument("--deals", type=int, nargs=2, metavar=("START", "STOP"))
+    rank.add_argument("--challenge", default="00")
+    rank.add_argument("--moves", type=int, default=0)
+
+    args = parser.parse_args()
+    if args.command == "fit":
+        model = fit(SolverStats.load_stats(args.stats))
+        save_model(model)
+        for search in SEARCHES:
+            print(f"{search:6} runs {model[search]['runs']:5}  sigma {model[search]['sigma']:.2f}")
+        print(f"Saved {MODEL_FILE}")
+        return 0
+
+    labels = list(args.boards)
+    boards = list(args.boards)
+    if args.deals:
+        for deal in range(*args.deals):
+            labels.append(f"deal {deal}")
+            boards.append(DealRecognition.deal_encoded_string(deal, args.challenge, args.moves))
+    model = load_model()
+    seconds = predict(boards, model)
+    for i in order_queue(boards, model):
+        print(f"{seconds[i]:8.2f} s  budget {time_budget(boards[i], seconds[i], model):4} s  "
+              f"{' '.join(choose_config(boards[i], seconds[i])):6} {labels[i]}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
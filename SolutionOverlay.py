@@ -1,40 +1,26 @@
-import flet as ft
-import flet.canvas as cv
-import uiautomation as auto
-import win32gui
+import json
 import re
-import asyncio
+import os
+import subprocess
 import sys
-import ctypes
+import threading
+import time
+from collections import namedtuple
 
-try:
-    ctypes.windll.shcore.SetProcessDpiAwareness(1)
-except Exception:
-    ctypes.windll.user32.SetProcessDPIAware()
+import UiBackend
 
-def get_scale_factor():
-    try:
-        hdc = ctypes.windll.user32.GetDC(0)
-        dpi = ctypes.windll.gdi32.GetDeviceCaps(hdc, 88) # LOGPIXELSX
-        ctypes.windll.user32.ReleaseDC(0, hdc)
-        return dpi / 96.0
-    except:
-        return 1.25
+# UI and event loop modules, loaded by load_ui() when the overlay starts so
+# that the plan helpers below can be imported headless.
+asyncio = None
+ft = None
+cv = None
+SCALE_FACTOR = 1.25
 
-SCALE_FACTOR = get_scale_factor()
-
-def parse_card_name(name):
-    """Converts 'Ten of Spades' to (10, 's')"""
-    if not name or "empty" in name.lower():
-        return None
-    match = re.search(r"(Ace|Two|Three|Four|Five|Six|Seven|Eight|Nine|Ten|Jack|Queen|King) of (Hearts|Clubs|Diamonds|Spades)", name)
-    if match:
-        # We only need this for finding cards in the UI, we can reconstruct basic parsing if needed
-        # Or just import mappings. For simplicity, we redefine local map if needed or pass valid strings.
-        # But wait, SolutionOverlay uses parse_card_name inside is_card_in_foundation/get_empty_slot_rect
-        # so we need NAME_TO_RANK/NAME_TO_SUIT
-        pass
-    return None
+def load_ui():
+    global asyncio, ft, cv, SCALE_FACTOR
+    import asyncio
+    ft, cv = UiBackend.load_overlay_modules()
+    SCALE_FACTOR = UiBackend.get_scale_factor()
 
 NAME_TO_RANK = {
     'Ace': 1, 'Two': 2, 'Three': 3, 'Four': 4, 'Five': 5, 'Six': 6,
@@ -44,6 +30,14 @@ NAME_TO_SUIT = {
     'Hearts': 'h', 'Clubs': 'c', 'Diamonds': 'd', 'Spades': 's'
 }
 
+# Card codes in solver steps, e.g. '8S'; aces are written '1'.
+CODE_TO_RANK = {'A': 1, '1': 1, '2': 2, '3': 3, '4': 4, '5': 5, '6': 6, '7': 7,
+                '8': 8, '9': 9, 'T': 10, 'J': 11, 'Q': 12, 'K': 13}
+RANK_NAMES = {rank: name for name, rank in NAME_TO_RANK.items()}
+SUIT_NAMES = {'H': 'Hearts', 'C': 'Clubs', 'D': 'Diamonds', 'S': 'Spades'}
+# Suit of each foundation pile, left to right.
+FOUNDATION_SUITS = "HCDS"
+
 def parse_card_name(name):
     """Converts 'Ten of Spades' to (10, 's')"""
     if not name or "empty" in name.lower():
@@ -54,6 +48,16 @@ def parse_card_name(name):
         return (NAME_TO_RANK[rank_str], NAME_TO_SUIT[suit_str])
     return None
 
+def card_ui_name(card_code):
+    """'8S' -> "Eight of Spades", the UIA name of the card, or None."""
+    if not card_code or len(card_code) < 2:
+        return None
+    r_code = card_code[:-1].upper()
+    s_code = card_code[-1].upper()
+    if r_code not in CODE_TO_RANK or s_code not in SUIT_NAMES:
+        return None
+    return f"{RANK_NAMES[CODE_TO_RANK[r_code]]} of {SUIT_NAMES[s_code]}"
+
 def get_sorted_children(control):
     """Gets children and sorts them Left-to-Right (X coordinate)"""
     if not control.Exists(0, 0):
@@ -62,14 +66,389 @@ def get_sorted_children(control):
     children.sort(key=lambda c: c.BoundingRectangle.left)
     return children
 
+def step_move(step):
+    """'Step 3 (Automove): Move ...' -> 'Move ...', for comparing plans."""
+    return re.sub(r"^Step \d+( \(Automove\))?: ", "", step)
+
+# Where a step takes a card from or to; the index is the tableau column or
+# foundation pile, -1 when it doesn't matter (any free cell) or isn't known.
+TABLEAU = "Tableau"
+RESERVE = "Reserve"
+FOUNDATION = "Foundation"
+
+# One step of the plan, compiled from its "Step N: Move ..." line once when
+# the plan is loaded so that the sampler only reads fields. `name` and
+# `parent` are the UIA names of the moved card and of the card it goes onto
+# (None for an empty column); `group_end` is the index of the last step of
+# the run of automoves an automove step starts.
+PlanStep = namedtuple("PlanStep", [
+    "text", "move", "automove", "group_end", "card", "name", "rank", "suit",
+    "stack_size", "source_kind", "source_index", "dest_kind", "dest_index", "parent",
+])
+
+STEP_REGEX = re.compile(r"Move (?:stack of (\d+) cards \()?([0-9TJQK][SHDC])\)? from (.*?) to (.*?)(?: \((?:on (\w\w)|empty column)\))?$")
+
+def parse_location(hint, suit):
+    """'Tableau 3' -> (TABLEAU, 2); a bare column number counts as the tableau."""
+    match = re.match(r"(?:Tableau )?(\d+)$", hint)
+    if match and 1 <= int(match.group(1)) <= 8:
+        return TABLEAU, int(match.group(1)) - 1
+    if "Reserve" in hint:
+        return RESERVE, -1
+    if "Foundation" in hint:
+        return FOUNDATION, FOUNDATION_SUITS.find(suit) if suit else -1
+    return "", -1
+
+def compile_step(step):
+    """PlanStep for one step line; group_end is filled in by compile_plan."""
+    automove = "automove" in step.lower() or "skipped" in step.lower()
+    match = STEP_REGEX.search(step)
+    if not match:
+        return PlanStep(step, step_move(step), automove, -1, None, None, 0, None,
+                        1, "", -1, "", -1, None)
+    stack_size, card, source_hint, dest_hint, parent = match.groups()
+    suit = card[-1]
+    source_kind, source_index = parse_location(source_hint.strip(), suit)
+    dest_kind, dest_index = parse_location(dest_hint.strip(), suit)
+    return PlanStep(step, step_move(step), automove, -1, card, card_ui_name(card),
+                    CODE_TO_RANK[card[:-1]], suit, int(stack_size or 1),
+                    source_kind, source_index, dest_kind, dest_index, card_ui_name(parent))
+
+def compile_plan(steps):
+    """Compiles step lines into a list of PlanStep records."""
+    plan = [compile_step(step) for step in steps]
+    # Walk backwards so every automove knows where its run of automoves ends.
+    group_end = -1
+    for i in range(len(plan) - 1, -1, -1):
+        if not plan[i].automove:
+            group_end = -1
+            continue
+        if group_end < 0:
+            group_end = i
+        plan[i] = plan[i]._replace(group_end=group_end)
+    for i, step in enumerate(plan):
+        if not step.automove:
+            plan[i] = step._replace(group_end=i)
+    return plan
+
+def read_steps(steps_file):
+    with open(steps_file, "r") as f:
+        return [line.strip() for line in f.readlines() if line.strip()]
+
+def plan_file_for(steps_file):
+    """The compiled plan CaptureAndSolve writes next to a steps file."""
+    return steps_file + ".plan.json"
+
+def save_plan(plan_file, plan):
+    # Same as write_steps in CaptureAndSolve: never leave a partial file.
+    tmp_file = plan_file + ".tmp"
+    with open(tmp_file, "w") as f:
+        json.dump({"fields": list(PlanStep._fields), "steps": [list(step) for step in plan]}, f)
+    os.replace(tmp_file, plan_file)
+
+def load_plan(steps_file):
+    """Reads the steps file and returns its compiled plan, taken from the plan
+    file when that was written for the same steps and compiled otherwise."""
+    steps = read_steps(steps_file)
+    try:
+        with open(plan_file_for(steps_file), "r") as f:
+            saved = json.load(f)
+        if saved.get("fields") == list(PlanStep._fields):
+            plan = [PlanStep(*step) for step in saved["steps"]]
+            if [step.text for step in plan] == steps:
+                return plan
+    except (OSError, ValueError, TypeError):
+        pass
+    return compile_plan(steps)
+
+# What the sampler saw on one pass; rects are (left, top, right, bottom) in
+# screen pixels, None when there is nothing to draw.
+BoardSnapshot = namedtuple("BoardSnapshot", [
+    "time", "step_index", "src_rect", "dest_rect", "undo_rect", "window_width",
+    "finished", "close_window",
+])
+
+def rect_tuple(rect):
+    if rect is None:
+        return None
+    return (rect.left, rect.top, rect.right, rect.bottom)
+
+Rect = namedtuple("Rect", ["left", "top", "right", "bottom"])
+
+class BoardLayout:
+    """Screen geometry of the board, measured through UIA once and then
+    computed: slot rects are cached, and a tableau card's rect follows from
+    its column origin, the card size and the column's stacking pitch (which
+    Solitaire tightens as a column grows, so it is learned per card count).
+
+    Everything is dropped when the window rect or DPI changes, or when a
+    spot check finds a computed card rect away from the measured one.
+    """
+    # Window rect and DPI are re-read at most this often.
+    WINDOW_CHECK_INTERVAL = 0.25
+    # Every this many computed card rects, one is measured to check the model.
+    VERIFY_EVERY = 25
+    # Pixels a computed rect may be off before the model is relearned.
+    TOLERANCE = 4
+    # A missing Undo button is looked for again after this long.
+    UNDO_RETRY_INTERVAL = 1.0
+
+    def __init__(self, overlay):
+        self.overlay = overlay
+        self.window_rect = None
+        self.scale_factor = None
+        self.window_checked = 0.0
+        # Counters
+        self.rect_reads = 0
+        self.computed = 0
+        self.invalidations = 0
+        self.invalidate()
+
+    def invalidate(self):
+        self.valid = False
+        self.group_rects = {}
+        self.column_rects = []
+        self.slot_rects = []
+        self.pile_rects = []
+        # First card relative to its column, card size, default pitch
+        self.card_offset = None
+        self.card_size = None
+        self.base_pitch = None
+        self.pitches = {}
+        self.undo_rect = None
+        self.undo_checked = None
+        self.since_verify = 0
+
+    def read(self, control):
+        self.rect_reads += 1
+        rect = control.BoundingRectangle
+        return Rect(rect.left, rect.top, rect.right, rect.bottom)
+
+    def check_window(self):
+        now = time.perf_counter()
+        if self.valid and now - self.window_checked < self.WINDOW_CHECK_INTERVAL:
+            return
+        self.window_checked = now
+        window_rect = self.read(self.overlay.window)
+        scale_factor = UiBackend.get_scale_factor()
+        if self.valid and (window_rect != self.window_rect or scale_factor != self.scale_factor):
+            print("Window moved or resized; relearning layout.")
+            self.invalidations += 1
+            self.invalidate()
+        self.window_rect = window_rect
+        self.scale_factor = scale_factor
+
+    def ensure(self):
+        """Learns the layout if it is not known. Returns False if it can't be."""
+        self.check_window()
+        if self.valid:
+            return True
+        overlay = self.overlay
+        self.group_rects = {
+            "Group_Foundation": self.read(overlay.foundation_group),
+            "Group_Free": self.read(overlay.freecell_group),
+            "Group_Tableau": self.read(overlay.tableau_group),
+        }
+        self.column_rects = [self.read(col) for col in overlay.tableau_columns]
+        self.slot_rects = [self.read(slot) for slot in overlay.reserve_slots]
+        self.pile_rects = [self.read(pile) for pile in overlay.foundation_piles]
+
+        # Card size and pitch from the first column holding two cards
+        for idx, col in enumerate(overlay.tableau_columns):
+            children = col.GetChildren()
+            if not children:
+                continue
+            first = self.read(children[0])
+            col_rect = self.column_rects[idx]
+            self.card_offset = (first.left - col_rect.left, first.top - col_rect.top)
+            self.card_size = (first.right - first.left, first.bottom - first.top)
+            if len(children) > 1:
+                self.base_pitch = self.read(children[1]).top - first.top
+                break
+        if self.base_pitch is None and self.card_size:
+            self.base_pitch = self.card_size[1] // 4
+        self.valid = self.card_size is not None
+        return self.valid
+
+    def get_undo_rect(self):
+        self.check_window()
+        now = time.perf_counter()
+        if self.undo_rect is None and (self.undo_checked is None or now - self.undo_checked >= self.UNDO_RETRY_INTERVAL):
+            self.undo_checked = now
+            try:
+                # Navigate through the hierarchy: Window -> ListControl -> ListItemControl "Undo"
+                undo_button = self.overlay.window.ListItemControl(Name="Undo", searchDepth=10)
+                if undo_button.Exists(0, 0):
+                    self.undo_rect = self.read(undo_button)
+            except Exception as e:
+                print(f"Error finding undo button: {e}")
+        return self.undo_rect
+
+    def pitch(self, index, children):
+        count = len(children)
+        if count < 2:
+            return self.base_pitch
+        key = (index, count)
+        if key not in self.pitches:
+            # Measure the last card once per column length
+            col_rect = self.column_rects[index]
+            last = self.read(children[-1])
+            self.pitches[key] = (last.top - col_rect.top - self.card_offset[1]) / (count - 1)
+        return self.pitches[key]
+
+    def card_rect(self, index, position, children):
+        """Rect of children[position], the cards of tableau column `index`."""
+        if not self.ensure() or index >= len(self.column_rects):
+            return self.read(children[position])
+        col_rect = self.column_rects[index]
+        left = col_rect.left + self.card_offset[0]
+        top = round(col_rect.top + self.card_offset[1] + position * self.pitch(index, children))
+        rect = Rect(left, top, left + self.card_size[0], top + self.card_size[1])
+        self.computed += 1
+
+        self.since_verify += 1
+        if self.since_verify >= self.VERIFY_EVERY:
+            self.since_verify = 0
+            measured = self.read(children[position])
+            if max(abs(a - b) for a, b in zip(measured, rect)) > self.TOLERANCE:
+                print("Layout no longer matches the board; relearning.")
+                self.invalidations += 1
+                self.invalidate()
+                return measured
+        return rect
+
+    def cached(self, rects, index):
+        if not self.ensure() or not 0 <= index < len(rects):
+            return None
+        return rects[index]
+
+class LatestValue:
+    """Single-slot channel: the writer replaces the value, readers only ever
+    see the newest one and never wait for the writer."""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._value = None
+        self._version = 0
+
+    def publish(self, value):
+        with self._lock:
+            self._value = value
+            self._version += 1
+
+    def latest(self):
+        """Returns (version, value); the version changes on every publish."""
+        with self._lock:
+            return self._version, self._value
+
+# UIA is sampled on its own thread at this interval; the render loop ticks
+# independently and never waits for it.
+SAMPLE_INTERVAL = 0.02
+RENDER_INTERVAL = 0.02 # 20 FPS
+# Time a frame (applying a snapshot plus page.update) should take.
+FRAME_BUDGET = 0.012
+
+class RetainedControl:
+    """A Flet control plus the property values last sent for it. Only values
+    that differ are assigned, so unchanged frames send nothing."""
+    def __init__(self, renderer, control):
+        self.renderer = renderer
+        self.control = control
+        self.sent = {}
+
+    def set(self, **props):
+        for name, value in props.items():
+            if name in self.sent and self.sent[name] == value:
+                self.renderer.skipped_props += 1
+                continue
+            setattr(self.control, name, value)
+            self.sent[name] = value
+            self.renderer.sent_props += 1
+            self.renderer.dirty = True
+
+    def set_border(self, width, color):
+        # Compare the arguments; a new ft.Border never equals the sent one.
+        if self.sent.get("border") == (width, color):
+            self.renderer.skipped_props += 1
+            return
+        self.control.border = ft.Border.all(width, color)
+        self.sent["border"] = (width, color)
+        self.renderer.sent_props += 1
+        self.renderer.dirty = True
+
+    def hide(self):
+        self.set(opacity=0)
+
+class FrameRenderer:
+    """Coalesces the property changes of a frame into at most one
+    page.update(), and counts what was sent, skipped and over budget."""
+    def __init__(self, page):
+        self.page = page
+        self.dirty = False
+        self.frame_start = 0.0
+        # Counters
+        self.sent_props = 0
+        self.skipped_props = 0
+        self.sent_updates = 0
+        self.skipped_updates = 0
+        self.frames_over_budget = 0
+        self.max_frame_time = 0.0
+
+    def track(self, control):
+        return RetainedControl(self, control)
+
+    def begin_frame(self):
+        self.frame_start = time.perf_counter()
+        self.dirty = False
+
+    def end_frame(self):
+        """Sends the frame's changes. Returns the frame time in seconds."""
+        if self.dirty:
+            self.page.update()
+            self.sent_updates += 1
+        else:
+            self.skipped_updates += 1
+        frame_time = time.perf_counter() - self.frame_start
+        self.max_frame_time = max(self.max_frame_time, frame_time)
+        if frame_time > FRAME_BUDGET:
+            self.frames_over_budget += 1
+        return frame_time
+
+    def summary(self):
+        return (f"Render: {self.sent_updates} updates sent, {self.skipped_updates} skipped; "
+                f"{self.sent_props} properties sent, {self.skipped_props} unchanged; "
+                f"{self.frames_over_budget} frames over {FRAME_BUDGET * 1000:.0f} ms "
+                f"(max {self.max_frame_time * 1000:.1f} ms)")
+
 class SolutionOverlay:
-    def __init__(self, steps):
+    def __init__(self, plan, steps_file=None, provisional=False, window_handle=None):
         print("Initializing Overlay...")
-        self.steps = steps
+        # Compiled PlanStep records (see compile_plan)
+        self.plan = plan
         self.current_step_index = 0
-        
+        # Native handle of the window to assist; None means the first Solitaire window
+        self.window_handle = window_handle
+
+        # A provisional plan is a quick hint; the full plan replaces it in
+        # steps_file when the solver finishes.
+        self.steps_file = steps_file
+        self.provisional = provisional
+        self.steps_mtime = self.get_steps_mtime()
+
+        # The sampler thread owns the UIA controls and the step state; the
+        # render loop only sees the snapshots it publishes.
+        self.snapshots = LatestValue()
+        self.stop_sampling = threading.Event()
+        self.max_staleness = 0.0
+        self.layout = BoardLayout(self)
+
+    def connect(self):
+        """Finds the Solitaire controls. Call on the thread that will use them."""
         # Cache UI Controls to avoid re-finding them every frame
-        self.window = auto.WindowControl(searchDepth=1, RegexName=".*Solitaire.*")
+        auto = UiBackend.get_auto()
+        if self.window_handle:
+            self.window = auto.ControlFromHandle(self.window_handle)
+        else:
+            self.window = auto.WindowControl(searchDepth=1, RegexName=".*Solitaire.*")
         self.tableau_group = self.window.GroupControl(AutomationId="Group_Tableau")
         self.freecell_group = self.window.GroupControl(AutomationId="Group_Free")
         self.foundation_group = self.window.GroupControl(AutomationId="Group_Foundation")
@@ -90,10 +469,11 @@ class SolutionOverlay:
         except Exception as e:
             print(f"Warning: Could not cache UI elements: {e}")
 
+    def run(self):
         # Start Flet App
         ft.app(target=self.main_loop)
 
-    async def main_loop(self, page: ft.Page):
+    async def main_loop(self, page: "ft.Page"):
         self.page = page
         page.padding = 0
         page.spacing = 0
@@ -129,8 +509,16 @@ class SolutionOverlay:
             )
         )
         
+        # Dotted outline for the destination, resized in place every frame
+        self.dest_paint = ft.Paint(
+            style=ft.PaintingStyle.STROKE,
+            stroke_width=0,
+            color=ft.Colors.BLUE,
+            stroke_dash_pattern=[10, 10]
+        )
+        self.dest_shape = cv.Rect(0, 0, 0, 0, border_radius=6, paint=self.dest_paint)
         self.dest_cv = cv.Canvas(
-            shapes=[],
+            shapes=[self.dest_shape],
             expand=True
         )
         
@@ -181,145 +569,146 @@ class SolutionOverlay:
         
         self.stack = ft.Stack([self.dest_box, self.dest_box_outer, self.src_box, self.src_box_outer, self.undo_box, self.undo_box_outer], expand=True)
         page.add(self.stack)
+
+        self.renderer = FrameRenderer(page)
+        self.r_src_box = self.renderer.track(self.src_box)
+        self.r_src_box_outer = self.renderer.track(self.src_box_outer)
+        self.r_dest_box = self.renderer.track(self.dest_box)
+        self.r_dest_box_outer = self.renderer.track(self.dest_box_outer)
+        self.r_dest_shape = self.renderer.track(self.dest_shape)
+        self.r_dest_paint = self.renderer.track(self.dest_paint)
+        self.r_undo_box = self.renderer.track(self.undo_box)
+        self.r_undo_box_outer = self.renderer.track(self.undo_box_outer)
         
-        # Start the update loop
-        while self.current_step_index < len(self.steps):
-            await self.update_overlay()
-            await asyncio.sleep(0.02) # 20 FPS
-        
+        sampler = threading.Thread(target=self.sample_loop, daemon=True)
+        sampler.start()
+
+        # Render loop: draw the newest snapshot, however old it is
+        rendered_version = 0
+        snapshot = None
+        while True:
+            frame_time = 0.0
+            version, snapshot = self.snapshots.latest()
+            if snapshot and version != rendered_version:
+                rendered_version = version
+                self.renderer.begin_frame()
+                self.render(snapshot)
+                frame_time = self.renderer.end_frame()
+                if snapshot.finished:
+                    break
+            if snapshot:
+                self.max_staleness = max(self.max_staleness, time.perf_counter() - snapshot.time)
+            # Keep the tick steady: a slow frame shortens the wait after it
+            await asyncio.sleep(max(0.0, RENDER_INTERVAL - frame_time))
+
+        self.stop_sampling.set()
+        layout = self.layout
+        print(f"Layout: {layout.rect_reads} rect reads, {layout.computed} computed, "
+              f"{layout.invalidations} relearned; max staleness {self.max_staleness * 1000:.0f} ms")
+        print(self.renderer.summary())
+        if snapshot.close_window:
+            self.page.window.close()
         # Solved
-        pass
 
-    def get_stack_rect(self, top_card_rect, location_hint):
-        """Expands rect to include all cards below the top card in the column."""
-        class SimpleRect:
-            def __init__(self, l, t, r, b):
-                self.left, self.top, self.right, self.bottom = l, t, r, b
+    def find_in_column(self, index, name):
+        """(position, children) of the card called `name` in tableau column
+        `index`, or (None, children)."""
+        children = self.tableau_columns[index].GetChildren()
+        for i, child in enumerate(children):
+            if name in child.Name:
+                return i, children
+        return None, children
 
+    def get_stack_rect(self, top_card_rect, kind, index):
+        """Expands rect to include all cards below the top card in the column."""
         try:
-            if "Tableau" in location_hint:
-                idx = int(location_hint.split()[-1]) - 1
-                if 0 <= idx < len(self.tableau_columns):
-                    col = self.tableau_columns[idx]
-                    children = col.GetChildren()
-                    # Sort by Y coordinate to ensure order
-                    children.sort(key=lambda c: c.BoundingRectangle.top)
-                    
-                    # Find index of top_card
-                    start_idx = -1
-                    for i, child in enumerate(children):
-                        cr = child.BoundingRectangle
-                        # Match roughly
-                        if abs(cr.left - top_card_rect.left) < 10 and abs(cr.top - top_card_rect.top) < 10:
-                            start_idx = i
-                            break
-                    
-                    if start_idx != -1:
-                        l, t, r, b = top_card_rect.left, top_card_rect.top, top_card_rect.right, top_card_rect.bottom
-                        for i in range(start_idx + 1, len(children)):
-                            cr = children[i].BoundingRectangle
-                            l = min(l, cr.left)
-                            t = min(t, cr.top)
-                            r = max(r, cr.right)
-                            b = max(b, cr.bottom)
-                        return SimpleRect(l, t, r, b)
+            if kind == TABLEAU and 0 <= index < len(self.tableau_columns):
+                children = self.tableau_columns[index].GetChildren()
+                if children:
+                    last = self.layout.card_rect(index, len(children) - 1, children)
+                    return Rect(top_card_rect.left, top_card_rect.top,
+                                max(top_card_rect.right, last.right), max(top_card_rect.bottom, last.bottom))
         except:
             pass
         return top_card_rect
 
-    def get_card_rect(self, card_name, location_hint):
+    def get_card_rect(self, name, kind, index=-1):
         """
-        Finds the specific card (e.g. '8S') in the UI.
-        Uses location_hint (e.g. 'Tableau 1') to narrow search.
+        Finds the card with UIA name `name` (e.g. "Eight of Spades") in the UI.
+        Uses the location (e.g. TABLEAU, 0) to narrow search.
         """
         try:
             if not self.window.Exists(0, 0):
                 return None
         except Exception:
             return None
-            
-        # Convert '8S' to "Eight of Spades"
-        rank_map = {'1': 'Ace', '2': 'Two', '3': 'Three', '4': 'Four', '5': 'Five', 
-                    '6': 'Six', '7': 'Seven', '8': 'Eight', '9': 'Nine', 'T': 'Ten', 
-                    'J': 'Jack', 'Q': 'Queen', 'K': 'King'}
-        suit_map = {'H': 'Hearts', 'C': 'Clubs', 'D': 'Diamonds', 'S': 'Spades'}
-        
-        if len(card_name) < 2:
-            return None
-        r_code = card_name[:-1].upper()
-        s_code = card_name[-1].upper()
-        
-        if r_code not in rank_map or s_code not in suit_map:
+
+        if not name:
             return None
-            
-        full_name = f"{rank_map[r_code]} of {suit_map[s_code]}"
-        regex_name = f".*{full_name}.*"
         
         # 1. Targeted Search based on Hint
-        if "Tableau" in location_hint:
+        if kind == TABLEAU:
             try:
-                # "Tableau 1" -> index 0
-                idx = int(location_hint.split()[-1]) - 1
-                if 0 <= idx < len(self.tableau_columns):
-                    col = self.tableau_columns[idx]
+                if 0 <= index < len(self.tableau_columns):
                     # Search ONLY in this column
-                    # Increased depth to 25 to ensure we find cards in deep stacks (nested or flat)
-                    card_el = col.Control(RegexName=regex_name, searchDepth=25)
-                    if card_el.Exists(0, 0):
-                        return card_el.BoundingRectangle
+                    position, children = self.find_in_column(index, name)
+                    if position is not None:
+                        return self.layout.card_rect(index, position, children)
             except:
                 pass
             
-            # Fallback: If not found in specific column, search entire Tableau group
+            # Fallback: If not found in specific column, search entire Tableau
             # This handles cases where the card might be in transit or index is off
-            card_el = self.tableau_group.Control(RegexName=regex_name, searchDepth=25)
-            if card_el.Exists(0, 0):
-                return card_el.BoundingRectangle
+            rect = self.find_in_tableau(name)
+            if rect:
+                return rect
         
-        elif "Reserve" in location_hint:
+        elif kind == RESERVE:
             # Search ONLY in reserve slots
-            # We can search the group, or iterate slots. Group is faster.
-            card_el = self.freecell_group.Control(RegexName=regex_name, searchDepth=3)
-            if card_el.Exists(0, 0):
-                return card_el.BoundingRectangle
+            rect = self.find_in_reserve(name)
+            if rect:
+                return rect
 
-        # 2. Fallback: Optimized Group Search (Only if hint is empty)
-        if not location_hint:
+        # 2. Fallback: Group Search (Only if hint is empty)
+        if not kind:
             # Tableau (Most likely)
-            card_el = self.tableau_group.Control(RegexName=regex_name, searchDepth=5)
-            if card_el.Exists(0, 0):
-                return card_el.BoundingRectangle
+            rect = self.find_in_tableau(name)
+            if rect:
+                return rect
             
             # Reserve
-            card_el = self.freecell_group.Control(RegexName=regex_name, searchDepth=3)
-            if card_el.Exists(0, 0):
-                return card_el.BoundingRectangle
+            rect = self.find_in_reserve(name)
+            if rect:
+                return rect
             
             # Foundation
-            card_el = self.foundation_group.Control(RegexName=regex_name, searchDepth=3)
-            if card_el.Exists(0, 0):
-                return card_el.BoundingRectangle
+            for i, pile in enumerate(self.foundation_piles):
+                children = pile.GetChildren()
+                top_name = children[-1].Name if children else pile.Name
+                if name in top_name:
+                    return self.layout.cached(self.layout.pile_rects, i)
 
         return None
 
-    def is_card_in_foundation(self, card_name):
-        """Checks if a specific card is already in the foundation."""
-        if not card_name or len(card_name) < 2: return False
-        
-        # Parse card
-        r_code = card_name[:-1].upper()
-        s_code = card_name[-1].upper()
-        
-        rank_map = {'A': 1, '1': 1, '2': 2, '3': 3, '4': 4, '5': 5, 
-                    '6': 6, '7': 7, '8': 8, '9': 9, 'T': 10, 
-                    'J': 11, 'Q': 12, 'K': 13}
-        suit_map_idx = {'H': 0, 'C': 1, 'D': 2, 'S': 3}
-        
-        if r_code not in rank_map or s_code not in suit_map_idx:
+    def find_in_tableau(self, name):
+        for idx in range(len(self.tableau_columns)):
+            position, children = self.find_in_column(idx, name)
+            if position is not None:
+                return self.layout.card_rect(idx, position, children)
+        return None
+
+    def find_in_reserve(self, name):
+        for i, slot in enumerate(self.reserve_slots):
+            names = [slot.Name] + [kid.Name for kid in slot.GetChildren()]
+            if any(name in slot_name for slot_name in names):
+                return self.layout.cached(self.layout.slot_rects, i)
+        return None
+
+    def is_card_in_foundation(self, step):
+        """Checks if the card a step moves is already in the foundation."""
+        if not step.card:
             return False
-            
-        target_rank = rank_map[r_code]
-        pile_idx = suit_map_idx[s_code]
+        pile_idx = FOUNDATION_SUITS.index(step.suit)
         
         # Check specific pile
         if pile_idx < len(self.foundation_piles):
@@ -330,174 +719,154 @@ class SolutionOverlay:
             val = parse_card_name(top_name)
             if val:
                 current_rank, current_suit = val
-                if current_suit.upper() == s_code and current_rank >= target_rank:
+                if current_suit.upper() == step.suit and current_rank >= step.rank:
                     return True
         return False
 
-    def get_empty_slot_rect(self, location_type, index=None, suit=None, source_card_name=None):
-        """Finds an empty slot or specific target card in Tableau, Reserve, or Foundation"""
+    def get_dest_rect(self, step):
+        """Finds the empty slot or the card a step moves its card onto."""
         try:
             if not self.window.Exists(0, 0):
                 return None
         except Exception:
             return None
         
-        if location_type == "Tableau" and index is not None:
+        if step.dest_kind == TABLEAU:
             # Use cached columns
+            index = step.dest_index
             if 0 <= index < len(self.tableau_columns):
-                stack = self.tableau_columns[index]
-                
-                # OPTIMIZATION: If we know the source card, we can find the EXACT target card
-                # instead of just the "top" card. This handles stack moves where the target
-                # becomes buried.
-                if source_card_name:
-                    # 1. Calculate Target Rank/Color
-                    # Source: 9S (Black 9) -> Target: 10 (Red)
-                    r_code = source_card_name[:-1].upper()
-                    s_code = source_card_name[-1].upper()
-                    
-                    rank_map = {'A': 1, '1': 1, '2': 2, '3': 3, '4': 4, '5': 5, 
-                                '6': 6, '7': 7, '8': 8, '9': 9, 'T': 10, 
-                                'J': 11, 'Q': 12, 'K': 13}
-                    
-                    if r_code in rank_map:
-                        src_rank = rank_map[r_code]
-                        
-                        # If King, target is the empty stack itself
-                        if src_rank == 13:
-                            return stack.BoundingRectangle
-                            
-                        target_rank = src_rank + 1
-                        is_black = s_code in ['S', 'C']
-                        
-                        # 2. OPTIMIZED: Check if column is empty first (fast path)
-                        children = stack.GetChildren()
-                        
-                        if not children:
-                            # Empty column - return immediately
-                            return stack.BoundingRectangle
-                        
-                        # 3. OPTIMIZED: Only check bottom 3-5 cards (target is likely at bottom)
-                        # Reverse iterate from bottom (last children) for faster match
-                        search_count = min(5, len(children))
-                        start_idx = len(children) - search_count
-                        
-                        for i in range(len(children) - 1, start_idx - 1, -1):
-                            child = children[i]
-                            val = parse_card_name(child.Name)
-                            if val:
-                                r, s = val
-                                child_is_black = s.upper() in ['S', 'C']
-                                if r == target_rank and child_is_black != is_black:
-                                    # Found valid target - return immediately
-                                    try:
-                                        return child.BoundingRectangle
-                                    except:
-                                        pass
-                        
-                        # 4. If target card NOT found in bottom cards, return column rect
-                        return stack.BoundingRectangle
+                # The plan names the card the move goes onto, so we can find
+                # the EXACT target card instead of just the "top" card. This
+                # handles stack moves where the target becomes buried.
+                if not step.parent:
+                    # Empty column (or a King): the target is the column itself
+                    return self.get_column_rect(index)
 
-                # Fallback: Just return column rectangle (faster, no iteration needed)
-                return stack.BoundingRectangle
+                # OPTIMIZED: Check if column is empty first (fast path)
+                children = self.tableau_columns[index].GetChildren()
+                if not children:
+                    return self.get_column_rect(index)
 
-        elif location_type == "Reserve":
+                # OPTIMIZED: Only check bottom 3-5 cards (target is likely at bottom)
+                # Reverse iterate from bottom (last children) for faster match
+                search_count = min(5, len(children))
+                start_idx = len(children) - search_count
+                for i in range(len(children) - 1, start_idx - 1, -1):
+                    if step.parent in children[i].Name:
+                        # Found valid target - return immediately
+                        try:
+                            return self.layout.card_rect(index, i, children)
+                        except:
+                            pass
+
+                # If target card NOT found in bottom cards, return column rect
+                return self.get_column_rect(index)
+
+        elif step.dest_kind == RESERVE:
             # Use cached slots
-            for slot in self.reserve_slots:
+            for i, slot in enumerate(self.reserve_slots):
                 if "empty" in slot.Name.lower() or not slot.GetChildren():
-                    return slot.BoundingRectangle
+                    return self.layout.cached(self.layout.slot_rects, i)
             if self.reserve_slots:
-                return self.reserve_slots[0].BoundingRectangle
+                return self.layout.cached(self.layout.slot_rects, 0)
                     
-        elif location_type == "Foundation":
+        elif step.dest_kind == FOUNDATION:
             # Use cached piles
-            if suit and len(self.foundation_piles) >= 4:
-                suit_map = {'H': 0, 'C': 1, 'D': 2, 'S': 3}
-                if suit in suit_map:
-                    idx = suit_map[suit]
-                    if idx < len(self.foundation_piles):
-                        return self.foundation_piles[idx].BoundingRectangle
-            
+            if 0 <= step.dest_index < len(self.foundation_piles):
+                return self.layout.cached(self.layout.pile_rects, step.dest_index)
             if self.foundation_piles:
-                return self.foundation_piles[0].BoundingRectangle
+                return self.layout.cached(self.layout.pile_rects, 0)
             
         return None
 
     def get_column_rect(self, index):
-        if 0 <= index < len(self.tableau_columns):
-            return self.tableau_columns[index].BoundingRectangle
-        return None
+        return self.layout.cached(self.layout.column_rects, index)
 
     def get_group_rect(self, group_id):
         # Use cached groups based on ID
-        if group_id == "Group_Foundation":
-            return self.foundation_group.BoundingRectangle
-        elif group_id == "Group_Free":
-            return self.freecell_group.BoundingRectangle
-        elif group_id == "Group_Tableau":
-            return self.tableau_group.BoundingRectangle
-        return None
+        if not self.layout.ensure():
+            return None
+        return self.layout.group_rects.get(group_id)
+
+    def get_undo_rect(self):
+        """Rect of the game's Undo button, or None if it is not shown."""
+        return self.layout.get_undo_rect()
 
-    def update_undo_button_overlay(self):
-        """Updates the undo button overlay position and size."""
+    def get_steps_mtime(self):
+        if not self.steps_file:
+            return None
         try:
-            # Find the undo button: ListItemControl named "Undo"
-            undo_button = None
-            
-            # Navigate through the hierarchy: Window -> ListControl -> ListItemControl "Undo"
-            try:
-                # Search for ListItemControl with name "Undo"
-                undo_button = self.window.ListItemControl(Name="Undo", searchDepth=10)
-                if not undo_button.Exists(0, 0):
-                    undo_button = None
-            except Exception as e:
-                pass
-            
-            if undo_button:
-                rect = undo_button.BoundingRectangle
-                
-                # Calculate dimensions with scaling (no padding for perfect fit)
-                padding = 0
-                width = (rect.right - rect.left - 2*padding) / SCALE_FACTOR
-                height = (rect.bottom - rect.top - 2*padding) / SCALE_FACTOR
-                
-                # Dynamic Gap based on window size
-                win_rect = self.window.BoundingRectangle
-                win_width = win_rect.right - win_rect.left
-                scale_ratio = win_width / 1920.0
-                scale_ratio = max(0.5, min(2.0, scale_ratio))
-                GAP = max(3, int(5 * scale_ratio))
-                undo_border_width = max(1, int(3 * scale_ratio))
-                
-                # Update undo box position and size
-                self.undo_box.left = (rect.left + padding) / SCALE_FACTOR
-                self.undo_box.top = (rect.top + padding) / SCALE_FACTOR
-                self.undo_box.width = width
-                self.undo_box.height = height
-                self.undo_box.border = ft.Border.all(undo_border_width, ft.Colors.RED)
-                self.undo_box.opacity = 1
-                
-                # Update undo box outer
-                self.undo_box_outer.left = self.undo_box.left - GAP
-                self.undo_box_outer.top = self.undo_box.top - GAP
-                self.undo_box_outer.width = self.undo_box.width + 2*GAP
-                self.undo_box_outer.height = self.undo_box.height + 2*GAP
-                self.undo_box_outer.opacity = 1
-            else:
-                # Hide if not found (only print once)
-                if self.undo_box.opacity != 0:
-                    print("Undo button not found - hiding overlay")
-                self.undo_box.opacity = 0
-                self.undo_box_outer.opacity = 0
+            return os.path.getmtime(self.steps_file)
+        except OSError:
+            return None
+
+    def reload_steps(self):
+        """Picks up a new plan written to the steps file. Returns False when the
+        overlay should close: the full solve found no plan after a hint, or
+        the board is being solved again."""
+        mtime = self.get_steps_mtime()
+        if mtime is None or mtime == self.steps_mtime:
+            return True
+        self.steps_mtime = mtime
+        try:
+            new_plan = load_plan(self.steps_file)
         except Exception as e:
-            # Hide on error
-            print(f"Error finding undo button: {e}")
-            self.undo_box.opacity = 0
-            self.undo_box_outer.opacity = 0
-
-    async def update_overlay(self):
-        # Update undo button overlay every frame
-        self.update_undo_button_overlay()
+            print(f"Error reading steps file: {e}")
+            return True
+        if not new_plan:
+            if not self.provisional:
+                return True
+            # CaptureAndSolve empties the file when the full solve fails;
+            # there is nothing to follow the hint with.
+            print("Full solve found no solution.")
+            self.provisional = False
+            return False
+
+        self.provisional = False
+        old_moves = [step.move for step in self.plan[:self.current_step_index]]
+        new_moves = [step.move for step in new_plan[:self.current_step_index]]
+        if old_moves == new_moves:
+            # Nothing played yet, or the plan starts with the moves already played.
+            print(f"Loaded full solution ({len(new_plan)} steps).")
+            self.plan = new_plan
+            return True
+
+        # The hint was played but the full plan goes another way: solve the
+        # board as it is now.
+        print("Full solution does not follow the played hint. Solving again...")
+        capture_script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "CaptureAndSolve.py")
+        capture_args = ["python", capture_script]
+        if self.window_handle:
+            capture_args += ["--window", str(self.window_handle)]
+        subprocess.Popen(capture_args)
+        return False
+
+    def publish(self, src_rect=None, dest_rect=None, undo_rect=None, window_width=0,
+                finished=False, close_window=False):
+        self.snapshots.publish(BoardSnapshot(
+            time.perf_counter(), self.current_step_index, rect_tuple(src_rect),
+            rect_tuple(dest_rect), rect_tuple(undo_rect), window_width,
+            finished, close_window))
+
+    def sample_loop(self):
+        """Sampler thread: queries UIA and publishes a snapshot per pass."""
+        with UiBackend.thread_initializer():
+            self.connect()
+            while not self.stop_sampling.is_set():
+                if not self.reload_steps():
+                    self.publish(finished=True, close_window=True)
+                    return
+                if not self.provisional and self.current_step_index >= len(self.plan):
+                    self.publish(finished=True)
+                    return
+                try:
+                    self.sample()
+                except Exception as e:
+                    print(f"Error sampling board: {e}")
+                time.sleep(SAMPLE_INTERVAL)
+
+    def sample(self):
+        undo_rect = self.get_undo_rect()
         
         # 1. Check Window State
         # Use cached window control
@@ -507,37 +876,23 @@ class SolutionOverlay:
         except Exception:
             return
             
-        if win32gui.IsIconic(self.window.NativeWindowHandle):
+        if UiBackend.is_minimized(self.window):
             return
 
-        # 2. Draw Current Step (Loop to allow skipping)
-        while self.current_step_index < len(self.steps):
-            step = self.steps[self.current_step_index]
+        # 2. Find Current Step (Loop to allow skipping)
+        while self.current_step_index < len(self.plan):
+            step = self.plan[self.current_step_index]
             
             # Hide overlay and wait for automoves to complete
-            if "Automove" in step or "Skipped" in step or "automove" in step or "skipped" in step:
-                print(f"Step {self.current_step_index + 1} Automove detected: {step}")
+            if step.automove:
+                print(f"Step {self.current_step_index + 1} Automove detected: {step.text}")
                 # Hide overlay immediately
-                self.src_box.opacity = 0
-                self.src_box_outer.opacity = 0
-                self.dest_box.opacity = 0
-                self.page.update()
-                
-                # Find all consecutive automoves to get the last one
-                last_automove_index = self.current_step_index
-                while last_automove_index + 1 < len(self.steps):
-                    next_step = self.steps[last_automove_index + 1]
-                    if "Automove" in next_step or "automove" in next_step:
-                        last_automove_index += 1
-                    else:
-                        break
-                
-                # Extract the last automove's card to monitor
-                last_automove_step = self.steps[last_automove_index]
-                card_match = re.search(r"Move (?:stack of (\d+) cards \()?([0-9TJQK][SHDC])\)?", last_automove_step)
+                self.publish(undo_rect=undo_rect)
                 
-                if card_match:
-                    last_card = card_match.group(2)
+                # Monitor the card of the last automove in the run
+                last_step = self.plan[step.group_end]
+                if last_step.card:
+                    last_card = last_step.card
                     print(f"Waiting for automove sequence to complete (last card: {last_card})...")
                     
                     # Wait until the last automove card reaches the foundation
@@ -546,126 +901,62 @@ class SolutionOverlay:
                     check_interval = 0.02
                     
                     while elapsed_time < max_wait_time:
-                        if self.is_card_in_foundation(last_card):
+                        if self.is_card_in_foundation(last_step):
                             print(f"Automove sequence complete: {last_card} reached foundation")
                             break
-                        await asyncio.sleep(check_interval)
+                        time.sleep(check_interval)
                         elapsed_time += check_interval
                     
                     if elapsed_time >= max_wait_time:
                         print(f"Warning: Timeout waiting for {last_card} to reach foundation")
                 
                 # Advance past all automoves
-                self.current_step_index = last_automove_index + 1
+                self.current_step_index = step.group_end + 1
                 continue
-            
-            # Parse Step
-            # Capture Source and Dest hints
-            # Regex to capture stack size if present
-            card_match = re.search(r"Move (?:stack of (\d+) cards \()?([0-9TJQK][SHDC])\)? from (.*?) to (.*)", step)
-            
-            card_name = None
-            stack_size = 1
-            source_hint = ""
-            dest_hint = ""
-            card_suit = None
-            
-            if card_match:
-                if card_match.group(1):
-                    stack_size = int(card_match.group(1))
-                card_name = card_match.group(2)
-                source_hint = card_match.group(3).strip()
-                dest_hint = card_match.group(4).strip()
-                
-                # Normalize Destination Hint
-                # If it's just a number "1"-"8", treat as "Tableau N"
-                if dest_hint.isdigit() and 1 <= int(dest_hint) <= 8:
-                    dest_hint = f"Tableau {dest_hint}"
-                
-                card_suit = card_name[-1]
-            
+
+            card_name = step.card
             src_rect = None
             dest_rect = None
             
             # Find Source Rect (The Card itself)
             if card_name:
                 # 1. Try finding card in Source
-                src_rect = self.get_card_rect(card_name, source_hint)
+                src_rect = self.get_card_rect(step.name, step.source_kind, step.source_index)
                 
                 # Expand if stack move
-                if src_rect and stack_size > 1:
-                    src_rect = self.get_stack_rect(src_rect, source_hint)
+                if src_rect and step.stack_size > 1:
+                    src_rect = self.get_stack_rect(src_rect, step.source_kind, step.source_index)
                 
                 if not src_rect:
                     # Card not in source. 
                     
                     # A. Check Foundation (Auto-move or Dest=Foundation)
-                    if self.is_card_in_foundation(card_name):
+                    if self.is_card_in_foundation(step):
                         print(f"Step {self.current_step_index + 1} Skipped: {card_name} is in Foundation.")
                         self.current_step_index += 1
-                        self.src_box.opacity = 0
-                        self.src_box_outer.opacity = 0
-                        self.dest_box.opacity = 0
-                        self.page.update()
                         continue
 
                     # B. Check Destination (if not Foundation)
-                    if "Foundation" not in dest_hint:
-                        check_dest_rect = self.get_card_rect(card_name, dest_hint)
+                    if step.dest_kind != FOUNDATION:
+                        check_dest_rect = self.get_card_rect(step.name, step.dest_kind, step.dest_index)
                         if check_dest_rect:
-                            print(f"Step {self.current_step_index + 1} Complete: {card_name} found in destination ({dest_hint}).")
+                            print(f"Step {self.current_step_index + 1} Complete: {card_name} found in destination ({step.dest_kind}).")
                             self.current_step_index += 1
-                            self.src_box.opacity = 0
-                            self.src_box_outer.opacity = 0
-                            self.dest_box.opacity = 0
-                            self.page.update()
                             continue
                             
                     # C. Fallback: Check Foundation again (maybe it was auto-moved there)
                     # This handles cases where dest was Tableau, but game auto-moved it to Foundation immediately
-                    if self.is_card_in_foundation(card_name):
+                    if self.is_card_in_foundation(step):
                         print(f"Step {self.current_step_index + 1} Skipped (Fallback): {card_name} is in Foundation.")
                         self.current_step_index += 1
-                        self.src_box.opacity = 0
-                        self.src_box_outer.opacity = 0
-                        self.dest_box.opacity = 0
-                        self.page.update()
                         continue
             
             # Find Dest Rect (for drawing arrow)
-            if "Foundation" in dest_hint:
-                dest_rect = self.get_empty_slot_rect("Foundation", suit=card_suit)
-            elif "Reserve" in dest_hint:
-                dest_rect = self.get_empty_slot_rect("Reserve")
-            elif "Tableau" in dest_hint:
-                # Extract Tableau Index
-                t_match = re.search(r"Tableau (\d+)", dest_hint)
-                if t_match:
-                    idx = int(t_match.group(1)) - 1
-                    # Pass card_name to find the specific target parent card
-                    dest_rect = self.get_empty_slot_rect("Tableau", idx, source_card_name=card_name)
-            
-            if not dest_rect:
-                 pass
-
-            # Calculate dynamic outline width based on window width
-            win_rect = self.window.BoundingRectangle
-            win_width = win_rect.right - win_rect.left
-            # Base width 1920. Scale factor.
-            scale_ratio = win_width / 1920.0
-            # Clamp scale ratio to be reasonable (e.g. 0.5 to 2.0)
-            scale_ratio = max(0.5, min(2.0, scale_ratio))
-            
-            src_border_width = max(1, int(3 * scale_ratio))
-            dest_stroke_width = src_border_width*2 # Same width
-            
-            # Dynamic Gap
-            GAP = max(3, int(5 * scale_ratio))
-            
-            # Threshold for valid rectangle size
-            MIN_SIZE_THRESHOLD = 20
+            dest_rect = self.get_dest_rect(step)
+
+            win_rect = self.layout.window_rect
+            win_width = win_rect.right - win_rect.left if win_rect else 0
 
-            # Update UI
             if src_rect:
                 # 3. Check Completion (Auto-Advance) - CHECK BEFORE DRAWING
                 # If the source card is now inside the destination area
@@ -674,19 +965,19 @@ class SolutionOverlay:
                 
                 is_at_dest = False
                 
-                if "Foundation" in dest_hint:
+                if step.dest_kind == FOUNDATION:
                     f_rect = self.get_group_rect("Group_Foundation")
                     if f_rect:
                         if f_rect.left <= cx <= f_rect.right and f_rect.top <= cy <= f_rect.bottom:
                             is_at_dest = True
                         
-                elif "Reserve" in dest_hint:
+                elif step.dest_kind == RESERVE:
                     r_rect = self.get_group_rect("Group_Free")
                     if r_rect:
                         if r_rect.left <= cx <= r_rect.right and r_rect.top <= cy <= r_rect.bottom:
                             is_at_dest = True
                         
-                elif "Tableau" in dest_hint:
+                elif step.dest_kind == TABLEAU:
                     # Use dest_rect (the specific card/slot we targeted) for precise checking
                     if dest_rect:
                         # Horizontal: Center of source is within width of dest
@@ -702,114 +993,148 @@ class SolutionOverlay:
                             is_at_dest = True
                     else:
                         # Fallback if dest_rect wasn't found (e.g. could not read column)
-                        t_match = re.search(r"Tableau (\d+)", dest_hint)
-                        if t_match:
-                            idx = int(t_match.group(1)) - 1
-                            c_rect = self.get_column_rect(idx)
-                            if c_rect:
-                                if c_rect.left <= cx <= c_rect.right and c_rect.top <= cy:
-                                    is_at_dest = True
+                        c_rect = self.get_column_rect(step.dest_index)
+                        if c_rect:
+                            if c_rect.left <= cx <= c_rect.right and c_rect.top <= cy:
+                                is_at_dest = True
                 if is_at_dest:
                     print(f"Step {self.current_step_index + 1} Complete: {card_name} detected in destination.")
                     self.current_step_index += 1
-                    self.src_box.opacity = 0
-                    self.src_box_outer.opacity = 0
-                    self.dest_box.opacity = 0
-                    self.dest_box_outer.opacity = 0
-                    self.page.update() # Brief pause to show completion before next step
                     continue
 
-                # Update Source Box
-                # Apply padding to align perfectly (shrink slightly to fit inside card)
-                padding = 0
-                s_width = (src_rect.right - src_rect.left - 2*padding) / SCALE_FACTOR
-                s_height = (src_rect.bottom - src_rect.top - 2*padding) / SCALE_FACTOR
-                
-                if s_width < MIN_SIZE_THRESHOLD or s_height < MIN_SIZE_THRESHOLD:
-                    self.src_box.opacity = 0
-                    self.src_box_outer.opacity = 0
-                else:
-                    self.src_box.left = (src_rect.left + padding) / SCALE_FACTOR
-                    self.src_box.top = (src_rect.top + padding) / SCALE_FACTOR
-                    self.src_box.width = s_width
-                    self.src_box.height = s_height
-                    self.src_box.border = ft.Border.all(src_border_width, ft.Colors.BLUE)
-                    self.src_box.opacity = 1
-                    
-                    # Update Outer Source Box
-                    self.src_box_outer.left = self.src_box.left - 1.5*GAP
-                    self.src_box_outer.top = self.src_box.top - 1.5*GAP
-                    self.src_box_outer.width = self.src_box.width + 3*GAP
-                    self.src_box_outer.height = self.src_box.height + 3*GAP
-                    self.src_box_outer.opacity = 0.9
-                
-                # Update Dest Box
-                if dest_rect:
-                    d_width = (dest_rect.right - dest_rect.left - 2*padding) / SCALE_FACTOR
-                    d_height = (dest_rect.bottom - dest_rect.top - 2*padding) / SCALE_FACTOR
-                    
-                    if d_width < MIN_SIZE_THRESHOLD or d_height < MIN_SIZE_THRESHOLD:
-                        self.dest_box.opacity = 0
-                        self.dest_box_outer.opacity = 0
-                    else:
-                        # Inner Box (Dotted)
-                        self.dest_box.left = (dest_rect.left + padding) / SCALE_FACTOR
-                        self.dest_box.top = (dest_rect.top + padding) / SCALE_FACTOR
-                        self.dest_box.width = d_width
-                        self.dest_box.height = d_height
-                        self.dest_box.opacity = 1
-                        
-                        # Outer Box (Solid) - Match src_box_outer logic
-                        self.dest_box_outer.left = self.dest_box.left - 1.5*GAP
-                        self.dest_box_outer.top = self.dest_box.top - 1.5*GAP
-                        self.dest_box_outer.width = self.dest_box.width + 3*GAP
-                        self.dest_box_outer.height = self.dest_box.height + 3*GAP
-                        self.dest_box_outer.opacity = 0.9
-                        
-                        # Draw Dotted Rect on Canvas (Only Inner)
-                        self.dest_cv.shapes = [
-                            cv.Rect(
-                                0, 0, 
-                                d_width, d_height, 
-                                border_radius=6,
-                                paint=ft.Paint(
-                                    style=ft.PaintingStyle.STROKE,
-                                    stroke_width=dest_stroke_width,
-                                    color=ft.Colors.BLUE,
-                                    stroke_dash_pattern=[10, 10]
-                                )
-                            )
-                        ]
+                self.publish(src_rect, dest_rect, undo_rect, win_width)
+            else:
+                # Card not found this pass (e.g. mid-drag): keep drawing the last boxes
+                _, last = self.snapshots.latest()
+                if last and last.step_index == self.current_step_index:
+                    self.snapshots.publish(last._replace(time=time.perf_counter(), undo_rect=rect_tuple(undo_rect)))
                 else:
-                    self.dest_box.opacity = 0
-                    self.dest_box_outer.opacity = 0
-                
-                self.page.update()
-                # No fade in delay needed
+                    self.publish(undo_rect=undo_rect, window_width=win_width)
 
-            # If we successfully drew the step (or failed to find dest but didn't skip), break the loop to wait for next frame
+            # If we found the step (or failed to find dest but didn't skip), stop until the next pass
             break
 
+    def render(self, snapshot):
+        """Render loop side: applies a snapshot to the overlay controls. Only
+        changed properties are sent; FrameRenderer sends the frame."""
+        # Calculate dynamic outline width based on window width
+        win_width = snapshot.window_width or 1920
+        # Base width 1920. Scale factor.
+        scale_ratio = win_width / 1920.0
+        # Clamp scale ratio to be reasonable (e.g. 0.5 to 2.0)
+        scale_ratio = max(0.5, min(2.0, scale_ratio))
+        
+        src_border_width = max(1, int(3 * scale_ratio))
+        dest_stroke_width = src_border_width*2 # Same width
+        undo_border_width = max(1, int(3 * scale_ratio))
+        
+        # Dynamic Gap
+        GAP = max(3, int(5 * scale_ratio))
+        UNDO_GAP = max(3, int(5 * scale_ratio))
+        
+        # Threshold for valid rectangle size
+        MIN_SIZE_THRESHOLD = 20
+
+        # Apply padding to align perfectly (shrink slightly to fit inside card)
+        padding = 0
+
+        # Undo Box
+        if snapshot.undo_rect:
+            left, top, right, bottom = snapshot.undo_rect
+            u_left = (left + padding) / SCALE_FACTOR
+            u_top = (top + padding) / SCALE_FACTOR
+            u_width = (right - left - 2*padding) / SCALE_FACTOR
+            u_height = (bottom - top - 2*padding) / SCALE_FACTOR
+            self.r_undo_box.set(left=u_left, top=u_top, width=u_width, height=u_height, opacity=1)
+            self.r_undo_box.set_border(undo_border_width, ft.Colors.RED)
+            
+            # Update undo box outer
+            self.r_undo_box_outer.set(
+                left=u_left - UNDO_GAP, top=u_top - UNDO_GAP,
+                width=u_width + 2*UNDO_GAP, height=u_height + 2*UNDO_GAP,
+                opacity=1)
+        else:
+            self.r_undo_box.hide()
+            self.r_undo_box_outer.hide()
+
+        # Update Source Box
+        src_rect = snapshot.src_rect
+        if not src_rect:
+            self.r_src_box.hide()
+            self.r_src_box_outer.hide()
+        else:
+            left, top, right, bottom = src_rect
+            s_width = (right - left - 2*padding) / SCALE_FACTOR
+            s_height = (bottom - top - 2*padding) / SCALE_FACTOR
+            
+            if s_width < MIN_SIZE_THRESHOLD or s_height < MIN_SIZE_THRESHOLD:
+                self.r_src_box.hide()
+                self.r_src_box_outer.hide()
+            else:
+                s_left = (left + padding) / SCALE_FACTOR
+                s_top = (top + padding) / SCALE_FACTOR
+                self.r_src_box.set(left=s_left, top=s_top, width=s_width, height=s_height, opacity=1)
+                self.r_src_box.set_border(src_border_width, ft.Colors.BLUE)
+                
+                # Update Outer Source Box
+                self.r_src_box_outer.set(
+                    left=s_left - 1.5*GAP, top=s_top - 1.5*GAP,
+                    width=s_width + 3*GAP, height=s_height + 3*GAP,
+                    opacity=0.9)
+        
+        # Update Dest Box
+        dest_rect = snapshot.dest_rect
+        if src_rect and dest_rect:
+            left, top, right, bottom = dest_rect
+            d_width = (right - left - 2*padding) / SCALE_FACTOR
+            d_height = (bottom - top - 2*padding) / SCALE_FACTOR
+            
+            if d_width < MIN_SIZE_THRESHOLD or d_height < MIN_SIZE_THRESHOLD:
+                self.r_dest_box.hide()
+                self.r_dest_box_outer.hide()
+            else:
+                # Inner Box (Dotted)
+                d_left = (left + padding) / SCALE_FACTOR
+                d_top = (top + padding) / SCALE_FACTOR
+                self.r_dest_box.set(left=d_left, top=d_top, width=d_width, height=d_height, opacity=1)
+                
+                # Outer Box (Solid) - Match src_box_outer logic
+                self.r_dest_box_outer.set(
+                    left=d_left - 1.5*GAP, top=d_top - 1.5*GAP,
+                    width=d_width + 3*GAP, height=d_height + 3*GAP,
+                    opacity=0.9)
+                
+                # Dotted Rect on Canvas (Only Inner), reusing the same shape
+                self.r_dest_shape.set(width=d_width, height=d_height)
+                self.r_dest_paint.set(stroke_width=dest_stroke_width)
+        else:
+            self.r_dest_box.hide()
+            self.r_dest_box_outer.hide()
+
 def main():
     if len(sys.argv) < 2:
-        print("Usage: python SolutionOverlay.py <path_to_steps_file>")
+        print("Usage: python SolutionOverlay.py <path_to_steps_file> [--window HANDLE] [--hint]")
         return
 
     steps_file = sys.argv[1]
-    steps = []
+    provisional = "--hint" in sys.argv[2:]
+    window_handle = None
+    if "--window" in sys.argv[2:-1]:
+        window_handle = int(sys.argv[sys.argv.index("--window") + 1])
+    plan = []
     
     try:
-        with open(steps_file, "r") as f:
-            steps = [line.strip() for line in f.readlines() if line.strip()]
+        plan = load_plan(steps_file)
     except Exception as e:
         print(f"Error reading steps file: {e}")
         return
 
-    if not steps:
+    if not plan:
         print("No steps found in file.")
         return
 
-    SolutionOverlay(steps)
+    load_ui()
+    SolutionOverlay(plan, steps_file, provisional, window_handle).run()
 
 if __name__ == "__main__":
     main()
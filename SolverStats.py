@@ -0,0 +1,123 @@
+import json
+import os
+import statistics
+import sys
+import time
+
+# Every solver run prints one "Stats: {...}" line; CaptureAndSolve appends it here.
+STATS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "solver_stats.jsonl")
+
+STATS_PREFIX = "Stats: "
+
+
+def parse_stats(output):
+    """Returns the stats record printed by the solver, or None if there is none."""
+    for line in output.splitlines():
+        if line.startswith(STATS_PREFIX):
+            try:
+                return json.loads(line[len(STATS_PREFIX):])
+            except ValueError:
+                return None
+    return None
+
+
+def record_stats(stats, encoded_string="", path=STATS_FILE):
+    """Appends one run to the stats file, tagged with its challenge, board and
+    time. The board lets DifficultyModel learn solve times from these runs."""
+    record = dict(stats)
+    record["time"] = time.time()
+    parts = encoded_string.split("$")
+    record["challenge"] = parts[1] if len(parts) > 2 else "00"
+    record["board"] = encoded_string
+    try:
+        with open(path, "a") as f:
+            f.write(json.dumps(record) + "\n")
+    except OSError as e:
+        print(f"Could not record solver stats: {e}")
+
+
+def load_stats(path=STATS_FILE):
+    records = []
+    if not os.path.exists(path):
+        return records
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+    return records
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(records):
+    """Aggregates runs per search type ("beam", "astar", "parallel_astar", ...)."""
+    groups = {}
+    for record in records:
+        groups.setdefault(record.get("search", "none"), []).append(record)
+
+    summary = {}
+    for search, runs in groups.items():
+        expanded = [r.get("nodes_expanded", 0) for r in runs]
+        lookups = sum(r.get("hash_lookups", 0) for r in runs)
+        hits = sum(r.get("hash_hits", 0) for r in runs)
+        search_seconds = [r.get("phase_seconds", {}).get("search", 0.0) for r in runs]
+        entry = {
+            "runs": len(runs),
+            "solved": sum(r.get("result") in ("solved", "cached") for r in runs),
+            "cached": sum(r.get("result") == "cached" for r in runs),
+            "nodes_expanded_median": percentile(expanded, 0.5),
+            "nodes_expanded_p95": percentile(expanded, 0.95),
+            "hash_hit_rate": hits / lookups if lookups else 0.0,
+            "hash_collisions": sum(r.get("hash_collisions", 0) for r in runs),
+            "max_chain": max((r.get("max_chain", 0) for r in runs), default=0),
+            "table_bins": max((r.get("table_bins", 0) for r in runs), default=0),
+            "peak_pool_mb_p95": percentile([r.get("peak_pool_bytes", 0) for r in runs], 0.95) / 2**20,
+            "peak_memory_mb_p95": percentile([r.get("peak_memory_bytes", 0) for r in runs], 0.95) / 2**20,
+            "search_seconds_mean": statistics.mean(search_seconds) if search_seconds else 0.0,
+            "search_seconds_p95": percentile(search_seconds, 0.95),
+        }
+
+        # Share of levels that filled the beam: near 1 means the beam is the limit.
+        full_levels = 0
+        levels = 0
+        for r in runs:
+            widths = r.get("beam_widths", [])
+            beam_size = r.get("beam_size", 0) * max(1, r.get("threads", 1))
+            if beam_size and widths:
+                levels += len(widths)
+                full_levels += sum(w >= beam_size for w in widths)
+        if levels:
+            entry["beam_saturation"] = full_levels / levels
+
+        summary[search] = entry
+    return summary
+
+
+def print_summary(summary):
+    for search, entry in sorted(summary.items()):
+        print(f"[{search}]")
+        for key, value in entry.items():
+            if isinstance(value, float):
+                print(f"  {key:24} {value:.3f}")
+            else:
+                print(f"  {key:24} {value}")
+
+
+if __name__ == "__main__":
+    stats_path = sys.argv[1] if len(sys.argv) > 1 else STATS_FILE
+    records = load_stats(stats_path)
+    if not records:
+        print(f"No solver stats in {stats_path}")
+    else:
+        print(f"{len(records)} solver runs in {stats_path}")
+        print_summary(summarize(records))
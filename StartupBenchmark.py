@@ -0,0 +1,59 @@
+import os
+import subprocess
+import sys
+import time
+
+# Headless entry points must start without the UI stack. This benchmark
+# imports them in fresh interpreters and fails when they get slower than the
+# budget or pull in a UI module (or numpy, which only deal recognition needs).
+HEADLESS_MODULES = ["CaptureAndSolve", "SolutionOverlay", "SolverStats", "UiBackend"]
+HEAVY_MODULES = ["uiautomation", "flet", "win32gui", "numpy"]
+
+# Import time over a bare interpreter, in ms.
+IMPORT_BUDGET_MS = 100
+RUNS = 7
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def time_python(code):
+    """Best wall time in ms of a fresh interpreter running `code`."""
+    best = None
+    for _ in range(RUNS):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, "-c", code], cwd=ROOT, check=True)
+        elapsed = (time.perf_counter() - start) * 1000
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def loaded_heavy_modules(module):
+    code = f"import sys, {module}; print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT,
+                            capture_output=True, text=True, check=True)
+    return result.stdout.split()
+
+
+def main():
+    baseline = time_python("pass")
+    print(f"Bare interpreter: {baseline:.1f} ms")
+
+    failures = 0
+    for module in HEADLESS_MODULES:
+        cost = time_python(f"import {module}") - baseline
+        heavy_modules = loaded_heavy_modules(module)
+        ok = cost <= IMPORT_BUDGET_MS and not heavy_modules
+        failures += not ok
+        line = f"{module:20} {cost:7.1f} ms"
+        if heavy_modules:
+            line += f"  imports {', '.join(heavy_modules)}"
+        print(f"{line}  {'ok' if ok else 'OVER BUDGET'}")
+
+    if failures:
+        print(f"{failures} module(s) over the {IMPORT_BUDGET_MS} ms startup budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
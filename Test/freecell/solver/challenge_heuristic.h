@@ -0,0 +1,194 @@
+#ifndef CHALLENGE_HEURISTIC_H
+#define CHALLENGE_HEURISTIC_H
+
+#include <limits.h>
+
+#include <algorithm>
+#include <vector>
+using namespace std;
+
+#include "node.h"
+#include "pattern_database.h"
+
+// Challenge heuristics for the A* solver, evaluated incrementally.
+//
+// The blocker depth of every card (number of cards covering it, 0 in the
+// reserve, -1 once in the foundation) is cached for the node being expanded.
+// A child starts from that table and rescans only the columns its move
+// changed. Both heuristics come out of the same per-target chain costs:
+//   admissible = sum of the `required_count` cheapest target chains
+//   weighted   = 2 * sum of all target chains + clutter penalty
+// With a pattern database the admissible value is raised to the pattern bound
+// when that is larger (see PatternBound).
+class ChallengeHeuristic {
+ public:
+  static constexpr signed char kInFoundation = -1;
+  static constexpr signed char kMissing = 100;
+
+  ChallengeHeuristic(const vector<Card>& targets, int required_count,
+                     const PatternDatabase* pattern_database = nullptr)
+      : targets_(targets),
+        required_count_(required_count),
+        pattern_database_(pattern_database) {}
+
+  // Caches the card depths of the node about to be expanded.
+  void Prepare(const Node& parent) {
+    parent_ = &parent;
+    for (int i = 0; i < kTotalCards; ++i) depth_[i] = kMissing;
+    for (int s = 0; s < 4; ++s) {
+      for (int r = 0; r < parent.GetFoundation(s).size(); ++r)
+        depth_[Card(s, r).card()] = kInFoundation;
+    }
+    const auto& reserve = parent.GetReserve();
+    for (int i = 0; i < reserve.size(); ++i) depth_[reserve[i].card()] = 0;
+    for (int t = 0; t < 8; ++t) ScanTableau(parent.GetTableau(t), depth_);
+  }
+
+  // Evaluates a child of the prepared node (or the prepared node itself).
+  void Evaluate(const Node& node, int* admissible, int* weighted) {
+    signed char depth[kTotalCards];
+    memcpy(depth, depth_, sizeof(depth));
+
+    for (int s = 0; s < 4; ++s) {
+      for (int r = parent_->GetFoundation(s).size();
+           r < node.GetFoundation(s).size(); ++r)
+        depth[Card(s, r).card()] = kInFoundation;
+    }
+    const auto& reserve = node.GetReserve();
+    for (int i = 0; i < reserve.size(); ++i) depth[reserve[i].card()] = 0;
+    for (int t = 0; t < 8; ++t) {
+      const auto& tableau = node.GetTableau(t);
+      const auto& before = parent_->GetTableau(t);
+      if (tableau != before)
+        ScanTableau(tableau, depth);
+    }
+
+    int costs[4];
+    int num_costs = 0;
+    int total = 0;
+    for (const auto& target : targets_) {
+      int cost = ChainCost(depth, target);
+      costs[num_costs++] = cost;
+      total += cost;
+    }
+
+    sort(costs, costs + num_costs);
+    int count = min(required_count_, num_costs);
+    *admissible = 0;
+    for (int i = 0; i < count; ++i) *admissible += costs[i];
+    if (pattern_database_)
+      *admissible = max(*admissible, LowerBound(node, count));
+
+    *weighted = 2 * total + ClutterPenalty(node);
+  }
+
+  // Lower bound on the moves needed to play every card of the cheapest
+  // `count` targets' chains to the foundation (auto play is off under a move
+  // limit, so each of those cards costs a move). Across columns the sorted
+  // runs covering chain cards add up, as each needs its own move. With a
+  // pattern database, per column the cards covering its deepest chain card
+  // are looked up there too.
+  int LowerBound(const Node& node, int count) const {
+    int free_cells = 4 - node.GetReserve().size();
+    int empty_columns = 0;
+    for (int t = 0; t < 8; ++t) empty_columns += node.GetTableau(t).empty();
+
+    int best = INT_MAX;
+    int num_targets = targets_.size();
+    for (int mask = 1; mask < (1 << num_targets); ++mask) {
+      if (__builtin_popcount(mask) != count) continue;
+
+      // Highest rank needed per suit, -1 if the suit is not part of the goal.
+      int needed[4] = {-1, -1, -1, -1};
+      int chain_cards = 0;
+      for (int i = 0; i < num_targets; ++i) {
+        if (!(mask & (1 << i))) continue;
+        const auto& target = targets_[i];
+        needed[target.suit()] = max(needed[target.suit()], target.rank());
+      }
+      for (int s = 0; s < 4; ++s)
+        chain_cards += max(0, needed[s] + 1 - node.GetFoundation(s).size());
+
+      int total_runs = 0;
+      int worst_column = 0;
+      for (int t = 0; t < 8; ++t) {
+        const auto& tableau = node.GetTableau(t);
+        auto in_chain = [&](Card card) { return card.rank() <= needed[card.suit()]; };
+        int deepest = -1, column_chain = 0;
+        for (int j = tableau.size() - 1; j >= 0; --j) {
+          if (in_chain(tableau.card(j))) {
+            deepest = j;
+            ++column_chain;
+          }
+        }
+        if (deepest < 0) continue;
+
+        int blockers = 0, runs = 0, kings = 0;
+        bool run_has_blocker = false;
+        for (int j = tableau.size() - 1; j > deepest; --j) {
+          Card card = tableau.card(j);
+          if (!in_chain(card)) {
+            ++blockers;
+            run_has_blocker = true;
+          }
+          // The run ends at j unless card j sits on a matching parent.
+          if (j - 1 == deepest || !card.IsBelow(tableau.card(j - 1))) {
+            if (run_has_blocker) {
+              ++runs;
+              // A king whose queen is on the foundation can follow it there.
+              if (card.rank() == KING && !in_chain(card) &&
+                  node.GetFoundation(card.suit()).size() != KING)
+                ++kings;
+            }
+            run_has_blocker = false;
+          }
+        }
+        total_runs += runs;
+        if (pattern_database_)
+          worst_column = max(worst_column,
+                             column_chain + pattern_database_->Lookup(
+                                 blockers, runs, kings, free_cells, empty_columns));
+      }
+      best = min(best, max(chain_cards + total_runs, worst_column));
+    }
+    return best == INT_MAX ? 0 : best;
+  }
+
+ private:
+  static void ScanTableau(const Tableau& tableau, signed char* depth) {
+    for (int j = 0; j < tableau.size(); ++j)
+      depth[tableau.card(j).card()] = tableau.size() - 1 - j;
+  }
+
+  // Cards covering the target plus those covering each lower card of its suit
+  // still to be played.
+  static int ChainCost(const signed char* depth, Card target) {
+    int cost = 0;
+    for (int r = target.rank(); r >= ACE; --r) {
+      int d = depth[Card(target.suit(), r).card()];
+      if (d == kInFoundation) break;
+      cost += d;
+    }
+    return cost;
+  }
+
+  // If the board is clogged (few mobile slots), prefer states that free it.
+  static int ClutterPenalty(const Node& node) {
+    int mobile_slots = 4 - node.GetReserve().size();
+    for (int i = 0; i < 8; ++i) {
+      if (node.GetTableau(i).size() == 0) mobile_slots++;
+    }
+    if (mobile_slots == 0) return 15;
+    if (mobile_slots == 1) return 8;
+    if (mobile_slots == 2) return 3;
+    return 0;
+  }
+
+  const vector<Card> targets_;
+  const int required_count_;
+  const PatternDatabase* const pattern_database_;
+  const Node* parent_ = nullptr;
+  signed char depth_[kTotalCards];
+};
+
+#endif
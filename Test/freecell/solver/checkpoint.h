@@ -0,0 +1,190 @@
+#ifndef CHECKPOINT_H
+#define CHECKPOINT_H
+
+#include <stdint.h>
+#include <stdio.h>
+#include <string.h>
+
+#include <string>
+#include <unordered_map>
+#include <vector>
+using namespace std;
+
+#include "mapped_file.h"
+#include "node.h"
+
+// Search state of a long solve, saved now and then so that a run stopped by
+// a timeout, a crash or the user is picked up by the next run on the same
+// board instead of starting over.
+//
+// File layout (native byte order, read back through a MappedFile):
+//   CheckpointHeader
+//   num_links  CheckpointLink  the move tree, every parent before its children
+//   num_nodes  CheckpointNode  each followed by state_size bytes of Node
+//                              state (see Node::SaveState), padded to 8 bytes
+// Nodes kept only for duplicate detection are stored without their move
+// history (link 0). The key in the header names the board, the goal and the
+// options the search ran with; a checkpoint with another key is ignored, as
+// is one written by a build with another Node layout.
+struct CheckpointHeader {
+  char magic[4];
+  uint32_t version;
+  uint32_t state_size;
+  uint32_t search;
+  uint64_t key;
+  int32_t depth;       // Beam: the level being expanded
+  int32_t upperbound;  // Beam: moves of the best solution so far
+  int64_t nodes_generated;
+  int64_t nodes_expanded;
+  int64_t next_id;     // A*: tie breaker of the next state pushed
+  uint32_t num_links;
+  uint32_t num_nodes;
+};
+
+struct CheckpointLink {
+  uint32_t parent;  // index + 1, 0 at the root
+  uint32_t move;
+};
+
+struct CheckpointNode {
+  uint32_t link;  // index + 1 of the link of its parent, 0 for none
+  uint32_t kind;  // what the search keeps the node for
+  int32_t g;
+  int32_t h;
+  int64_t id;
+};
+
+class CheckpointWriter {
+ public:
+  static constexpr char kMagic[4] = {'F', 'C', 'C', 'K'};
+  static constexpr uint32_t kVersion = 1;
+
+  // Adds `node`, with its move history unless it is only there to be found
+  // as a duplicate.
+  void Add(const Node& node, int kind, bool with_moves, int g = 0, int h = 0, long long id = 0) {
+    CheckpointNode record = {with_moves ? LinkIndex(node.parent_link()) : 0,
+                             (uint32_t)kind, g, h, id};
+    size_t offset = nodes_.size();
+    nodes_.resize(offset + RecordSize());
+    memcpy(&nodes_[offset], &record, sizeof(record));
+    node.SaveState(&nodes_[offset + sizeof(record)]);
+    ++num_nodes_;
+  }
+
+  // Writes the file next to `path` and moves it into place, so a run killed
+  // while saving leaves the previous checkpoint.
+  bool Save(const string& path, CheckpointHeader header) const {
+    memcpy(header.magic, kMagic, sizeof(kMagic));
+    header.version = kVersion;
+    header.state_size = Node::StateSize();
+    header.num_links = links_.size();
+    header.num_nodes = num_nodes_;
+
+    string temp_path = path + ".tmp";
+    FILE* out = fopen(temp_path.c_str(), "wb");
+    if (!out) return false;
+    bool ok = fwrite(&header, sizeof(header), 1, out) == 1 &&
+              fwrite(links_.data(), sizeof(CheckpointLink), links_.size(), out) == links_.size() &&
+              fwrite(nodes_.data(), 1, nodes_.size(), out) == nodes_.size();
+    ok = (fclose(out) == 0) && ok;
+#ifdef _WIN32
+    if (ok) remove(path.c_str());
+#endif
+    if (!ok || rename(temp_path.c_str(), path.c_str()) != 0) {
+      remove(temp_path.c_str());
+      return false;
+    }
+    return true;
+  }
+
+  static size_t RecordSize() {
+    return (sizeof(CheckpointNode) + Node::StateSize() + 7) & ~size_t(7);
+  }
+
+ private:
+  // Index + 1 of `link`, adding it and any ancestors not written yet.
+  uint32_t LinkIndex(const MoveLink* link) {
+    vector<const MoveLink*> chain;
+    for (; link && !link_index_.count(link); link = link->parent) chain.push_back(link);
+    uint32_t index = link ? link_index_[link] : 0;
+    for (auto it = chain.rbegin(); it != chain.rend(); ++it) {
+      links_.push_back({index, (*it)->move});
+      index = links_.size();
+      link_index_[*it] = index;
+    }
+    return index;
+  }
+
+  unordered_map<const MoveLink*, uint32_t> link_index_;
+  vector<CheckpointLink> links_;
+  vector<char> nodes_;
+  uint32_t num_nodes_ = 0;
+};
+
+class CheckpointReader {
+ public:
+  // Maps the checkpoint at `path`; false if there is none for this search.
+  bool Open(const string& path, uint32_t search, uint64_t key) {
+    if (!file_.Open(path)) return false;
+    if (file_.size() < sizeof(CheckpointHeader)) return Fail();
+    header_ = reinterpret_cast<const CheckpointHeader*>(file_.data());
+    if (memcmp(header_->magic, CheckpointWriter::kMagic, sizeof(header_->magic)) != 0 ||
+        header_->version != CheckpointWriter::kVersion ||
+        header_->state_size != Node::StateSize() || header_->search != search ||
+        header_->key != key)
+      return Fail();
+    links_ = reinterpret_cast<const CheckpointLink*>(header_ + 1);
+    nodes_ = reinterpret_cast<const char*>(links_ + header_->num_links);
+    size_t size = sizeof(CheckpointHeader) + header_->num_links * sizeof(CheckpointLink) +
+                  header_->num_nodes * CheckpointWriter::RecordSize();
+    if (file_.size() != size) return Fail();
+    for (uint32_t i = 0; i < header_->num_links; ++i) {
+      if (links_[i].parent > i) return Fail();
+    }
+    for (int i = 0; i < num_nodes(); ++i) {
+      if (Record(i).link > header_->num_links) return Fail();
+    }
+    return true;
+  }
+
+  const CheckpointHeader& header() const { return *header_; }
+  int num_nodes() const { return header_->num_nodes; }
+  const CheckpointNode& Record(int i) const {
+    return *reinterpret_cast<const CheckpointNode*>(nodes_ + i * CheckpointWriter::RecordSize());
+  }
+
+  // Rebuilds the move tree in `pool`, each link referenced once by every
+  // link and node pointing at it. Every node must then be created with
+  // NewNode for the counts to come out right.
+  void LoadLinks(Pool* pool) {
+    vector<int> refs(header_->num_links + 1);
+    for (uint32_t i = 0; i < header_->num_links; ++i) ++refs[links_[i].parent];
+    for (int i = 0; i < num_nodes(); ++i) ++refs[Record(i).link];
+    links_in_pool_.assign(header_->num_links + 1, nullptr);
+    for (uint32_t i = 0; i < header_->num_links; ++i) {
+      links_in_pool_[i + 1] =
+          pool->NewLink(links_in_pool_[links_[i].parent], links_[i].move, refs[i + 1]);
+    }
+  }
+
+  Node* NewNode(int i, Pool* pool) const {
+    Node* node = pool->New();
+    node->RestoreState(nodes_ + i * CheckpointWriter::RecordSize() + sizeof(CheckpointNode),
+                       links_in_pool_[Record(i).link]);
+    return node;
+  }
+
+ private:
+  bool Fail() {
+    file_.Close();
+    return false;
+  }
+
+  MappedFile file_;
+  const CheckpointHeader* header_ = nullptr;
+  const CheckpointLink* links_ = nullptr;
+  const char* nodes_ = nullptr;
+  vector<MoveLink*> links_in_pool_;
+};
+
+#endif
@@ -3,11 +3,14 @@
 
 #include <assert.h>
 
+#include <algorithm>
+
 #include "node.h"
 
 class HashTable {
  public:
-  HashTable(int num_bins) : HashTable(num_bins, false) {}
+  // Exact tables (-x) verify every key match against the whole state.
+  HashTable(int num_bins) : HashTable(num_bins, options.exact_duplicates) {}
 
   HashTable(int num_bins, bool exact)
       : exact_(exact), bins_(num_bins), bin_mask_(num_bins - 1) {
@@ -61,11 +64,13 @@ class HashTable {
       // Aggressively consider nodes to be the same when they look similar.
       // Strict comparison uses (... && *node == *cursor).
       if (node->hash() == cursor->hash()) {
-        if ((!exact_ && node->reserve() == cursor->reserve()) ||
-            (exact_ && *node == *cursor)) {
+        if (SameCards(node->reserve(), cursor->reserve()) && (!exact_ || *node == *cursor)) {
           ++num_hits_;
           return cursor;
         }
+        // Same key, different state: a look-alike only an exact table tells
+        // apart, or (rarely, with 64-bit keys) a true collision.
+        ++num_collisions_;
       }
     }
     return nullptr;
@@ -96,8 +101,45 @@ class HashTable {
 
   bool empty() const { return !size_; }
   int size() const { return size_; }
+  int num_bins() const { return bins_.size(); }
+
+  long num_lookups() const { return num_lookups_; }
+  long num_hits() const { return num_hits_; }
+  long num_collisions() const { return num_collisions_; }
+  long num_additions() const { return num_additions_; }
+  long num_removals() const { return num_removals_; }
+
+  // Calls f(Node*) on every node in the table.
+  template <typename F>
+  void ForEach(F f) const {
+    for (auto* bin : bins_) {
+      for (auto cursor = bin; cursor; cursor = cursor->next_) f(cursor);
+    }
+  }
+
+  // Longest collision chain currently in the table.
+  int MaxChainLength() const {
+    int max_count = 0;
+    for (const auto& bin : bins_) {
+      int count = 0;
+      for (auto cursor = bin; cursor; cursor = cursor->next_) ++count;
+      max_count = std::max(max_count, count);
+    }
+    return max_count;
+  }
 
  private:
+  // Free cells hold a set: the same cards in another order are the same state.
+  static bool SameCards(const Node::Reserve& a, const Node::Reserve& b) {
+    if (a.size() != b.size()) return false;
+    for (int i = 0; i < a.size(); ++i) {
+      bool found = false;
+      for (int j = 0; j < b.size() && !found; ++j) found = (a[i] == b[j]);
+      if (!found) return false;
+    }
+    return true;
+  }
+
   const bool exact_;
   vector<Node*> bins_;
   int bin_mask_;
@@ -105,6 +147,7 @@ class HashTable {
 
   mutable long num_lookups_ = 0;
   mutable long num_hits_ = 0;
+  mutable long num_collisions_ = 0;
   long num_additions_ = 0;
   long num_removals_ = 0;
 };
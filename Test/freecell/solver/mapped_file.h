@@ -0,0 +1,93 @@
+#ifndef MAPPED_FILE_H
+#define MAPPED_FILE_H
+
+#include <stddef.h>
+#include <string>
+using namespace std;
+
+#ifdef _WIN32
+#include <windows.h>
+#else
+#include <fcntl.h>
+#include <sys/mman.h>
+#include <sys/stat.h>
+#include <unistd.h>
+#endif
+
+// Read-only memory mapping of a whole file. Pages are loaded on first touch
+// and shared between processes mapping the same file.
+class MappedFile {
+ public:
+  MappedFile() {}
+  MappedFile(const MappedFile&) = delete;
+  MappedFile& operator=(const MappedFile&) = delete;
+  ~MappedFile() { Close(); }
+
+  bool Open(const string& path) {
+    Close();
+#ifdef _WIN32
+    file_ = CreateFileA(path.c_str(), GENERIC_READ, FILE_SHARE_READ, nullptr,
+                        OPEN_EXISTING, FILE_ATTRIBUTE_NORMAL, nullptr);
+    if (file_ == INVALID_HANDLE_VALUE) return false;
+    LARGE_INTEGER size;
+    if (!GetFileSizeEx(file_, &size) || size.QuadPart == 0) {
+      Close();
+      return false;
+    }
+    mapping_ = CreateFileMappingA(file_, nullptr, PAGE_READONLY, 0, 0, nullptr);
+    if (!mapping_) {
+      Close();
+      return false;
+    }
+    data_ = static_cast<const unsigned char*>(
+        MapViewOfFile(mapping_, FILE_MAP_READ, 0, 0, 0));
+    size_ = size.QuadPart;
+#else
+    int fd = open(path.c_str(), O_RDONLY);
+    if (fd < 0) return false;
+    struct stat st;
+    if (fstat(fd, &st) != 0 || st.st_size == 0) {
+      close(fd);
+      return false;
+    }
+    void* data = mmap(nullptr, st.st_size, PROT_READ, MAP_SHARED, fd, 0);
+    close(fd);
+    if (data == MAP_FAILED) return false;
+    data_ = static_cast<const unsigned char*>(data);
+    size_ = st.st_size;
+#endif
+    if (!data_) {
+      Close();
+      return false;
+    }
+    return true;
+  }
+
+  void Close() {
+#ifdef _WIN32
+    if (data_) UnmapViewOfFile(data_);
+    if (mapping_) CloseHandle(mapping_);
+    if (file_ != INVALID_HANDLE_VALUE) CloseHandle(file_);
+    mapping_ = nullptr;
+    file_ = INVALID_HANDLE_VALUE;
+#else
+    if (data_) munmap(const_cast<unsigned char*>(data_), size_);
+#endif
+    data_ = nullptr;
+    size_ = 0;
+  }
+
+  bool is_open() const { return data_ != nullptr; }
+  const unsigned char* data() const { return data_; }
+  size_t size() const { return size_; }
+
+ private:
+  const unsigned char* data_ = nullptr;
+  size_t size_ = 0;
+#ifdef _WIN32
+  HANDLE file_ = INVALID_HANDLE_VALUE;
+  HANDLE mapping_ = nullptr;
+#endif
+};
+
+#endif
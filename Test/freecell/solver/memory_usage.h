@@ -0,0 +1,36 @@
+#ifndef MEMORY_USAGE_H
+#define MEMORY_USAGE_H
+
+#ifdef _WIN32
+#include <windows.h>
+#include <psapi.h>
+#else
+#include <sys/resource.h>
+#endif
+
+// Peak resident memory of this process in bytes, 0 if unknown.
+inline long long PeakMemoryBytes() {
+#ifdef _WIN32
+  PROCESS_MEMORY_COUNTERS counters;
+  if (!GetProcessMemoryInfo(GetCurrentProcess(), &counters, sizeof(counters)))
+    return 0;
+  return counters.PeakWorkingSetSize;
+#else
+  struct rusage usage;
+  if (getrusage(RUSAGE_SELF, &usage) != 0) return 0;
+#ifdef __APPLE__
+  return usage.ru_maxrss;
+#else
+  return usage.ru_maxrss * 1024LL;
+#endif
+#endif
+}
+
+// Largest power of two not above `n` (at least 1).
+inline int FloorPowerOfTwo(long long n) {
+  int result = 1;
+  while ((long long)result * 2 <= n && result < (1 << 30)) result *= 2;
+  return result;
+}
+
+#endif
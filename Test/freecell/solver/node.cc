@@ -4,10 +4,11 @@ bool initialized = false;
 Node* Node::pool_;
 Node Node::goal_;
 
-vector<unsigned> Node::reserve_rand_;
-vector<vector<unsigned>> Node::tableau_unsorted_rand_;
-vector<vector<unsigned>> Node::tableau_sorted_rand_;
-vector<vector<unsigned>> Node::tableau_top_rand_;
+vector<Node::HashKey> Node::reserve_rand_;
+vector<vector<Node::HashKey>> Node::tableau_unsorted_rand_;
+vector<vector<Node::HashKey>> Node::tableau_sorted_rand_;
+vector<vector<Node::HashKey>> Node::tableau_top_rand_;
+int Node::super_move_sizes_[kMaxFreeCells + 1][9];
 
 void Node::Initialize() {
   if (initialized) return;
@@ -19,11 +20,16 @@ void Node::Initialize() {
   tableau_sorted_rand_.resize(8);
   tableau_top_rand_.resize(8);
   for (int i = 0; i < 8; ++i) {
-    InitializeHashRand(8, &tableau_unsorted_rand_[i]);
+    InitializeHashRand(16, &tableau_unsorted_rand_[i]);
     InitializeHashRand(14, &tableau_sorted_rand_[i]);
     InitializeHashRand(kTotalCards, &tableau_top_rand_[i]);
   }
 
+  for (int free_cells = 0; free_cells <= kMaxFreeCells; ++free_cells) {
+    for (int empty_tableaus = 0; empty_tableaus <= 8; ++empty_tableaus)
+      super_move_sizes_[free_cells][empty_tableaus] = (free_cells + 1) << empty_tableaus;
+  }
+
   pool_ = nullptr;
 
   for (int i = 0; i < 4; ++i) {
@@ -33,8 +39,15 @@ void Node::Initialize() {
   goal_.ComputeHash();
 }
 
-void Node::InitializeHashRand(int count, vector<unsigned>* rand) {
-  for (int i = 0; i < count; ++i) rand->push_back(::rand());
+void Node::InitializeHashRand(int count, vector<HashKey>* rand) {
+  // splitmix64: fixed keys, so runs (and Beam partitions) are reproducible.
+  static HashKey state = 0x9e3779b97f4a7c15ULL;
+  for (int i = 0; i < count; ++i) {
+    HashKey z = (state += 0x9e3779b97f4a7c15ULL);
+    z = (z ^ (z >> 30)) * 0xbf58476d1ce4e5b9ULL;
+    z = (z ^ (z >> 27)) * 0x94d049bb133111ebULL;
+    rand->push_back(z ^ (z >> 31));
+  }
 }
 
 void Node::ShowSummary() const {
@@ -171,13 +184,47 @@ string Node::CompleteSolution() {
 
 Node* Pool::New(const Node& node) { return new (Allocate()) Node(node); }
 Node* Pool::New() { return new (Allocate()) Node(); }
-void Pool::Delete(Node* node) { Free(node); }
+void Pool::Delete(Node* node) {
+  if (node) Release(node->parent_link_);
+  Free(node);
+}
+
+MoveLink* Pool::NewLink(MoveLink* parent, int move, int refs) {
+  if (!free_links_) {
+    link_chunks_.emplace_back(new MoveLink[kLinkChunkSize]);
+    auto links = link_chunks_.back().get();
+    for (int i = 0; i < kLinkChunkSize; ++i) {
+      links[i].parent = free_links_;
+      free_links_ = &links[i];
+    }
+  }
+  auto link = free_links_;
+  free_links_ = link->parent;
+  link->parent = parent;
+  link->move = move;
+  link->refs.store(refs, std::memory_order_relaxed);
+  return link;
+}
+
+void Pool::Release(MoveLink* link) {
+  while (link && link->refs.fetch_sub(1, std::memory_order_acq_rel) == 1) {
+    auto parent = link->parent;
+    link->parent = free_links_;
+    free_links_ = link;
+    link = parent;
+  }
+}
+
+long long Pool::allocated_bytes() const {
+  return (long long)chunks_.size() * kChunkSize * sizeof(Node) +
+         (long long)link_chunks_.size() * kLinkChunkSize * sizeof(MoveLink);
+}
 
 Node* Pool::Allocate() {
   if (!head_) {
-    chunks_.emplace_back(new Node[256]);
+    chunks_.emplace_back(new Node[kChunkSize]);
     auto nodes = chunks_.back().get();
-    for (int i = 0; i < 256; ++i) Free(&nodes[i]);
+    for (int i = 0; i < kChunkSize; ++i) Free(&nodes[i]);
   }
   auto old_head = head_;
   head_ = head_->after_;
@@ -1,10 +1,12 @@
 #ifndef NODE_H
 #define NODE_H
 
+#include <stdint.h>
 #include <stdlib.h>
 #include <string.h>
 
 #include <algorithm>
+#include <atomic>
 #include <memory>
 #include <set>
 #include <string>
@@ -12,7 +14,6 @@
 using namespace std;
 
 #include "array.h"
-#include "bit_stream.h"
 #include "foundation.h"
 #include "list.h"
 #include "move.h"
@@ -20,29 +21,55 @@ using namespace std;
 #include "tableau.h"
 
 static constexpr int kTotalCards = 52;
+static constexpr int kMaxFreeCells = 4;
 static constexpr int kMinMoves = 0;
 static constexpr int kMaxMoves = 5000;
 
 class Node;
 
+// Move histories form one tree shared by all nodes. A MoveLink stands for an
+// expanded node: the link of the node it was expanded from and its index
+// among that node's children (in the order Expand generates them). A node
+// only points at the link of its parent, so its size does not depend on its
+// depth; the path is walked back once a solution is found. Links are counted
+// by the nodes and links pointing at them and go back to a Pool when unused.
+struct MoveLink {
+  MoveLink* parent = nullptr;
+  std::atomic<unsigned> refs{0};
+  unsigned char move = 0;
+};
+
 class Pool {
  public:
+  static constexpr int kChunkSize = 256;
+  static constexpr int kLinkChunkSize = 4096;
+
   Node* New();
   Node* New(const Node& node);
   void Delete(Node* node);
 
+  MoveLink* NewLink(MoveLink* parent, int move, int refs);
+  // Drops one reference to `link`, freeing it and any ancestors left unused.
+  // Links may be released into another pool than the one they came from.
+  void Release(MoveLink* link);
+
+  // Chunks are never returned, so this is also the peak.
+  long long allocated_bytes() const;
+
  private:
   Node* Allocate();
   void Free(Node* node);
 
   Node* head_ = nullptr;
   vector<unique_ptr<Node[]>> chunks_;
+  MoveLink* free_links_ = nullptr;
+  vector<unique_ptr<MoveLink[]>> link_chunks_;
 };
 
 class Node {
  public:
-  using CompressedMoves = BitStream<512>;
-  using Reserve = Array<Card, 4>;
+  using Reserve = Array<Card, kMaxFreeCells>;
+  using HashKey = uint64_t;
 
   Node() {}
   Node(int deal_num) {
@@ -62,12 +89,15 @@ class Node {
     }
 
     cards_unsorted_ = 0;
+    empty_tableaus_ = 0;
     for (int i = 0; i < 8; ++i) {
       cards_unsorted_ += tableau_[i].unsorted_size();
+      empty_tableaus_ += tableau_[i].empty();
     }
 
     moves_performed_ = 0;
     moves_estimated_ = kTotalCards;
+    ComputeHash();
   }
 
   void LoadState(const vector<Card>& reserve, const vector<Card>& foundation_tops, const vector<vector<Card>>& tableaus) {
@@ -111,17 +141,22 @@ class Node {
       
       // Recalculate metrics
       cards_unsorted_ = 0;
+      empty_tableaus_ = 0;
       for (int i = 0; i < 8; ++i) {
         cards_unsorted_ += tableau_[i].unsorted_size();
+        empty_tableaus_ += tableau_[i].empty();
       }
       moves_performed_ = 0;
       moves_estimated_ = kTotalCards; // Approximation
+      ComputeHash();
   }
 
   Node(const Node& node) {
-    int copy_size = reinterpret_cast<char*>(&moves_) + node.moves_.copy_size() -
-                    reinterpret_cast<char*>(this);
+    int copy_size = reinterpret_cast<const char*>(&node.prev_) -
+                    reinterpret_cast<const char*>(&node);
     memcpy(this, &node, copy_size);
+    // The copy shares the move history.
+    if (parent_link_) parent_link_->refs.fetch_add(1, std::memory_order_relaxed);
   }
 
   const Tableau& GetTableau(int i) const { return tableau_[i]; }
@@ -210,10 +245,7 @@ class Node {
     return true;
   }
   bool AllowTableauToTableau(int t1, int t2) const {
-    for (int i = 0; i < forbidden_moves_.size(); ++i) {
-      if (forbidden_moves_[i].from == t1 && forbidden_moves_[i].to == t2)
-        return false;
-    }
+    if (forbidden_moves_ & MoveBit(t1, t2)) return false;
     if (last_move_type() == kTableauToReserve)
       return last_move_from() == t1 || last_move_from() == t2;
     return true;
@@ -227,6 +259,19 @@ class Node {
 
   List<Node> Expand(Pool* pool) const {
     List<Node> new_nodes;
+    // Column tops bucketed by the card they take: accepting[rank][color] has
+    // a bit for each column whose top is one rank higher in the other color.
+    // Targets are then read off as masks, lowest column first.
+    unsigned char accepting[13][2] = {};
+    unsigned char empty = 0;
+    for (int i = 0; i < 8; ++i) {
+      if (tableau_[i].empty()) {
+        empty |= 1 << i;
+      } else {
+        auto top = tableau_[i].Top();
+        if (top.rank() > ACE) accepting[top.rank() - 1][!top.color()] |= 1 << i;
+      }
+    }
     for (int r = 0; r < reserve_.size(); ++r) {
       const auto& card = reserve_[r];
       if (AllowReserveToFoundation()) {
@@ -237,8 +282,10 @@ class Node {
       }
       // only need to try one empty tableau if any.
       bool tried_empty_tableau = false;
-      for (int i = 0; i < 8; ++i) {
-        if (tableau_[i].Accepting(card) && AllowReserveToTableau(r, i)) {
+      for (unsigned targets = accepting[card.rank()][card.color()] | empty;
+           targets; targets &= targets - 1) {
+        int i = __builtin_ctz(targets);
+        if (AllowReserveToTableau(r, i)) {
           if (!tableau_[i].empty() || !tried_empty_tableau) {
             new_nodes.Append(pool->New(*this)->ReserveToTableau(r, i)->AutoPlay());
             if (tableau_[i].empty()) tried_empty_tableau = true;
@@ -256,26 +303,30 @@ class Node {
           new_nodes.Append(pool->New(*this)->TableauToFoundation(i)->AutoPlay());
       }
 
+      // Besides the empty columns, the targets are the columns accepting a
+      // card of the sorted run within super move reach of a non-empty one.
+      auto top = tableau_[i].Top();
+      int reach = min(tableau_[i].sorted_size(),
+                      super_move_sizes_[FreeCells()][empty_tableaus_]);
+      unsigned targets = empty;
+      for (int k = 0; k < reach; ++k)
+        targets |= accepting[top.rank() + k][top.color() ^ (k & 1)];
+
       bool tried_empty_tableau = false;
-      for (int j = 0; j < 8; ++j) {
-        if (j == i) continue;
+      for (; targets; targets &= targets - 1) {
+        int j = __builtin_ctz(targets);
         if (!AllowTableauToTableau(i, j)) continue;
 
-        auto count = tableau_[i].CountMovable(tableau_[j]);
-        if (count > 0) {
+        if (tableau_[j].empty()) {
           // Don't move a fully sorted stack to empty tableau.
-          if (tableau_[j].empty() && tableau_[i].unsorted_size() == 0 &&
+          if (tableau_[i].unsorted_size() == 0 &&
               tableau_[i].sorted_size() <= MaxSuperMoveSize(i, j))
             continue;
           // Only need to try one empty tableau if any.
-          if (tableau_[j].empty() || count <= MaxSuperMoveSize(i, j)) {
-            if (tableau_[j].empty()) {
-              if (tried_empty_tableau) continue;
-              else tried_empty_tableau = true;
-            }
-            new_nodes.Append(pool->New(*this)->TableauToTableau(i, j)->AutoPlay());
-          }
+          if (tried_empty_tableau) continue;
+          tried_empty_tableau = true;
         }
+        new_nodes.Append(pool->New(*this)->TableauToTableau(i, j)->AutoPlay());
       }
 
       if (reserve_.size() < reserve_.max_size() && AllowTableauToReserve(i)) {
@@ -283,7 +334,7 @@ class Node {
       }
     }
 
-    EncodeMoves(new_nodes);
+    EncodeMoves(new_nodes, pool);
     return new_nodes;
   }
 
@@ -326,15 +377,13 @@ class Node {
   }
 
   int MaxSuperMoveSize(int from, int to) const {
-    int free_cells = reserve_.max_size() - reserve_.size();
-    int empty_tableaus = 0;
-    for (int t = 0; t < 8; ++t) {
-      if (t == from || t == to) continue;
-      if (tableau_[t].empty()) ++empty_tableaus;
-    }
-    return (free_cells + 1) << empty_tableaus;
+    int empty_tableaus =
+        empty_tableaus_ - tableau_[from].empty() - tableau_[to].empty();
+    return super_move_sizes_[FreeCells()][empty_tableaus];
   }
 
+  int FreeCells() const { return reserve_.max_size() - reserve_.size(); }
+
   int FindReserve() const { return reserve_.size(); }
 
   int FindFoundation(Card card) const {
@@ -346,6 +395,7 @@ class Node {
   Node* ReserveToFoundation(int r, bool auto_play = false) {
     Card card = reserve_[r];
     reserve_.erase(r);
+    hash_ ^= reserve_rand_[card.card()];
     foundation_[card.suit()].Push(card);
     moves_estimated_ -= 1;
     if (auto_play) {
@@ -361,7 +411,10 @@ class Node {
   Node* ReserveToTableau(int r, int t) {
     Card card = reserve_[r];
     reserve_.erase(r);
+    hash_ ^= reserve_rand_[card.card()] ^ TableauKey(t);
+    empty_tableaus_ -= tableau_[t].empty();
     tableau_[t].Push(card);
+    hash_ ^= TableauKey(t);
     moves_estimated_ -= 0;
     last_move_ = Move(kReserveToTableau, r, t);
     moves_performed_++;
@@ -372,7 +425,10 @@ class Node {
 
   Node* TableauToFoundation(int t, bool auto_play = false) {
     auto card = tableau_[t].Top();
+    hash_ ^= TableauKey(t);
     int new_sorted = tableau_[t].Pop();
+    hash_ ^= TableauKey(t);
+    empty_tableaus_ += tableau_[t].empty();
     foundation_[card.suit()].Push(card);
     cards_unsorted_ -= new_sorted;
     moves_estimated_ -= 1;
@@ -389,8 +445,11 @@ class Node {
 
   Node* TableauToReserve(int t) {
     auto card = tableau_[t].Top();
+    hash_ ^= TableauKey(t);
     int new_sorted = tableau_[t].Pop();
+    empty_tableaus_ += tableau_[t].empty();
     reserve_.push_back(card);
+    hash_ ^= TableauKey(t) ^ reserve_rand_[card.card()];
     cards_unsorted_ -= new_sorted;
     moves_estimated_ -= 0;
     last_move_ = Move(kTableauToReserve, t, reserve_.size() - 1);
@@ -401,7 +460,12 @@ class Node {
   }
 
   Node* TableauToTableau(int s, int t) {
-    int new_sorted = tableau_[s].Move(&tableau_[t], MaxSuperMoveSize(s, t));
+    hash_ ^= TableauKey(s) ^ TableauKey(t);
+    int super_move_size = MaxSuperMoveSize(s, t);
+    empty_tableaus_ -= tableau_[t].empty();
+    int new_sorted = tableau_[s].Move(&tableau_[t], super_move_size);
+    empty_tableaus_ += tableau_[s].empty();
+    hash_ ^= TableauKey(s) ^ TableauKey(t);
     cards_unsorted_ -= new_sorted;
     moves_estimated_ -= 0;
     last_move_ = Move(kTableauToTableau, s, t);
@@ -414,14 +478,12 @@ class Node {
   }
 
   void AddMoveRestriction(int from, int to) {
-    forbidden_moves_.push_back({(char)from, (char)to});
+    forbidden_moves_ |= MoveBit(from, to);
   }
 
   void LiftMoveRestriction(int t) {
-    for (int i = 0; i < forbidden_moves_.size(); ++i) {
-      if (forbidden_moves_[i].from == t || forbidden_moves_[i].to == t)
-        forbidden_moves_.erase(i--);
-    }
+    // Every move from column t (a byte) and to it (a bit in each byte).
+    forbidden_moves_ &= ~((0xffULL << (t * 8)) | (0x0101010101010101ULL << t));
   }
 
   void CheckInvariant() const {
@@ -449,14 +511,57 @@ class Node {
       Card card(i);
       if (!in_foundation(card)) assert(cards.find(card) != cards.end());
     }
+    HashKey hash = 0;
+    for (int r = 0; r < reserve_.size(); ++r) hash ^= reserve_rand_[reserve_[r].card()];
+    for (int t = 0; t < 8; ++t) hash ^= TableauKey(t);
+    assert(hash == hash_);
+    int empty_tableaus = 0;
+    for (int t = 0; t < 8; ++t) empty_tableaus += tableau_[t].empty();
+    assert(empty_tableaus == empty_tableaus_);
 #endif
   }
 
   string CompleteSolution();
 
-  void EncodeMoves(const List<Node>& new_nodes) const {
+  void EncodeMoves(const List<Node>& new_nodes, Pool* pool) const {
+    if (new_nodes.empty()) return;
+    // Each child was copied holding a reference to parent_link_; the new
+    // link to this node keeps one of them.
+    auto* link = pool->NewLink(parent_link_, move_index_, new_nodes.size());
+    if (parent_link_ && new_nodes.size() > 1)
+      parent_link_->refs.fetch_sub(new_nodes.size() - 1, std::memory_order_relaxed);
     int index = 0;
-    for (auto* node : new_nodes) node->moves_.Write(index++, new_nodes.size());
+    for (auto* node : new_nodes) {
+      node->parent_link_ = link;
+      node->move_index_ = index++;
+    }
+  }
+
+  // Indices of the moves from the root to this node, each one among the
+  // children Expand generates at that point.
+  vector<int> MovePath() const {
+    vector<int> path;
+    if (!parent_link_) return path;
+    path.push_back(move_index_);
+    for (auto* link = parent_link_; link->parent; link = link->parent)
+      path.push_back(link->move);
+    reverse(path.begin(), path.end());
+    return path;
+  }
+
+  const MoveLink* parent_link() const { return parent_link_; }
+
+  // The fields copied along with a node up to its move history, as saved in
+  // a checkpoint. Only meaningful for the board loaded when it was saved.
+  static int StateSize() {
+    return reinterpret_cast<const char*>(&goal_.parent_link_) -
+           reinterpret_cast<const char*>(&goal_);
+  }
+  void SaveState(void* state) const { memcpy(state, this, StateSize()); }
+  // Takes over one reference to `parent_link`.
+  void RestoreState(const void* state, MoveLink* parent_link) {
+    memcpy(this, state, StateSize());
+    parent_link_ = parent_link;
   }
 
   void PlayMoves(const vector<Move>& moves);
@@ -466,7 +571,6 @@ class Node {
   const Reserve& reserve() const { return reserve_; }
   const Foundation& foundation(int f) const { return foundation_[f]; }
   const Tableau& tableau(int t) const { return tableau_[t]; }
-  const CompressedMoves& moves() const { return moves_; }
   const Move& last_move() const { return last_move_; }
 
   int bin() const { return cost(); }
@@ -591,24 +695,23 @@ class Node {
   }
   bool operator!=(const Node& n) const { return !(*this == n); }
 
-  unsigned hash() const { return hash_; }
+  // Zobrist key of the reserve cards and, per column, its unsorted and
+  // sorted sizes and top card. The moves keep it up to date; ComputeHash is
+  // only needed for a layout built by hand. Suits inside sorted runs are not
+  // part of it: HashTable merges such look-alike states unless it is exact.
+  HashKey hash() const { return hash_; }
 
   void ComputeHash() {
     hash_ = 0;
     for (int i = 0; i < reserve_.size(); ++i) {
-      hash_ += reserve_rand_[reserve_[i].card()];
-    }
-    for (int i = 0; i < 8; ++i) {
-      hash_ += tableau_unsorted_rand_[i][tableau_[i].unsorted_size()];
-      hash_ += tableau_sorted_rand_[i][tableau_[i].sorted_size()];
-      if (tableau_[i].sorted_size())
-        hash_ += tableau_top_rand_[i][tableau_[i].Top().card()];
+      hash_ ^= reserve_rand_[reserve_[i].card()];
     }
+    for (int i = 0; i < 8; ++i) hash_ ^= TableauKey(i);
   }
 
   static const Node& goal() { return goal_; }
   static void Initialize();
-  static void InitializeHashRand(int count, vector<unsigned>* rand);
+  static void InitializeHashRand(int count, vector<HashKey>* rand);
 
 #if 0
   static void* operator new(size_t size) {
@@ -640,6 +743,16 @@ class Node {
   Move last_auto_move() const { return last_auto_move_; }
 
  private:
+  static uint64_t MoveBit(int from, int to) { return 1ULL << (from * 8 + to); }
+
+  HashKey TableauKey(int i) const {
+    const auto& tableau = tableau_[i];
+    HashKey key = tableau_unsorted_rand_[i][tableau.unsorted_size()] ^
+                  tableau_sorted_rand_[i][tableau.sorted_size()];
+    if (tableau.sorted_size()) key ^= tableau_top_rand_[i][tableau.Top().card()];
+    return key;
+  }
+
   Foundation foundation_[4];
   Tableau tableau_[8];
   Reserve reserve_;
@@ -648,17 +761,18 @@ class Node {
   unsigned char moves_performed_ = 0;
   unsigned char moves_estimated_ = 0;
   unsigned char auto_plays = 0;
-  unsigned hash_ = 0;
+  unsigned char move_index_ = 0;  // among the children of the parent node
+  unsigned char empty_tableaus_ = 0;  // kept up to date by the moves
+  HashKey hash_ = 0;
 
-  struct M {
-    char from : 4;
-    char to : 4;
-  };
-  Array<M, 4> forbidden_moves_;
+  // Tableau to tableau moves that would just undo the last one, bit
+  // from * 8 + to; lifted once either column changes otherwise.
+  uint64_t forbidden_moves_ = 0;
   Move last_move_;
   Move last_auto_move_;
-  // Must be the last field before link pointers for copy to work.
-  CompressedMoves moves_;
+  // Link of the node this one was expanded from, nullptr at the root.
+  // Must be the last field before the list pointers for copy to work.
+  MoveLink* parent_link_ = nullptr;
 
   friend class HashTable;
   Node* prev_ = nullptr;
@@ -669,10 +783,12 @@ class Node {
   friend class Bucket;
   Node* after_ = nullptr;
 
-  static vector<unsigned> reserve_rand_;
-  static vector<vector<unsigned>> tableau_unsorted_rand_;
-  static vector<vector<unsigned>> tableau_sorted_rand_;
-  static vector<vector<unsigned>> tableau_top_rand_;
+  static vector<HashKey> reserve_rand_;
+  static vector<vector<HashKey>> tableau_unsorted_rand_;
+  static vector<vector<HashKey>> tableau_sorted_rand_;
+  static vector<vector<HashKey>> tableau_top_rand_;
+  // Cards a super move can carry, by free cells and empty columns.
+  static int super_move_sizes_[kMaxFreeCells + 1][9];
 
   static Node* pool_;
   static Node goal_;
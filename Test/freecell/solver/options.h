@@ -9,14 +9,22 @@ struct Options {
   Options() = default;
   Options(int argc, char* argv[]) {
     int c;
-    while ((c = getopt(argc, argv, "Aacd:n:q")) != -1) {
+    while ((c = getopt(argc, argv, "AH:T:ab:cd:k:m:n:p:qt:x")) != -1) {
       switch (c) {
         case 'A': max_auto_play = true; break;
+        case 'H': hint_ms = atoi(optarg); break;
+        case 'T': time_limit = atoi(optarg); break;
         case 'a': auto_play = true; break;
+        case 'b': lower_bound = atoi(optarg); break;
         case 'c': minimize_color_diff = true; break;
         case 'd': deal = atoi(optarg); break;
+        case 'k': checkpoint_seconds = atoi(optarg); break;
+        case 'm': memory_budget_mb = atoi(optarg); break;
         case 'n': num_beams = atoi(optarg); break;
+        case 'p': pattern_database = optarg; break;
         case 'q': quiet = true; break;
+        case 't': num_threads = atoi(optarg); break;
+        case 'x': exact_duplicates = true; break;
       }
     }
     if (optind < argc) seed = atoi(argv[optind]);
@@ -26,11 +34,25 @@ struct Options {
   int seed = 1;
   int beam_size = 1 << 15;
   int num_beams = 1;
+  int num_threads = 1;
+  // Hard cap for search memory in MB; 0 means unbounded.
+  int memory_budget_mb = 0;
+  // Hint mode: return one move found within this many ms; 0 solves fully.
+  int hint_ms = 0;
+  // Seconds between checkpoints of a long search; 0 disables them.
+  int checkpoint_seconds = 60;
+  // Seconds after which a search checkpoints and stops; 0 means no limit.
+  int time_limit = 0;
+  // Known lower bound on the moves a challenge needs (from the caller's preflight).
+  int lower_bound = 0;
   int deal = 0;
   bool minimize_color_diff = false;
   bool max_auto_play = false;
   bool auto_play = false;
   bool quiet = false;
+  // Duplicate detection compares whole states, not just their hash keys.
+  bool exact_duplicates = false;
+  std::string pattern_database = "challenge.pdb";
 
   // Challenge Support
   std::string challenge_code = "00";
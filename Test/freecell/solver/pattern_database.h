@@ -0,0 +1,99 @@
+#ifndef PATTERN_DATABASE_H
+#define PATTERN_DATABASE_H
+
+#include <string.h>
+
+#include <algorithm>
+#include <string>
+using namespace std;
+
+#include "mapped_file.h"
+
+// Pattern database for the challenge heuristics, built offline by
+// pdb_builder and memory-mapped by the solver.
+//
+// The abstracted subproblem is a single column: the cards covering the
+// deepest card still needed from it, described only by
+//   blockers  number of covering cards
+//   runs      number of maximal sorted runs among them
+//   kings     runs whose deepest card is a king (movable only to a free cell
+//             or an empty column); a king whose queen is on the foundation
+//             is not counted, it can go there
+//   cells     empty free cells
+//   columns   empty tableau columns
+// Each entry is the exact minimum number of moves that uncover the card in
+// that abstraction, where a run of any length can be split between moves,
+// supermoves are capped at (cells + 1) << columns, and freeing a cell or
+// column elsewhere costs one move.
+struct PatternDatabaseHeader {
+  char magic[4];
+  unsigned version;
+  unsigned char max_blockers;
+  unsigned char max_kings;
+  unsigned char max_cells;
+  unsigned char max_columns;
+  unsigned table_size;
+};
+
+class PatternDatabase {
+ public:
+  static constexpr char kMagic[4] = {'F', 'C', 'P', 'D'};
+  static constexpr unsigned kVersion = 1;
+  static constexpr int kMaxBlockers = 15;
+  static constexpr int kMaxKings = 4;
+  static constexpr int kMaxCells = 4;
+  static constexpr int kMaxColumns = 7;
+  static constexpr int kTableSize = (kMaxBlockers + 1) * (kMaxBlockers + 1) *
+                                    (kMaxKings + 1) * (kMaxCells + 1) *
+                                    (kMaxColumns + 1);
+
+  static int Index(int blockers, int runs, int kings, int cells, int columns) {
+    return (((blockers * (kMaxBlockers + 1) + runs) * (kMaxKings + 1) + kings) *
+                (kMaxCells + 1) + cells) * (kMaxColumns + 1) + columns;
+  }
+
+  static PatternDatabaseHeader MakeHeader() {
+    PatternDatabaseHeader header;
+    memset(&header, 0, sizeof(header));
+    memcpy(header.magic, kMagic, sizeof(kMagic));
+    header.version = kVersion;
+    header.max_blockers = kMaxBlockers;
+    header.max_kings = kMaxKings;
+    header.max_cells = kMaxCells;
+    header.max_columns = kMaxColumns;
+    header.table_size = kTableSize;
+    return header;
+  }
+
+  bool Open(const string& path) {
+    table_ = nullptr;
+    if (!file_.Open(path)) return false;
+    auto expected = MakeHeader();
+    if (file_.size() < sizeof(expected) + kTableSize ||
+        memcmp(file_.data(), &expected, sizeof(expected)) != 0) {
+      file_.Close();
+      return false;
+    }
+    table_ = file_.data() + sizeof(expected);
+    return true;
+  }
+
+  bool loaded() const { return table_ != nullptr; }
+
+  // Out-of-range patterns are clamped, which only lowers the bound.
+  int Lookup(int blockers, int runs, int kings, int cells, int columns) const {
+    if (blockers <= 0) return 0;
+    blockers = min(blockers, kMaxBlockers);
+    runs = min(runs, blockers);
+    kings = min(min(kings, kMaxKings), runs);
+    cells = min(cells, kMaxCells);
+    columns = min(columns, kMaxColumns);
+    return table_[Index(blockers, runs, kings, cells, columns)];
+  }
+
+ private:
+  MappedFile file_;
+  const unsigned char* table_ = nullptr;
+};
+
+#endif
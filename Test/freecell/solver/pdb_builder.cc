@@ -0,0 +1,146 @@
+// Builds the challenge pattern database used by the A* solver.
+//
+//   pdb_builder [output]      (default: challenge.pdb)
+//
+// Every entry of PatternDatabase is solved exactly by dynamic programming
+// over the abstract state
+//   (cards left, runs not started, kings among them,
+//    cards left in the top run, top run ends in a king, cells, columns)
+// in which the lengths of the runs are left to the solver, so the result is
+// the cheapest way to uncover the card over every column consistent with
+// the pattern.
+#include <stdio.h>
+
+#include <algorithm>
+#include <vector>
+using namespace std;
+
+#include "pattern_database.h"
+
+namespace {
+
+constexpr int kCards = PatternDatabase::kMaxBlockers + 1;
+constexpr int kKings = PatternDatabase::kMaxKings + 1;
+constexpr int kCells = PatternDatabase::kMaxCells + 1;
+constexpr int kColumns = PatternDatabase::kMaxColumns + 1;
+constexpr unsigned char kUnreachable = 255;
+
+class Builder {
+ public:
+  Builder() : dist_(kCards * kCards * kKings * kCards * 2 * kCells * kColumns,
+                    kUnreachable) {}
+
+  void Solve() {
+    for (int c = 0; c < kCards; ++c) {
+      for (int n = 0; n < kCards; ++n) {
+        for (int q = 0; q < kKings && q <= n; ++q) {
+          // Runs in progress only depend on fewer cards or more free space.
+          for (int t = 1; t <= c && t + n <= c; ++t) {
+            for (int tk = 0; tk < 2; ++tk) {
+              for (int f = kCells - 1; f >= 0; --f) {
+                for (int e = kColumns - 1; e >= 0; --e) SolveTopRun(c, n, q, t, tk, f, e);
+              }
+            }
+          }
+          for (int f = 0; f < kCells; ++f) {
+            for (int e = 0; e < kColumns; ++e) SolveNextRun(c, n, q, f, e);
+          }
+        }
+      }
+    }
+  }
+
+  vector<unsigned char> Table() const {
+    vector<unsigned char> table(PatternDatabase::kTableSize, 0);
+    for (int d = 1; d < kCards; ++d) {
+      for (int r = 1; r <= d; ++r) {
+        for (int k = 0; k < kKings && k <= r; ++k) {
+          for (int f = 0; f < kCells; ++f) {
+            for (int e = 0; e < kColumns; ++e) {
+              table[PatternDatabase::Index(d, r, k, f, e)] =
+                  dist(d, r, k, 0, 0, f, e);
+            }
+          }
+        }
+      }
+    }
+    return table;
+  }
+
+ private:
+  static int Capacity(int cells, int columns) { return (cells + 1) << columns; }
+
+  int Slot(int c, int n, int q, int t, int tk, int f, int e) const {
+    return ((((((c * kCards + n) * kKings + q) * kCards + t) * 2 + tk) * kCells +
+             f) * kColumns) + e;
+  }
+  unsigned char dist(int c, int n, int q, int t, int tk, int f, int e) const {
+    return dist_[Slot(c, n, q, t, tk, f, e)];
+  }
+
+  // Cost after removing `s` cards of the top run.
+  int AfterMove(int c, int n, int q, int t, int tk, int s, int f, int e) const {
+    int left = t - s;
+    return dist(c - s, n, q, left, left > 0 ? tk : 0, f, e);
+  }
+
+  void SolveTopRun(int c, int n, int q, int t, int tk, int f, int e) {
+    int best = kUnreachable;
+    // Onto a matching card elsewhere; the king closing a run cannot go there.
+    for (int s = 1; s <= min(t, Capacity(f, e)); ++s) {
+      if (tk && s == t) break;
+      best = min(best, 1 + AfterMove(c, n, q, t, tk, s, f, e));
+    }
+    if (e > 0) {
+      for (int s = 1; s <= min(t, Capacity(f, e - 1)); ++s)
+        best = min(best, 1 + AfterMove(c, n, q, t, tk, s, f, e - 1));
+    }
+    if (f > 0) best = min(best, 1 + AfterMove(c, n, q, t, tk, 1, f - 1, e));
+    if (f + 1 < kCells) best = min(best, 1 + dist(c, n, q, t, tk, f + 1, e));
+    if (e + 1 < kColumns) best = min(best, 1 + dist(c, n, q, t, tk, f, e + 1));
+    dist_[Slot(c, n, q, t, tk, f, e)] = best;
+  }
+
+  void SolveNextRun(int c, int n, int q, int f, int e) {
+    if (c == 0) {
+      if (n == 0 && q == 0) dist_[Slot(c, n, q, 0, 0, f, e)] = 0;
+      return;
+    }
+    if (n == 0) return;
+    int best = kUnreachable;
+    int max_length = (n == 1) ? c : c - (n - 1);
+    int min_length = (n == 1) ? c : 1;
+    for (int kb = 0; kb <= min(q, 1); ++kb) {
+      if (q - kb > n - 1) continue;
+      for (int length = min_length; length <= max_length; ++length)
+        best = min<int>(best, dist(c, n - 1, q - kb, length, kb, f, e));
+    }
+    dist_[Slot(c, n, q, 0, 0, f, e)] = best;
+  }
+
+  vector<unsigned char> dist_;
+};
+
+}  // namespace
+
+int main(int argc, char** argv) {
+  const char* path = argc > 1 ? argv[1] : "challenge.pdb";
+
+  Builder builder;
+  builder.Solve();
+  auto table = builder.Table();
+
+  FILE* out = fopen(path, "wb");
+  if (!out) {
+    fprintf(stderr, "Error: Could not open %s for writing.\n", path);
+    return 1;
+  }
+  auto header = PatternDatabase::MakeHeader();
+  fwrite(&header, sizeof(header), 1, out);
+  fwrite(table.data(), 1, table.size(), out);
+  fclose(out);
+
+  int max_value = *max_element(table.begin(), table.end());
+  printf("Wrote %s: %d entries, max cost %d\n", path, int(table.size()), max_value);
+  return 0;
+}
@@ -0,0 +1,147 @@
+#ifndef SOLUTION_INDEX_H
+#define SOLUTION_INDEX_H
+
+#include <stdio.h>
+
+#include <algorithm>
+#include <set>
+#include <string>
+#include <unordered_map>
+#include <vector>
+using namespace std;
+
+// Index of every board along the stored solutions (Solutions/sol_N), so a
+// game captured part way through a solved deal is answered with the rest of
+// that solution. Boards are keyed by a 64-bit hash of their canonical deck
+// string; callers replay the solution to confirm a match.
+//
+// The index is bounded: entries unused for kMaxAgeSeconds are dropped, and
+// beyond kMaxEntries the least hit, then least recently used, entries go.
+//
+// File format, one record per line:
+//   S <solution>                                  solution already indexed
+//   E <board> <solution> <step> <hits> <last used>
+class SolutionIndex {
+ public:
+  static constexpr int kMaxEntries = 100000;
+  static constexpr long long kMaxAgeSeconds = 180LL * 24 * 3600;
+
+  struct Entry {
+    unsigned long long board;
+    int solution;  // N of sol_N
+    int step;      // encoded moves played to reach the board
+    int hits;
+    long long last_used;
+  };
+
+  // FNV-1a, stable across builds unlike Node::hash().
+  static unsigned long long HashKey(const string& key) {
+    unsigned long long hash = 14695981039346656037ULL;
+    for (unsigned char c : key) {
+      hash ^= c;
+      hash *= 1099511628211ULL;
+    }
+    return hash;
+  }
+
+  bool Load(const string& path) {
+    entries_.clear();
+    indexed_.clear();
+    FILE* in = fopen(path.c_str(), "r");
+    if (!in) return false;
+    char type;
+    while (fscanf(in, " %c", &type) == 1) {
+      if (type == 'S') {
+        int solution;
+        if (fscanf(in, "%d", &solution) != 1) break;
+        indexed_.insert(solution);
+      } else if (type == 'E') {
+        Entry entry;
+        if (fscanf(in, "%llx %d %d %d %lld", &entry.board, &entry.solution,
+                   &entry.step, &entry.hits, &entry.last_used) != 5)
+          break;
+        entries_.push_back(entry);
+      } else {
+        break;
+      }
+    }
+    fclose(in);
+    Rebuild();
+    return true;
+  }
+
+  bool Save(const string& path) const {
+    FILE* out = fopen(path.c_str(), "w");
+    if (!out) return false;
+    for (int solution : indexed_) fprintf(out, "S %d\n", solution);
+    for (const auto& entry : entries_) {
+      fprintf(out, "E %llx %d %d %d %lld\n", entry.board, entry.solution,
+              entry.step, entry.hits, entry.last_used);
+    }
+    fclose(out);
+    return true;
+  }
+
+  bool Indexed(int solution) const { return indexed_.count(solution) > 0; }
+
+  // `boards[i]` is the board after i encoded moves of the solution.
+  void AddSolution(int solution, const vector<unsigned long long>& boards,
+                   long long now) {
+    indexed_.insert(solution);
+    for (int i = 0; i < boards.size(); ++i) {
+      by_board_.emplace(boards[i], entries_.size());
+      entries_.push_back(Entry{boards[i], solution, i, 0, now});
+    }
+  }
+
+  // Entries for `board`, earliest in their solution first.
+  vector<Entry*> Find(unsigned long long board) {
+    vector<Entry*> found;
+    auto range = by_board_.equal_range(board);
+    for (auto it = range.first; it != range.second; ++it)
+      found.push_back(&entries_[it->second]);
+    sort(found.begin(), found.end(),
+         [](const Entry* a, const Entry* b) { return a->step < b->step; });
+    return found;
+  }
+
+  static void Touch(Entry* entry, long long now) {
+    ++entry->hits;
+    entry->last_used = now;
+  }
+
+  // Returns the number of entries dropped.
+  int Evict(long long now) {
+    int before = entries_.size();
+    entries_.erase(remove_if(entries_.begin(), entries_.end(),
+                             [&](const Entry& entry) {
+                               return now - entry.last_used > kMaxAgeSeconds;
+                             }),
+                   entries_.end());
+    if (entries_.size() > kMaxEntries) {
+      stable_sort(entries_.begin(), entries_.end(),
+                  [](const Entry& a, const Entry& b) {
+                    if (a.hits != b.hits) return a.hits > b.hits;
+                    return a.last_used > b.last_used;
+                  });
+      entries_.resize(kMaxEntries);
+    }
+    Rebuild();
+    return before - entries_.size();
+  }
+
+  int size() const { return entries_.size(); }
+
+ private:
+  void Rebuild() {
+    by_board_.clear();
+    for (int i = 0; i < entries_.size(); ++i)
+      by_board_.emplace(entries_[i].board, i);
+  }
+
+  vector<Entry> entries_;
+  unordered_multimap<unsigned long long, int> by_board_;
+  set<int> indexed_;
+};
+
+#endif
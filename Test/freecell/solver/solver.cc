@@ -1,32 +1,54 @@
+#include <errno.h>
+#include <signal.h>
+#include <fcntl.h>
+#include <time.h>
+#ifdef _WIN32
+#include <io.h>
+#include <sys/stat.h>
+#else
+#include <unistd.h>
+#endif
+
 #include <algorithm>
 #include <atomic>
+#include <deque>
 #include <memory>
 #include <mutex>
 #include <thread>
 #include <iostream>
 #include <sstream>
 #include <fstream>
+#include <map>
 using namespace std;
 
 #include "bucket.h"
+#include "challenge_heuristic.h"
+#include "checkpoint.h"
 #include "hash_table.h"
+#include "memory_usage.h"
 #include "node.h"
 #include "options.h"
+#include "pattern_database.h"
+#include "solution_index.h"
+#include "stats.h"
 
 class Beam {
  public:
   Beam(int seed, int beam_size, int beam_id, int num_beams);
   string Solve(const Node& layout);
   void SubmitWork(List<Node>* new_work);
+  void ReportStats(SolveStats* stats) const;
 
  private:
   Node* CreateNewLevel(const Bucket& cur_level, Bucket* new_level);
   Node* BeamSearch(const Node& layout);
+  void SaveCheckpoint(int depth, const Node* solution) const;
+  bool ResumeCheckpoint(int* depth, ScopedNode* solution);
   string EncodeSolution(const Node& start, const Node& finish) const;
 
   List<Node> GetWork();
   Node* ProcessNewNodes(List<Node> new_nodes, Bucket* new_level);
-  int TargetBeam(unsigned hash) const {
+  int TargetBeam(Node::HashKey hash) const {
     // Shift bits so hash table can be better used.
     return (hash + (hash >> 24)) % num_beams_;
   }
@@ -35,6 +57,8 @@ class Beam {
   bool BarrierDone();
   void Barrier();
   bool AllBeamsEmpty(int level) const;
+  Bucket& Level(int level);
+  void ReleaseLevel(int level);
 
   const int seed_;
   const int beam_size_;
@@ -42,11 +66,17 @@ class Beam {
   const int num_beams_;
 
   int upperbound_ = kMaxMoves + 1;
-  vector<Bucket> levels_;
+  // Levels are allocated when first reached and released once cleared.
+  vector<std::unique_ptr<Bucket>> levels_;
   std::unique_ptr<HashTable> hash_table_;
   Node shared_solution_;  // to be shared with other beams
   mutable Pool pool_;
 
+  long long nodes_generated_ = 0;
+  long long nodes_expanded_ = 0;
+  int max_chain_ = 0;
+  vector<int> level_widths_;
+
   int sequence_number_;
   std::atomic<int> barrier_;
 
@@ -55,6 +85,72 @@ class Beam {
 };
 
 vector<std::unique_ptr<Beam>> beams;
+SolveStats solve_stats;
+
+// --- Checkpoints ---
+// A long search saves its state to checkpoint_path every -k seconds, and
+// once more when it stops at the -T time limit or on SIGINT/SIGTERM. The
+// next run on the same board and goal resumes from there (see checkpoint.h).
+// Every search stops at the time limit or on a signal, but only the single
+// beam and the serial A* search for the whole goal save checkpoints.
+string checkpoint_path;
+string checkpoint_goal;  // the deck line the checkpoint belongs to
+std::atomic<bool> stop_requested(false);
+std::chrono::steady_clock::time_point search_deadline = std::chrono::steady_clock::time_point::max();
+bool search_stopped = false;
+bool checkpoint_saved = false;
+
+enum CheckpointSearch { kBeamCheckpoint = 1, kAStarCheckpoint = 2 };
+enum CheckpointKind { kClosedNode, kOpenNode, kSolutionNode };
+
+// A second signal falls through to the default action.
+void RequestStop(int sig) {
+  stop_requested = true;
+  signal(sig, SIG_DFL);
+}
+
+// Names the goal and everything that shapes the search, so that a
+// checkpoint is only resumed by a run that would have searched the same way.
+uint64_t CheckpointKey(const string& search) {
+  ostringstream key;
+  key << checkpoint_goal << '$' << search << '$' << options.beam_size << '$'
+      << options.auto_play << options.max_auto_play << options.minimize_color_diff
+      << options.exact_duplicates << '$' << options.memory_budget_mb;
+  return SolutionIndex::HashKey(key.str());
+}
+
+void ReportCheckpoint(bool saved) {
+  if (saved) checkpoint_saved = true;
+  else cerr << "Warning: could not save checkpoint " << checkpoint_path << endl;
+}
+
+// True if checkpoint_path holds a `search` (named as for CheckpointKey) to resume.
+bool HasCheckpoint(uint32_t search, const string& name) {
+  CheckpointReader reader;
+  return !checkpoint_path.empty() && reader.Open(checkpoint_path, search, CheckpointKey(name));
+}
+
+class CheckpointTimer {
+ public:
+  CheckpointTimer() : last_(std::chrono::steady_clock::now()) {}
+
+  // True once the search has to stop: the time limit ran out or a signal came.
+  static bool Stopping() {
+    return stop_requested || std::chrono::steady_clock::now() >= search_deadline;
+  }
+
+  // True when a checkpoint should be saved: every -k seconds, and on the way out.
+  bool Due() {
+    if (checkpoint_path.empty()) return false;
+    auto now = std::chrono::steady_clock::now();
+    if (!Stopping() && now - last_ < std::chrono::seconds(options.checkpoint_seconds)) return false;
+    last_ = now;
+    return true;
+  }
+
+ private:
+  std::chrono::steady_clock::time_point last_;
+};
 
 Beam::Beam(int seed, int beam_size, int beam_id, int num_beams)
     : seed_(seed),
@@ -63,11 +159,17 @@ Beam::Beam(int seed, int beam_size, int beam_id, int num_beams)
       num_beams_(num_beams),
       sequence_number_(0),
       barrier_(0) {
-  const int kNumBins = (kMaxMoves - kMinMoves) * 2;
-  for (int i = 0; i < kMaxMoves; ++i) levels_.emplace_back(Bucket(kNumBins));
+  levels_.resize(kMaxMoves + 1);
   hash_table_.reset(new HashTable(beam_size_ * 2));
 }
 
+void Beam::ReportStats(SolveStats* stats) const {
+  stats->AddSearch(nodes_generated_, nodes_expanded_);
+  stats->AddTable(*hash_table_, max_chain_);
+  stats->AddPool(pool_);
+  stats->AddBeamWidths(level_widths_);
+}
+
 void Beam::SubmitWork(List<Node>* new_work) {
   if (new_work->empty()) return;
   mu_.lock();
@@ -104,11 +206,28 @@ void Beam::Barrier() {
 }
 
 bool Beam::AllBeamsEmpty(int level) const {
-  for (int i = 0; i < num_beams_; ++i)
-    if (beams[i]->levels_[level].size() > 0) return false;
+  for (int i = 0; i < num_beams_; ++i) {
+    const auto& bucket = beams[i]->levels_[level];
+    if (bucket && bucket->size() > 0) return false;
+  }
   return true;
 }
 
+Bucket& Beam::Level(int level) {
+  const int kNumBins = (kMaxMoves - kMinMoves) * 2;
+  if (!levels_[level]) levels_[level].reset(new Bucket(kNumBins));
+  return *levels_[level];
+}
+
+void Beam::ReleaseLevel(int level) {
+  if (!levels_[level]) return;
+  levels_[level]->Iterate([&](Node* node) {
+    hash_table_->Remove(node);
+    pool_.Delete(node);
+  });
+  levels_[level].reset();
+}
+
 Node* Beam::CreateNewLevel(const Bucket& cur_level, Bucket* new_level) {
   vector<List<Node>> partitions(num_beams_);
   ScopedNode solution(&pool_);
@@ -132,16 +251,14 @@ Node* Beam::CreateNewLevel(const Bucket& cur_level, Bucket* new_level) {
   cur_level.Iterate([&](Node* node) {
     if (node->moves_performed() >= upperbound_ - 1) return;
     auto new_nodes = node->Expand(&pool_);
+    ++nodes_expanded_;
+    nodes_generated_ += new_nodes.size();
     if (new_nodes.empty()) return;
 
     if (num_beams_ == 1) {
-      for (auto* node : new_nodes) node->ComputeHash();
       process_new_solution(ProcessNewNodes(new_nodes, new_level));
     } else {
-      for (auto* node : new_nodes) {
-        node->ComputeHash();
-        partitions[TargetBeam(node->hash())].Append(node);
-      }
+      for (auto* node : new_nodes) partitions[TargetBeam(node->hash())].Append(node);
       if (++expand_count < 100) return;
       expand_count = 0;
       for (int i = 0; i < num_beams_; ++i) beams[i]->SubmitWork(&partitions[i]);
@@ -281,18 +398,79 @@ Node* Beam::ProcessNewNodes(List<Node> new_nodes, Bucket* new_level) {
   return solution.release();
 }
 
-Node* Beam::BeamSearch(const Node& layout) {
-  auto root = pool_.New(layout);
-  root->ComputeHash();
-  levels_[0].Add(root, root->bin());
-  hash_table_->Add(root);
+// Saves the search as it stands before level `depth` is expanded: that
+// level, the one before it (only needed to detect duplicates), the best
+// solution so far and the counters.
+void Beam::SaveCheckpoint(int depth, const Node* solution) const {
+  CheckpointWriter writer;
+  if (depth > 0 && levels_[depth - 1])
+    levels_[depth - 1]->Iterate([&](Node* node) { writer.Add(*node, kClosedNode, false); });
+  levels_[depth]->Iterate([&](Node* node) { writer.Add(*node, kOpenNode, true); });
+  if (solution) writer.Add(*solution, kSolutionNode, true);
+
+  CheckpointHeader header = {};
+  header.search = kBeamCheckpoint;
+  header.key = CheckpointKey("beam");
+  header.depth = depth;
+  header.upperbound = upperbound_;
+  header.nodes_generated = nodes_generated_;
+  header.nodes_expanded = nodes_expanded_;
+  ReportCheckpoint(writer.Save(checkpoint_path, header));
+}
 
+// Restores a search saved by SaveCheckpoint. Nodes go back into their
+// levels in reverse, so each bin keeps the order it was saved in.
+bool Beam::ResumeCheckpoint(int* depth, ScopedNode* solution) {
+  CheckpointReader reader;
+  if (checkpoint_path.empty() ||
+      !reader.Open(checkpoint_path, kBeamCheckpoint, CheckpointKey("beam")))
+    return false;
+  const auto& header = reader.header();
+  if (header.depth < 0 || header.depth >= kMaxMoves) return false;
+  *depth = header.depth;
+  reader.LoadLinks(&pool_);
+  for (int i = reader.num_nodes() - 1; i >= 0; --i) {
+    Node* node = reader.NewNode(i, &pool_);
+    int kind = reader.Record(i).kind;
+    if (kind == kSolutionNode) {
+      solution->reset(node);
+      continue;
+    }
+    Level(kind == kClosedNode ? *depth - 1 : *depth).Add(node, node->bin());
+    hash_table_->Add(node);
+  }
+  upperbound_ = header.upperbound;
+  nodes_generated_ = header.nodes_generated;
+  nodes_expanded_ = header.nodes_expanded;
+  if (!options.quiet) {
+    printf("Resuming from %s at level %d, upperbound %d\n", checkpoint_path.c_str(), *depth,
+           upperbound_);
+  }
+  return true;
+}
+
+Node* Beam::BeamSearch(const Node& layout) {
   ScopedNode solution(&pool_);
+  int start = 0;
+  if (num_beams_ > 1 || !ResumeCheckpoint(&start, &solution)) {
+    auto root = pool_.New(layout);
+    root->ComputeHash();
+    Level(0).Add(root, root->bin());
+    hash_table_->Add(root);
+  }
+
+  CheckpointTimer timer;
   int max_level_size = 0;
-  for (int i = 0; i < kMaxMoves; ++i) {
+  for (int i = start; i < kMaxMoves; ++i) {
     if (num_beams_ == 1) {
-      if (levels_[i].empty()) break;
+      if (Level(i).empty()) break;
+      if (timer.Due()) SaveCheckpoint(i, solution ? &*solution : nullptr);
+      if (timer.Stopping()) {
+        search_stopped = true;
+        break;
+      }
     } else {
+      Level(i);
       Barrier();
       if (AllBeamsEmpty(i)) break;
       Barrier();
@@ -300,38 +478,20 @@ Node* Beam::BeamSearch(const Node& layout) {
     if (beam_id_ == 0 && !options.quiet) {
       char progress[30];
       sprintf(progress, "%s%4d %8d", string('\b', 13).c_str(), i,
-              levels_[i].size());
+              levels_[i]->size());
       printf("%s", progress);
       fflush(stdout);
-      max_level_size = max(max_level_size, levels_[i].size());
+      max_level_size = max(max_level_size, levels_[i]->size());
     }
-    auto new_solution = CreateNewLevel(levels_[i], &levels_[i + 1]);
+    level_widths_.push_back(levels_[i]->size());
+    // Levels are released as the search goes, so chains are sampled per level.
+    max_chain_ = max(max_chain_, hash_table_->MaxChainLength());
+    auto new_solution = CreateNewLevel(*levels_[i], &Level(i + 1));
     if (new_solution) solution.reset(new_solution);
     constexpr int kPreservedLevels = 1;
-    if (i >= kPreservedLevels) {
-      bool first = true;
-      levels_[i - kPreservedLevels].Iterate([&](Node* node) {
-#if 0
-        if (i == 75 && first) {
-          first = false;
-          node->Show();
-          auto code = EncodeSolution(layout, *node);
-          puts(code.c_str());
-        }
-#endif
-        hash_table_->Remove(node);
-        pool_.Delete(node);
-      });
-      levels_[i - kPreservedLevels].Clear();
-    }
-  }
-  for (auto& level : levels_) {
-    level.Iterate([&](Node* node) {
-      hash_table_->Remove(node);
-      pool_.Delete(node);
-    });
-    level.Clear();
+    if (i >= kPreservedLevels) ReleaseLevel(i - kPreservedLevels);
   }
+  for (int i = 0; i < levels_.size(); ++i) ReleaseLevel(i);
   if (beam_id_ == 0 && !options.quiet) {
     printf("%s%8d\n", string('\b', 8).c_str(), max_level_size);
   }
@@ -341,11 +501,11 @@ Node* Beam::BeamSearch(const Node& layout) {
 string Beam::EncodeSolution(const Node& start, const Node& finish) const {
   string code;
   ScopedNode node(&pool_, pool_.New(start));
-  Node::CompressedMoves::Reader reader(finish.moves());
+  const auto path = finish.MovePath();
   
   if (!options.quiet) cout << "EncodeSolution: moves_performed=" << finish.moves_performed() << " Unsorted=" << finish.cards_unsorted() << endl;
 
-  for (int i = 0; i < finish.moves_performed(); ++i) {
+  for (int i = 0; i < path.size(); ++i) {
     if (node->cards_unsorted() == 0) {
       if (!options.quiet) cout << "EncodeSolution: Node solved at step " << i << ". Calling CompleteSolution." << endl;
       code += node->CompleteSolution();
@@ -353,7 +513,7 @@ string Beam::EncodeSolution(const Node& start, const Node& finish) const {
     }
 
     auto new_nodes = node->Expand(&pool_).ToVector();
-    int move_index = reader.Read(new_nodes.size());
+    int move_index = path[i];
     assert(move_index < new_nodes.size());
     auto picked_node = new_nodes[move_index];
     for (auto* new_node : new_nodes)
@@ -468,56 +628,135 @@ string StripAnsi(const string& str) {
     return res;
 }
 
-void DecodeAndShow(string solution_str, Node layout) {
-    // printf("readable solution\n");
-    int step = 1;
-    int pos = 0;
-    while (pos < solution_str.length()) {
-        // 1. Parse Card
-        string card_code = solution_str.substr(pos, 2);
-        pos += 2;
-        
-        // 2. Parse Stack Count
-        int stack_count = 1;
-        if (pos < solution_str.length() && solution_str[pos] == '#') {
-            pos++; // skip '#'
-            size_t next_underscore = solution_str.find('_', pos);
-            string count_str = solution_str.substr(pos, next_underscore - pos);
-            stack_count = stoi(count_str);
-            pos = next_underscore;
-        }
+// One move of an encoded solution, e.g. "8s#3_3_~5~" or "tc_R_F".
+struct EncodedMove {
+    string card_code;      // clean card code of the (bottom) card moved
+    int stack_count = 1;
+    bool src_is_reserve = false;
+    int src_idx = -1;      // tableau column, if not from the reserve
+    bool dest_is_foundation = false;
+    bool dest_is_reserve = false;
+    int dest_idx = -1;     // tableau column, if not to foundation/reserve
+};
 
-        // 3. Skip '_'
-        if (pos < solution_str.length() && solution_str[pos] == '_') pos++;
+// Parses the move starting at *pos and advances *pos past it.
+bool ParseEncodedMove(const string& solution_str, size_t* pos, EncodedMove* move) {
+    size_t& p = *pos;
+    *move = EncodedMove();
+    if (p + 2 > solution_str.length()) return false;
+
+    // 1. Parse Card
+    move->card_code = solution_str.substr(p, 2);
+    p += 2;
+
+    // 2. Parse Stack Count
+    if (p < solution_str.length() && solution_str[p] == '#') {
+        p++; // skip '#'
+        size_t next_underscore = solution_str.find('_', p);
+        if (next_underscore == string::npos) return false;
+        move->stack_count = atoi(solution_str.substr(p, next_underscore - p).c_str());
+        p = next_underscore;
+    }
 
-        // 4. Parse Source
-        string source_code;
-        if (pos < solution_str.length()) {
-            source_code = solution_str[pos];
-            pos++;
-        }
+    // 3. Skip '_'
+    if (p < solution_str.length() && solution_str[p] == '_') p++;
 
-        // 5. Skip '_'
-        if (pos < solution_str.length() && solution_str[pos] == '_') pos++;
-
-        // 6. Parse Dest
-        string dest_code;
-        if (pos < solution_str.length()) {
-            if (solution_str[pos] == '~') {
-                // ~n~
-                size_t end_tilde = solution_str.find('~', pos + 1);
-                dest_code = solution_str.substr(pos, end_tilde - pos + 1);
-                pos = end_tilde + 1;
-            } else {
-                // F or R
-                dest_code = solution_str[pos];
-                pos++;
+    // 4. Parse Source
+    if (p >= solution_str.length()) return false;
+    if (solution_str[p] == 'R') {
+        move->src_is_reserve = true;
+    } else if (isdigit(solution_str[p])) {
+        move->src_idx = solution_str[p] - '0';
+    } else {
+        return false;
+    }
+    p++;
+
+    // 5. Skip '_'
+    if (p < solution_str.length() && solution_str[p] == '_') p++;
+
+    // 6. Parse Dest
+    if (p >= solution_str.length()) return false;
+    if (solution_str[p] == '~') {
+        // ~n~
+        size_t end_tilde = solution_str.find('~', p + 1);
+        if (end_tilde == string::npos) return false;
+        move->dest_idx = atoi(solution_str.substr(p + 1, end_tilde - p - 1).c_str());
+        p = end_tilde + 1;
+    } else if (solution_str[p] == 'F') {
+        move->dest_is_foundation = true;
+        p++;
+    } else if (solution_str[p] == 'R') {
+        move->dest_is_reserve = true;
+        p++;
+    } else {
+        return false;
+    }
+    return move->src_idx < 8 && move->dest_idx < 8;
+}
+
+// Applies a parsed move, returning false if it does not fit the layout or
+// breaks the rules: a stored or checkpointed move string may be corrupt.
+bool ApplyEncodedMove(const EncodedMove& move, Node* layout) {
+    Card c = ParseCleanCard(move.card_code);
+    if (move.src_is_reserve) {
+        // Find card index in reserve
+        int r_idx = -1;
+        for(int i=0; i<layout->GetReserve().size(); ++i) {
+            if (layout->GetReserve()[i] == c) {
+                r_idx = i;
+                break;
             }
         }
+        if (r_idx == -1 || move.stack_count != 1) return false;
+        if (move.dest_is_foundation) {
+            if (!layout->GetFoundation(c.suit()).Accepting(c)) return false;
+            layout->ApplyReserveToFoundation(r_idx);
+        } else if (move.dest_idx >= 0) {
+            if (!layout->GetTableau(move.dest_idx).Accepting(c)) return false;
+            layout->ApplyReserveToTableau(r_idx, move.dest_idx);
+        } else {
+            return false;
+        }
+        return true;
+    }
+
+    // Source is Tableau: a run of stack_count sorted cards headed by c.
+    if (move.src_idx < 0) return false;
+    const auto& source = layout->GetTableau(move.src_idx);
+    if (move.stack_count < 1 || source.sorted_size() < move.stack_count ||
+        !(source.card(source.size() - move.stack_count) == c))
+        return false;
+    if (move.dest_is_foundation) {
+        if (move.stack_count != 1 || !layout->GetFoundation(c.suit()).Accepting(c)) return false;
+        layout->ApplyTableauToFoundation(move.src_idx);
+    } else if (move.dest_is_reserve) {
+        if (move.stack_count != 1 || layout->FreeCells() == 0) return false;
+        layout->ApplyTableauToReserve(move.src_idx);
+    } else {
+        if (move.dest_idx < 0 || move.dest_idx == move.src_idx) return false;
+        const auto& dest = layout->GetTableau(move.dest_idx);
+        int max_size = layout->MaxSuperMoveSize(move.src_idx, move.dest_idx);
+        // Onto an empty column the solver moves as much of the run as fits.
+        int moved = dest.empty() ? min(source.sorted_size(), max_size) : move.stack_count;
+        if (!dest.Accepting(c) || move.stack_count > max_size || move.stack_count != moved)
+            return false;
+        layout->ApplyTableauToTableau(move.src_idx, move.dest_idx);
+    }
+    return true;
+}
+
+void DecodeAndShow(string solution_str, Node layout) {
+    // printf("readable solution\n");
+    int step = 1;
+    size_t pos = 0;
+    EncodedMove move;
+    while (pos < solution_str.length()) {
+        if (!ParseEncodedMove(solution_str, &pos, &move)) break;
 
         // Prepare readable strings
         string card_name = "";
-        string clean_card_code = card_code;
+        string card_code = move.card_code;
         // Uppercase for display
         for(char &c : card_code) c = toupper(c);
         
@@ -530,80 +769,47 @@ void DecodeAndShow(string solution_str, Node layout) {
             colored_card_code = "\033[32m" + card_code + "\033[0m"; // Green
         }
 
-        if (stack_count > 1) {
-            card_name = "stack of " + to_string(stack_count) + " cards (" + colored_card_code + ")";
+        if (move.stack_count > 1) {
+            card_name = "stack of " + to_string(move.stack_count) + " cards (" + colored_card_code + ")";
         } else {
             card_name = colored_card_code;
         }
 
         string source_name = "";
-        int src_idx = -1;
-        bool src_is_reserve = false;
-        if (source_code == "R") {
+        if (move.src_is_reserve) {
             source_name = "Reserve";
-            src_is_reserve = true;
         } else {
-            src_idx = stoi(source_code);
-            source_name = "Tableau " + to_string(src_idx + 1);
+            source_name = "Tableau " + to_string(move.src_idx + 1);
         }
 
         string dest_name = "";
         string on_card = "";
-        int dest_idx = -1;
-        bool dest_is_foundation = false;
-        bool dest_is_reserve = false;
-        
-        if (dest_code == "F") {
+        if (move.dest_is_foundation) {
             dest_name = "Foundation";
-            dest_is_foundation = true;
-        } else if (dest_code == "R") {
+        } else if (move.dest_is_reserve) {
             dest_name = "Reserve";
-            dest_is_reserve = true;
         } else {
-            // ~n~
-            string n_str = dest_code.substr(1, dest_code.length() - 2);
-            dest_idx = stoi(n_str);
-            dest_name = "Tableau " + to_string(dest_idx + 1);
+            dest_name = "Tableau " + to_string(move.dest_idx + 1);
         }
 
         // Determine "on card"
-        if (dest_idx != -1) {
-            if (layout.GetTableau(dest_idx).empty()) {
+        if (move.dest_idx != -1) {
+            if (layout.GetTableau(move.dest_idx).empty()) {
                 on_card = " (empty column)";
             } else {
-                on_card = " (on " + string(layout.GetTableau(dest_idx).Top().ToString()) + ")";
+                on_card = " (on " + string(layout.GetTableau(move.dest_idx).Top().ToString()) + ")";
             }
         }
 
         // Check for Auto Move
         bool is_auto = false;
-        Card c_obj = ParseCleanCard(clean_card_code);
-        if (dest_is_foundation && layout.CanAutoPlay(c_obj)) {
+        Card c_obj = ParseCleanCard(move.card_code);
+        if (move.dest_is_foundation && layout.CanAutoPlay(c_obj)) {
             is_auto = true;
         }
 
         // Apply move to layout
-        if (src_is_reserve) {
-            // Find card index in reserve
-            Card c = ParseCleanCard(clean_card_code);
-            int r_idx = -1;
-            for(int i=0; i<layout.GetReserve().size(); ++i) {
-                if (layout.GetReserve()[i] == c) {
-                    r_idx = i;
-                    break;
-                }
-            }
-            
-            if (r_idx != -1) {
-                if (dest_is_foundation) layout.ApplyReserveToFoundation(r_idx);
-                else if (dest_idx != -1) layout.ApplyReserveToTableau(r_idx, dest_idx);
-            }
-        } else {
-            // Source is Tableau
-            if (dest_is_foundation) layout.ApplyTableauToFoundation(src_idx);
-            else if (dest_is_reserve) layout.ApplyTableauToReserve(src_idx);
-            else if (dest_idx != -1) layout.ApplyTableauToTableau(src_idx, dest_idx);
-        }
+        ApplyEncodedMove(move, &layout);
 
         string step_str;
         if (step==1) {
@@ -668,6 +874,12 @@ extern struct Options options;
 
 // --- START OF FIXED AStarSolver ---
 
+// Keys the subplan cache; defined with ParseDeck below.
+string EncodeDeck(const Node& layout);
+
+// Memory-mapped challenge pattern database (see pdb_builder.cc), opened on first use.
+PatternDatabase pattern_database;
+
 class AStarSolver {
 public:
     string Solve(const Node& layout, string challenge_code) {
@@ -680,40 +892,127 @@ public:
             return "";
         }
         
+        // Determine target count needed
+        int required_count = all_potential_targets.size();
+        if (isdigit(challenge_code[1])) {
+            required_count = challenge_code[1] - '0';
+        }
+
+        // Reject goals the move limit cannot reach before searching at all.
+        if (required_count > (int)all_potential_targets.size()) {
+            cout << "Preflight: the challenge asks for " << required_count << " of "
+                 << all_potential_targets.size() << " cards." << endl;
+            solve_stats.set_result("infeasible");
+            return "";
+        }
+        int bound = 0;
+        if (!Preflight(layout, all_potential_targets, required_count, &bound)) {
+            cout << "Preflight: the challenge needs at least " << bound << " moves, limit is "
+                 << options.move_limit << "." << endl;
+            solve_stats.set_result("infeasible");
+            return "";
+        }
+        // Close to the limit, search level by level (best first within a
+        // level) rather than greedily: a state first reached by a longer path
+        // is closed and could cut off the only short enough solution. The
+        // pruning keeps the levels small.
+        const bool exact = options.move_limit > 0 && options.move_limit - bound <= kBorderlineSlack;
+        if (!options.quiet && options.move_limit > 0) {
+            cout << "Preflight: at least " << bound << " moves, limit " << options.move_limit
+                 << (exact ? ", exact search" : "") << endl;
+        }
+
+        // Goals needing several cards get a short search for the whole goal,
+        // then are planned one card at a time, before the full search. A run
+        // resuming the full search skips them: they failed the last time.
+        if (required_count > 1 && !exact &&
+            !(options.num_threads == 1 && HasCheckpoint(kAStarCheckpoint, CheckpointSearch(exact)))) {
+            string moves = Search(layout, all_potential_targets, required_count, options.move_limit,
+                                  false, kSubgoalExpanded, kSubgoalTableBins, false);
+            if (moves.empty() && !search_stopped)
+                moves = PlanSubgoals(layout, all_potential_targets, required_count);
+            if (!moves.empty() || search_stopped) return moves;
+        }
+
+        if (options.num_threads > 1 && !exact) {
+            return SolveParallel(layout, all_potential_targets, required_count, options.num_threads);
+        }
+        return Search(layout, all_potential_targets, required_count, options.move_limit, exact,
+                      options.move_limit == 0 ? kMaxUnlimitedExpanded : 0, ClosedSetBins());
+    }
+
+    // Best-first search from `layout` until `required_count` of `targets` are
+    // on the foundation within `move_limit` moves (0 for no limit), expanding
+    // at most `max_expanded` nodes (0 for no cap). Returns the moves found, ""
+    // if there are none. `report` prints progress and the outcome.
+    string Search(const Node& layout, const vector<Card>& targets, int required_count,
+                  int move_limit, bool exact, long max_expanded, int bins, bool report = true) {
         // 2. Setup Optimized A* Memory
         Pool pool; 
         // Use the large Hash Table from existing codebase (2^21 buckets ≈ 2 million)
         // This is much faster than std::unordered_set
-        std::unique_ptr<HashTable> closed_set(new HashTable(2097152));
+        // Under a memory budget (-m) the table shrinks to fit it.
+        std::unique_ptr<HashTable> closed_set(new HashTable(bins));
+        const long node_limit = NodeLimit(bins);
+        std::deque<Node*> expanded;
         
         // Priority Queue for Open Set
         std::priority_queue<State, vector<State>, CompareState> open_set;
-        
-        // Determine target count needed
-        int required_count = all_potential_targets.size();
-        if (isdigit(challenge_code[1])) {
-            required_count = challenge_code[1] - '0';
-        }
 
         Node* root = pool.New(layout);
         root->ComputeHash();
         
         // 0. Check Root Solution (Edge case)
-        if (CheckExplicitGoals(root, all_potential_targets, required_count)) {
-             cout << "Solution Found at Start!" << endl;
+        if (CheckExplicitGoals(root, targets, required_count)) {
+             if (report) cout << "Solution Found at Start!" << endl;
              return "";
         }
 
         // Weighted Heuristic for Sorting (Greedy Search)
-        int h = CalculateWeightedHeuristic(root, all_potential_targets);
-        
-        open_set.push(State(root, 0, h, 0));
-        closed_set->Add(root);
+        ChallengeHeuristic heuristic(targets, required_count, PatternBounds());
+        heuristic.Prepare(*root);
+        int pruning_h = 0, h = 0;
+        heuristic.Evaluate(*root, &pruning_h, &h);
         
         int nodes_expanded = 0;
+        long long nodes_generated = 0;
         int id_counter = 0;
 
+        // Only the search for the whole goal is checkpointed, not the short
+        // bounded ones; they all stop at the time limit.
+        const string checkpoint_search = CheckpointSearch(exact);
+        if (report && ResumeSearch(checkpoint_search, &pool, closed_set.get(), &open_set,
+                                   node_limit > 0 ? &expanded : nullptr, &nodes_expanded,
+                                   &nodes_generated, &id_counter)) {
+            pool.Delete(root);
+        } else {
+            open_set.push(State(root, 0, exact ? 0 : h, 0));
+            closed_set->Add(root);
+        }
+        CheckpointTimer timer;
+
+        // Reports the search counters on every way out of the loop.
+        auto record_stats = [&]() {
+            solve_stats.AddSearch(nodes_generated, nodes_expanded);
+            solve_stats.AddTable(*closed_set, closed_set->MaxChainLength());
+            solve_stats.AddPool(pool);
+        };
+
         while (!open_set.empty()) {
+            if ((nodes_expanded & 1023) == 0) {
+                if (report && timer.Due()) {
+                    SaveSearch(checkpoint_search, open_set, *closed_set, nodes_expanded,
+                               nodes_generated, id_counter);
+                }
+                if (timer.Stopping()) {
+                    if (report && !options.quiet)
+                        cout << "A* stopped after " << nodes_expanded << " expansions." << endl;
+                    search_stopped = true;
+                    record_stats();
+                    return "";
+                }
+            }
+
             State current = open_set.top();
             open_set.pop();
             
@@ -722,24 +1021,35 @@ public:
             // 4. Expand
             nodes_expanded++;
             // Log progress
-            if (!options.quiet && nodes_expanded % 50000 == 0) {
+            if (report && !options.quiet && nodes_expanded % 50000 == 0) {
                  cout << "A* Expanded: " << nodes_expanded << " Depth: " << current.GetG() 
                       << " H: " << current.GetH() << endl;
             }
             
             // Safety break for unlimited searches to prevent crash
-            if (options.move_limit == 0 && nodes_expanded > 5000000) {
-                if (!options.quiet) cout << "Aborting: Too many nodes expanded." << endl;
+            if (max_expanded > 0 && nodes_expanded > max_expanded) {
+                if (report && !options.quiet) cout << "Aborting: Too many nodes expanded." << endl;
+                record_stats();
                 return "";
             }
 
+            // Hard memory cap: forget old states, then the worst open ones.
+            if (node_limit > 0) {
+                if (closed_set->size() > node_limit)
+                    ShrinkToBudget(node_limit, &open_set, closed_set.get(), &pool, &expanded);
+                expanded.push_back(node);
+            }
+
             auto children = node->Expand(&pool);
+            nodes_generated += children.size();
+            // Children are scored against the cached card depths of their parent.
+            heuristic.Prepare(*node);
             for (Node* child : children) {
                 int new_g = current.GetG() + 1;
                 
                 // --- 1. Hard Move Limit Check ---
                 // If we've exceeded the limit, delete immediately.
-                if (options.move_limit > 0 && new_g > options.move_limit) {
+                if (move_limit > 0 && new_g > move_limit) {
                     pool.Delete(child);
                     continue;
                 }
@@ -747,53 +1057,35 @@ public:
                 // --- 2. Greedy Goal Check ---
                 // Check goal immediately on generation.
                 // Requirement #3 & #4: First found solution is acceptable.
-                if (CheckExplicitGoals(child, all_potential_targets, required_count)) {
-                     if (!options.quiet) {
+                if (CheckExplicitGoals(child, targets, required_count)) {
+                     if (report && !options.quiet) {
                          cout << "A* Solution Found! Nodes expanded: " << nodes_expanded << endl;
                          cout << "Solution Length: " << new_g << endl;
                      }
                      
-                     string code;
-                     {
-                         // Reconstruct path
-                         ScopedNode temp_node(&pool, pool.New(layout));
-                         Node::CompressedMoves::Reader reader(child->moves());
-                         for (int i = 0; i < new_g; ++i) {
-                            auto new_nodes = temp_node->Expand(&pool).ToVector();
-                            int move_index = reader.Read(new_nodes.size());
-                            auto picked_node = new_nodes[move_index];
-                            for (auto* n : new_nodes) if (n != picked_node) pool.Delete(n);
-                            temp_node.reset(picked_node);
-                            code += temp_node->last_move().Encode();
-                         }
-                     }
-                     return code;
+                     record_stats();
+                     return ReconstructPath(layout, child, &pool);
                 }
 
-                // Compute Zobrist Hash (Fast)
-                child->ComputeHash();
-                
                 // Check if visited using the HashTable
                 if (!closed_set->Find(child)) {
                     
+                    // "Admissible" (Minimum Mathematical) and "Weighted" (Greedy)
+                    // heuristics come out of the same pass.
+                    int pruning_h = 0, sorting_h = 0;
+                    heuristic.Evaluate(*child, &pruning_h, &sorting_h);
+
                     // --- 3. Predictive Pruning ---
-                    // Calculate "Admissible" (Minimum Mathematical) Heuristic
-                    int pruning_h = 0;
-                    if (options.move_limit > 0) {
-                        pruning_h = CalculateAdmissibleHeuristic(child, all_potential_targets, required_count);
-                        // If (Moves Taken + Min Moves Left) > Limit, give up.
-                        if ((new_g + pruning_h) > options.move_limit) {
-                            pool.Delete(child);
-                            continue;
-                        }
+                    // If (Moves Taken + Min Moves Left) > Limit, give up.
+                    if (move_limit > 0 && (new_g + pruning_h) > move_limit) {
+                        pool.Delete(child);
+                        continue;
                     }
 
                     // --- 4. Weighted Sorting ---
-                    // Calculate "Weighted" (Greedy) Heuristic for the Priority Queue
-                    int sorting_h = CalculateWeightedHeuristic(child, all_potential_targets);
 
                     closed_set->Add(child);
-                    open_set.push(State(child, new_g, sorting_h, ++id_counter));
+                    open_set.push(State(child, new_g, exact ? new_g * kLevelWeight + sorting_h : sorting_h, ++id_counter));
                 } else {
                     // Duplicate state, discard
                     pool.Delete(child);
@@ -801,11 +1093,113 @@ public:
             }
         }
 
-        if (!options.quiet) cout << "A* Search failed to find a solution." << endl;
+        if (report && !options.quiet) cout << "A* Search failed to find a solution." << endl;
+        record_stats();
         return "";
     }
 
+    // Limits at most this many moves above the preflight bound are borderline.
+    static constexpr int kBorderlineSlack = 2;
+    // Searches without a move limit give up after expanding this many nodes.
+    static constexpr long kMaxUnlimitedExpanded = 5000000;
+    // Exact search orders by depth first; weighted heuristics stay below this.
+    static constexpr int kLevelWeight = 1 << 16;
+
+    // Checks the goal against the move limit before searching: false if it
+    // cannot be met. `bound` gets a lower bound on the moves the goal needs,
+    // at least the one passed in with -b.
+    bool Preflight(const Node& layout, const vector<Card>& targets, int required_count, int* bound) {
+        *bound = options.lower_bound;
+        if (options.move_limit == 0) return true;
+        ChallengeHeuristic heuristic(targets, required_count, PatternBounds());
+        *bound = max(*bound, heuristic.LowerBound(layout, required_count));
+        return *bound <= options.move_limit;
+    }
+
+    // Hint mode: a narrow beam search, one level at a time, until `budget_ms`
+    // runs out. Levels are ranked like Beam does for full solves (Node::bin)
+    // and by the weighted challenge heuristic otherwise. Returns the first
+    // move towards a goal, if one turns up, or else towards the best node of
+    // the deepest level completed; false if the board has no move.
+    bool Hint(const Node& layout, const string& challenge_code, int budget_ms, Move* hint) {
+        const auto deadline = std::chrono::steady_clock::now() + std::chrono::milliseconds(budget_ms);
+        const bool full_solve = (challenge_code == "00");
+        vector<Card> targets;
+        int required_count = 0;
+        if (!full_solve) {
+            targets = ParseTargets(challenge_code);
+            if (targets.empty()) return false;
+            required_count = isdigit(challenge_code[1]) ? challenge_code[1] - '0' : targets.size();
+        }
+        ChallengeHeuristic heuristic(targets, required_count);
+
+        Pool pool;
+        HashTable seen(kHintTableBins);
+        Node* root = pool.New(layout);
+        root->ComputeHash();
+        seen.Add(root);
+        auto children = root->Expand(&pool).ToVector();
+        if (children.empty()) return false;
+        vector<Move> first_moves;
+        for (Node* child : children) first_moves.push_back(child->last_move());
+        auto first_move_of = [&](const Node* node) {
+            return first_moves[node->MovePath()[0]];
+        };
+
+        // Scores children of `parent` into `next`; true if a goal was reached.
+        vector<pair<int, Node*>> level, next;
+        auto score = [&](const Node* parent, vector<Node*> children, int g) {
+            if (!full_solve) heuristic.Prepare(*parent);
+            for (Node* child : children) {
+                bool goal = full_solve ? child->cards_unsorted() == 0
+                                       : CheckExplicitGoals(child, targets, required_count);
+                if (goal) {
+                    *hint = first_move_of(child);
+                    return true;
+                }
+                if (seen.Find(child)) {
+                    pool.Delete(child);
+                    continue;
+                }
+                int h = child->bin();
+                if (!full_solve) {
+                    int pruning_h = 0;
+                    heuristic.Evaluate(*child, &pruning_h, &h);
+                    if (options.move_limit > 0 && g + pruning_h > options.move_limit) {
+                        pool.Delete(child);
+                        continue;
+                    }
+                }
+                next.emplace_back(h, child);
+            }
+            return false;
+        };
+
+        if (score(root, children, 1)) return true;
+        for (int g = 1; !next.empty(); ++g) {
+            // Keep the best kHintBeamWidth nodes of the level just completed.
+            stable_sort(next.begin(), next.end(),
+                        [](const pair<int, Node*>& a, const pair<int, Node*>& b) { return a.first < b.first; });
+            for (int i = kHintBeamWidth; i < next.size(); ++i) pool.Delete(next[i].second);
+            if (next.size() > kHintBeamWidth) next.resize(kHintBeamWidth);
+            for (auto& entry : next) seen.Add(entry.second);
+            level.swap(next);
+            next.clear();
+            *hint = first_move_of(level[0].second);
+
+            if (options.move_limit > 0 && g >= options.move_limit) break;
+            for (auto& entry : level) {
+                if (std::chrono::steady_clock::now() > deadline) return true;
+                if (score(entry.second, entry.second->Expand(&pool).ToVector(), g + 1)) return true;
+            }
+        }
+        return true;
+    }
+
 private:
+    static constexpr int kHintBeamWidth = 128;
+    static constexpr int kHintTableBins = 1 << 16;
+
    class State {
     public:
         State(Node* n, int g_val, int h_val, int id_val) 
@@ -835,114 +1229,524 @@ private:
         }
     };
 
-    bool CheckExplicitGoals(const Node* node, const vector<Card>& targets, int required_count) {
-        int met_count = 0;
-        if (targets.size() == 4 && required_count < 4) {
-             // "Matches any X of 4 suits"
-             for(const auto& t : targets) {
-                 if (node->GetFoundation(t.suit()).Has(t)) met_count++;
-             }
-        } else {
-             // Specific cards required
-             for(const auto& t : targets) {
-                 if (node->GetFoundation(t.suit()).Has(t)) met_count++;
-             }
-             if (met_count == targets.size()) met_count = required_count; 
-             else met_count = 0; 
+    // --- Memory budget ---
+    // Without -m the closed set keeps its 2^21 bins and nodes are never dropped.
+    static constexpr int kDefaultClosedSetBins = 2097152;
+
+    static long long MemoryBudgetBytes() {
+        return (long long)options.memory_budget_mb << 20;
+    }
+
+    // Closed-set bins: about an eighth of the budget, a power of two.
+    static int ClosedSetBins() {
+        long long budget = MemoryBudgetBytes();
+        if (budget == 0) return kDefaultClosedSetBins;
+        long long bins = budget / 8 / sizeof(Node*);
+        return FloorPowerOfTwo(max(4096LL, min<long long>(bins, kDefaultClosedSetBins)));
+    }
+
+    // Live nodes that fit next to `bins` closed-set bins, 0 when unbounded.
+    static long NodeLimit(long long bins) {
+        long long budget = MemoryBudgetBytes();
+        if (budget == 0) return 0;
+        long long left = budget - bins * (long long)sizeof(Node*);
+        return max(1024LL, left / (long long)(sizeof(Node) + sizeof(MoveLink) + sizeof(State)));
+    }
+
+    // Brings the live node count down to 3/4 of `node_limit`. Expanded nodes go
+    // first, oldest first: their children keep the move history alive in the
+    // move tree, so only duplicate detection is lost. If that is not enough,
+    // the open set is cut to its best half. Returns the number of open nodes
+    // dropped.
+    long ShrinkToBudget(long node_limit,
+                        std::priority_queue<State, vector<State>, CompareState>* open_set,
+                        HashTable* closed_set, Pool* pool, std::deque<Node*>* expanded) {
+        const long target = node_limit / 4 * 3;
+        while (closed_set->size() > target && !expanded->empty()) {
+            Node* node = expanded->front();
+            expanded->pop_front();
+            closed_set->Remove(node);
+            pool->Delete(node);
         }
-        return met_count >= required_count;
+        if (closed_set->size() <= target) return 0;
+
+        long keep = open_set->size() / 2;
+        vector<State> best;
+        best.reserve(keep);
+        while (best.size() < keep) {
+            best.push_back(open_set->top());
+            open_set->pop();
+        }
+        long dropped = open_set->size();
+        while (!open_set->empty()) {
+            Node* node = open_set->top().GetNode();
+            open_set->pop();
+            closed_set->Remove(node);
+            pool->Delete(node);
+        }
+        for (const auto& state : best) open_set->push(state);
+        if (!options.quiet) {
+            cout << "Memory budget reached: dropped " << dropped << " open nodes, kept "
+                 << keep << endl;
+        }
+        return dropped;
     }
 
-    // Returns the depth of a card (how many cards are covering it)
-    int GetCardDepth(const Node* node, Card target) {
-        // 1. Already in Foundation?
-        if (node->GetFoundation(target.suit()).Has(target)) return -1;
-        
-        // 2. Accessible in Reserve? 
-        const auto& current_reserve = node->GetReserve();
-        for(int i=0; i<current_reserve.size(); ++i) {
-            if (current_reserve[i] == target) return 0; 
+    // --- Checkpoints ---
+    // Names the full search for CheckpointKey: its ordering depends on both.
+    static string CheckpointSearch(bool exact) {
+        return string(exact ? "astar_exact" : "astar") + (PatternBounds() ? "_pdb" : "");
+    }
+
+    // Saves the open set with the move histories of its nodes, the rest of
+    // the closed set as bare states for duplicate detection, and the counters.
+    void SaveSearch(const string& search,
+                    const std::priority_queue<State, vector<State>, CompareState>& open_set,
+                    const HashTable& closed_set, long long nodes_expanded,
+                    long long nodes_generated, int id_counter) const {
+        CheckpointWriter writer;
+        unordered_set<const Node*> open_nodes;
+        auto open = open_set;
+        for (; !open.empty(); open.pop()) {
+            const State& state = open.top();
+            writer.Add(*state.GetNode(), kOpenNode, true, state.GetG(), state.GetH(), state.GetId());
+            open_nodes.insert(state.GetNode());
         }
-        
-        // 3. Buried in Tableau?
-        for(int i=0; i<8; ++i) {
-            const auto& t = node->GetTableau(i);
-            for(int j=0; j<t.size(); ++j) {
-                if (t.card(j) == target) {
-                    // Return number of cards sitting ON TOP of the target
-                    return t.size() - 1 - j;
-                }
+        closed_set.ForEach([&](Node* node) {
+            if (!open_nodes.count(node)) writer.Add(*node, kClosedNode, false);
+        });
+
+        CheckpointHeader header = {};
+        header.search = kAStarCheckpoint;
+        header.key = CheckpointKey(search);
+        header.nodes_generated = nodes_generated;
+        header.nodes_expanded = nodes_expanded;
+        header.next_id = id_counter;
+        ReportCheckpoint(writer.Save(checkpoint_path, header));
+    }
+
+    // Restores a search saved by SaveSearch; false if there is none for it.
+    // Under a memory budget the closed nodes are the first to be dropped
+    // again, so they go to `expanded`.
+    bool ResumeSearch(const string& search, Pool* pool, HashTable* closed_set,
+                      std::priority_queue<State, vector<State>, CompareState>* open_set,
+                      std::deque<Node*>* expanded, int* nodes_expanded,
+                      long long* nodes_generated, int* id_counter) const {
+        CheckpointReader reader;
+        if (checkpoint_path.empty() ||
+            !reader.Open(checkpoint_path, kAStarCheckpoint, CheckpointKey(search)))
+            return false;
+        reader.LoadLinks(pool);
+        for (int i = 0; i < reader.num_nodes(); ++i) {
+            const auto& record = reader.Record(i);
+            Node* node = reader.NewNode(i, pool);
+            closed_set->Add(node);
+            if (record.kind == kOpenNode)
+                open_set->push(State(node, record.g, record.h, record.id));
+            else if (expanded)
+                expanded->push_back(node);
+        }
+        const auto& header = reader.header();
+        *nodes_expanded = header.nodes_expanded;
+        *nodes_generated = header.nodes_generated;
+        *id_counter = header.next_id;
+        if (!options.quiet) {
+            cout << "Resuming from " << checkpoint_path << ": " << open_set->size()
+                 << " open, " << closed_set->size() << " seen" << endl;
+        }
+        return true;
+    }
+
+    // --- Subgoal planner ---
+    // A goal for several cards, such as "k4", is planned one card at a time:
+    // each step is a small bounded search for one more target, starting from
+    // the board the previous step left, the target with the lowest bound
+    // first. If a step fails or leaves too few moves for the rest, the next
+    // target is tried from there instead, backtracking through the orders of
+    // the targets. Steps are cached by board and target. Returns "" if no
+    // order works within kMaxSubgoalSearches searches; Solve then searches
+    // for the whole goal at once.
+    static constexpr int kMaxSubgoalSearches = 32;
+    static constexpr long kSubgoalExpanded = 50000;
+    static constexpr int kSubgoalTableBins = 1 << 18;
+
+    struct Subplan {
+        string moves;    // "" if the search found none
+        int moves_left;  // the move limit it searched under
+    };
+
+    string PlanSubgoals(const Node& layout, const vector<Card>& targets, int required_count) {
+        subplans_.clear();
+        int searches_left = kMaxSubgoalSearches;
+        string plan;
+        bool found = PlanFrom(layout, targets, required_count, options.move_limit, &plan, &searches_left);
+        if (!options.quiet) {
+            int searches = kMaxSubgoalSearches - searches_left;
+            if (found) {
+                cout << "Subgoal plan: " << plan.size() / 2 << " moves from " << searches
+                     << " searches" << endl;
+            } else if (search_stopped) {
+                cout << "Subgoal planner stopped after " << searches << " searches" << endl;
+            } else {
+                cout << "Subgoal planner failed after " << searches
+                     << " searches, searching for the whole goal" << endl;
             }
         }
-        
-        // Not found / Not accessible
-        return 100;
+        if (found) solve_stats.set_search("subgoal_astar");
+        if (search_stopped) return "";
+        return found ? plan : "";
     }
 
-    // Multiplier: 1 for Admissible (Pruning), 2+ for Weighted (Digging)
-    int GetRecursiveHeuristic(const Node* node, Card target, int depth_multiplier, int depth_limit = 13) {
-        if (depth_limit <= 0) return 0; 
-        
-        if (node->GetFoundation(target.suit()).Has(target)) return 0;
+    // Appends to `plan` the moves from `board` that meet the goal within
+    // `moves_left` moves (if there is a move limit); false if none was found.
+    bool PlanFrom(const Node& board, const vector<Card>& targets, int required_count,
+                  int moves_left, string* plan, int* searches_left) {
+        const bool limited = options.move_limit > 0;
+        vector<Card> open;
+        for (const auto& target : targets) {
+            if (!board.GetFoundation(target.suit()).Has(target)) open.push_back(target);
+        }
+        int needed = required_count - (targets.size() - open.size());
+        if (needed <= 0) return true;
+        if (limited) {
+            ChallengeHeuristic rest(open, needed, PatternBounds());
+            if (rest.LowerBound(board, needed) > moves_left) return false;
+        }
 
-        int current_depth = GetCardDepth(node, target);
-        if (current_depth == -1) return 0; 
+        // Cheapest target first.
+        vector<pair<int, Card>> order;
+        for (const auto& target : open) {
+            ChallengeHeuristic single({target}, 1, PatternBounds());
+            order.emplace_back(single.LowerBound(board, 1), target);
+        }
+        stable_sort(order.begin(), order.end(),
+                    [](const pair<int, Card>& a, const pair<int, Card>& b) { return a.first < b.first; });
+
+        for (const auto& entry : order) {
+            if (search_stopped) return false;
+            string step = FindSubplan(board, entry.second, moves_left, searches_left);
+            if (step.empty()) continue;
+            Node next = board;
+            next.PlayMoves(DecodeSolution(step));
+            int step_moves = step.size() / 2;
+            string rest;
+            if (PlanFrom(next, targets, required_count, moves_left - step_moves, &rest, searches_left)) {
+                *plan += step + rest;
+                return true;
+            }
+        }
+        return false;
+    }
 
-        // Apply multiplier to prioritize digging
-        int cost = current_depth * depth_multiplier;
-        
-        // Recursive step: Cost of prerequisites
-        if (target.rank() > ACE) {
-            Card prereq(target.suit(), target.rank() - 1);
-            cost += GetRecursiveHeuristic(node, prereq, depth_multiplier, depth_limit - 1);
+    // Moves from `board` that bring `target` to the foundation, from the
+    // cache or a bounded search; "" if there are none or no searches are left.
+    string FindSubplan(const Node& board, Card target, int moves_left, int* searches_left) {
+        const bool limited = options.move_limit > 0;
+        auto key = make_pair(EncodeDeck(board), target.card());
+        auto it = subplans_.find(key);
+        if (it != subplans_.end()) {
+            const auto& cached = it->second;
+            if (!cached.moves.empty() && (!limited || (int)cached.moves.size() / 2 <= moves_left))
+                return cached.moves;
+            // A search that failed with at least as many moves would fail again.
+            if (cached.moves.empty() && (!limited || cached.moves_left >= moves_left)) return "";
         }
-        return cost;
+        if (*searches_left <= 0) return "";
+        --*searches_left;
+        string moves = Search(board, {target}, 1, limited ? moves_left : 0, false,
+                              kSubgoalExpanded, kSubgoalTableBins, false);
+        if (!search_stopped) subplans_[key] = {moves, moves_left};
+        return moves;
+    }
+
+    map<pair<string, int>, Subplan> subplans_;
+
+    static const PatternDatabase* PatternBounds() {
+        return (options.move_limit > 0 && pattern_database.loaded()) ? &pattern_database : nullptr;
     }
 
-    // 1. ADMISSIBLE HEURISTIC (Optimistic)
-    // Used specifically for checking against Move Limit
-    int CalculateAdmissibleHeuristic(const Node* node, const vector<Card>& targets, int required_count) {
-        vector<int> costs;
-        for(const auto& t : targets) {
-            costs.push_back(GetRecursiveHeuristic(node, t, 1)); // Multiplier 1
+    // Replays the move path of `finish` from `layout` to rebuild the move string.
+    string ReconstructPath(const Node& layout, const Node* finish, Pool* pool) {
+        string code;
+        ScopedNode temp_node(pool, pool->New(layout));
+        for (int move_index : finish->MovePath()) {
+            auto new_nodes = temp_node->Expand(pool).ToVector();
+            auto picked_node = new_nodes[move_index];
+            for (auto* n : new_nodes) if (n != picked_node) pool->Delete(n);
+            temp_node.reset(picked_node);
+            code += temp_node->last_move().Encode();
         }
-        
-        if (costs.empty()) return 0;
+        return code;
+    }
 
-        // If we only need X out of Y targets, take the X smallest costs
-        std::sort(costs.begin(), costs.end());
-        int h = 0;
-        int count = (required_count < costs.size()) ? required_count : costs.size();
-        for(int i=0; i<count; ++i) h += costs[i];
-        
-        return h;
+    // --- Parallel A* (hash-distributed) ---
+    // Every node is owned by exactly one worker, chosen from node->hash() the same
+    // way Beam::TargetBeam partitions beams. A worker keeps its own open set, closed
+    // set and pool; children owned by another worker are batched and handed over
+    // through that worker's inbox. Duplicates are detected by the owner only.
+    static constexpr int kMessageBatchSize = 64;
+    static constexpr int kFlushInterval = 256;
+    static constexpr int kExpandBatchSize = 1024;
+
+    struct Worker {
+        Pool pool;
+        std::unique_ptr<HashTable> closed_set;
+        std::priority_queue<State, vector<State>, CompareState> open_set;
+        vector<vector<State>> outbox;
+        vector<State> inbox;
+        std::mutex inbox_mu;
+        int id_counter = 0;
+        long node_limit = 0;
+        std::deque<Node*> expanded;
+        long long nodes_generated = 0;
+    };
+
+    int OwnerOf(const Node* node) const {
+        Node::HashKey hash = node->hash();
+        return (hash + (hash >> 24)) % workers_.size();
     }
 
-    // 2. WEIGHTED HEURISTIC (Greedy/Smart)
-    // Used for sorting the Priority Queue
-    int CalculateWeightedHeuristic(const Node* node, const vector<Card>& targets) {
-        int total_h = 0;
-        
-        // A. Target Costs (Weighted x2 to prefer drilling)
-        // We sum all targets here to encourage general progress
-        for(const auto& t : targets) {
-            total_h += GetRecursiveHeuristic(node, t, 2); 
+    void Send(Worker* from, int to) {
+        auto& batch = from->outbox[to];
+        if (batch.empty()) return;
+        Worker* target = workers_[to].get();
+        target->inbox_mu.lock();
+        target->inbox.insert(target->inbox.end(), batch.begin(), batch.end());
+        target->inbox_mu.unlock();
+        batch.clear();
+    }
+
+    void FlushAll(Worker* worker) {
+        for (int i = 0; i < workers_.size(); ++i) Send(worker, i);
+    }
+
+    // Returns false if the node should be discarded, otherwise its sorting heuristic.
+    bool Evaluate(ChallengeHeuristic* heuristic, Node* child, int g, int* h) {
+        int pruning_h = 0;
+        heuristic->Evaluate(*child, &pruning_h, h);
+        return options.move_limit == 0 || (g + pruning_h) <= options.move_limit;
+    }
+
+    void RunWorker(int worker_id, const Node& layout, const vector<Card>& targets, int required_count) {
+        Worker* w = workers_[worker_id].get();
+        ChallengeHeuristic heuristic(targets, required_count, PatternBounds());
+        int since_flush = 0;
+        long expanded_batch = 0;
+
+        while (!stop_) {
+            // 1. Take ownership of nodes sent by other workers.
+            vector<State> received;
+            w->inbox_mu.lock();
+            received.swap(w->inbox);
+            w->inbox_mu.unlock();
+            int duplicates = 0;
+            for (const auto& s : received) {
+                Node* node = s.GetNode();
+                if (w->closed_set->Find(node)) {
+                    w->pool.Delete(node);
+                    ++duplicates;
+                } else {
+                    w->closed_set->Add(node);
+                    w->open_set.push(State(node, s.GetG(), s.GetH(), ++w->id_counter));
+                }
+            }
+            if (duplicates) pending_ -= duplicates;
+
+            if (w->open_set.empty()) {
+                // Nothing local to do: hand over everything buffered, then either wait
+                // for more work or stop once no node is queued or in transit anywhere.
+                FlushAll(w);
+                since_flush = 0;
+                if (pending_ == 0) break;
+                sched_yield();
+                continue;
+            }
+
+            State current = w->open_set.top();
+            w->open_set.pop();
+            Node* node = current.GetNode();
+
+            if (w->node_limit > 0) {
+                if (w->closed_set->size() > w->node_limit) {
+                    pending_ -= ShrinkToBudget(w->node_limit, &w->open_set, w->closed_set.get(),
+                                               &w->pool, &w->expanded);
+                }
+                w->expanded.push_back(node);
+            }
+
+            if (++expanded_batch == kExpandBatchSize) {
+                long total = (nodes_expanded_ += expanded_batch);
+                expanded_batch = 0;
+                if (!options.quiet && total / 50000 != (total - kExpandBatchSize) / 50000) {
+                    cout << "A* Expanded: " << total << " Depth: " << current.GetG()
+                         << " H: " << current.GetH() << endl;
+                }
+                if (options.move_limit == 0 && total > kMaxUnlimitedExpanded) {
+                    if (!options.quiet) cout << "Aborting: Too many nodes expanded." << endl;
+                    stop_ = true;
+                    break;
+                }
+                // Parallel runs are not checkpointed, they just stop.
+                if (CheckpointTimer::Stopping()) {
+                    stopped_ = true;
+                    stop_ = true;
+                    break;
+                }
+            }
+
+            int new_g = current.GetG() + 1;
+            int kept = 0;
+            auto children = node->Expand(&w->pool);
+            w->nodes_generated += children.size();
+            heuristic.Prepare(*node);
+            for (Node* child : children) {
+                if (options.move_limit > 0 && new_g > options.move_limit) {
+                    w->pool.Delete(child);
+                    continue;
+                }
+
+                if (CheckExplicitGoals(child, targets, required_count)) {
+                    solution_mu_.lock();
+                    if (!solved_) {
+                        solved_ = true;
+                        solution_ = ReconstructPath(layout, child, &w->pool);
+                        if (!options.quiet) {
+                            cout << "A* Solution Found! Nodes expanded: " << nodes_expanded_ + expanded_batch << endl;
+                            cout << "Solution Length: " << new_g << endl;
+                        }
+                    }
+                    solution_mu_.unlock();
+                    stop_ = true;
+                    w->pool.Delete(child);
+                    continue;
+                }
+
+                int owner = OwnerOf(child);
+                if (owner == worker_id && w->closed_set->Find(child)) {
+                    w->pool.Delete(child);
+                    continue;
+                }
+
+                int h = 0;
+                if (!Evaluate(&heuristic, child, new_g, &h)) {
+                    w->pool.Delete(child);
+                    continue;
+                }
+
+                if (owner == worker_id) {
+                    w->closed_set->Add(child);
+                    w->open_set.push(State(child, new_g, h, ++w->id_counter));
+                    ++kept;
+                } else {
+                    // Counted before it can reach its owner, which may drop it
+                    // as a duplicate (and uncount it) right away.
+                    ++pending_;
+                    w->outbox[owner].push_back(State(child, new_g, h, 0));
+                    if (w->outbox[owner].size() >= kMessageBatchSize) Send(w, owner);
+                }
+            }
+            // Children kept here are only expanded by this worker, after the
+            // parent is retired. Every node is counted before it can be
+            // retired, so pending_ only reaches zero when the whole search
+            // space under the move limit is exhausted.
+            if (kept != 1) pending_ += kept - 1;
+
+            if (++since_flush >= kFlushInterval) {
+                FlushAll(w);
+                since_flush = 0;
+            }
         }
+        nodes_expanded_ += expanded_batch;
+    }
 
-        // B. Clutter Penalty (VITAL for limited capacity)
-        // If the board is clogged (low mobile slots), add a penalty.
-        int empty_reserve_slots = 4 - node->GetReserve().size();
-        int empty_tableau_cols = 0;
-        for(int i=0; i<8; ++i) {
-            if (node->GetTableau(i).size() == 0) empty_tableau_cols++;
+    string SolveParallel(const Node& layout, const vector<Card>& targets, int required_count, int num_threads) {
+        // Split the single-threaded closed set budget between the workers.
+        int total_bins = ClosedSetBins();
+        int bins = total_bins;
+        while (bins > 4096 && (long)bins * num_threads > total_bins) bins >>= 1;
+        if (MemoryBudgetBytes() == 0) bins = max(bins, 65536);
+        long node_limit = NodeLimit((long long)bins * num_threads) / num_threads;
+
+        workers_.clear();
+        for (int i = 0; i < num_threads; ++i) {
+            workers_.emplace_back(new Worker);
+            workers_.back()->closed_set.reset(new HashTable(bins));
+            workers_.back()->outbox.resize(num_threads);
+            workers_.back()->node_limit = node_limit;
         }
-        int mobile_slots = empty_reserve_slots + empty_tableau_cols;
+        stop_ = false;
+        stopped_ = false;
+        solved_ = false;
+        solution_.clear();
+        nodes_expanded_ = 0;
 
-        if (mobile_slots == 0) total_h += 15;
-        else if (mobile_slots == 1) total_h += 8;
-        else if (mobile_slots == 2) total_h += 3;
+        Node* root = workers_[0]->pool.New(layout);
+        root->ComputeHash();
+        if (CheckExplicitGoals(root, targets, required_count)) {
+            cout << "Solution Found at Start!" << endl;
+            return "";
+        }
+        Worker* root_owner = workers_[OwnerOf(root)].get();
+        root_owner->closed_set->Add(root);
+        ChallengeHeuristic heuristic(targets, required_count, PatternBounds());
+        heuristic.Prepare(*root);
+        int pruning_h = 0, h = 0;
+        heuristic.Evaluate(*root, &pruning_h, &h);
+        root_owner->open_set.push(State(root, 0, h, 0));
+        pending_ = 1;
+
+        if (!options.quiet) cout << "Parallel A* with " << num_threads << " threads" << endl;
+
+        vector<std::thread> threads;
+        for (int i = 0; i < num_threads; ++i) {
+            threads.emplace_back(&AStarSolver::RunWorker, this, i, std::cref(layout),
+                                 std::cref(targets), required_count);
+        }
+        for (auto& thread : threads) thread.join();
 
-        return total_h;
+        if (!solved_ && stopped_) {
+            search_stopped = true;
+            if (!options.quiet) cout << "A* stopped after " << nodes_expanded_ << " expansions." << endl;
+        } else if (!solved_ && !options.quiet) {
+            cout << "A* Search failed to find a solution." << endl;
+        }
+        long long nodes_generated = 0;
+        for (const auto& w : workers_) {
+            nodes_generated += w->nodes_generated;
+            solve_stats.AddTable(*w->closed_set, w->closed_set->MaxChainLength());
+            solve_stats.AddPool(w->pool);
+        }
+        solve_stats.AddSearch(nodes_generated, nodes_expanded_);
+        // Nodes may have migrated between pools; release all pools together.
+        workers_.clear();
+        return solution_;
+    }
+
+    vector<std::unique_ptr<Worker>> workers_;
+    std::atomic<long> pending_{0};
+    std::atomic<long> nodes_expanded_{0};
+    std::atomic<bool> stop_{false};
+    std::atomic<bool> stopped_{false};  // by the time limit or a signal
+    bool solved_ = false;
+    string solution_;
+    std::mutex solution_mu_;
+
+    bool CheckExplicitGoals(const Node* node, const vector<Card>& targets, int required_count) {
+        int met_count = 0;
+        if (targets.size() == 4 && required_count < 4) {
+             // "Matches any X of 4 suits"
+             for(const auto& t : targets) {
+                 if (node->GetFoundation(t.suit()).Has(t)) met_count++;
+             }
+        } else {
+             // Specific cards required
+             for(const auto& t : targets) {
+                 if (node->GetFoundation(t.suit()).Has(t)) met_count++;
+             }
+             if (met_count == targets.size()) met_count = required_count; 
+             else met_count = 0; 
+        }
+        return met_count >= required_count;
     }
 
     vector<Card> ParseTargets(string code) {
@@ -985,66 +1789,20 @@ private:
 };
 
 string SolveByAStar(const Node& layout) {
+    // The pattern bound only tightens pruning against a move limit.
+    if (options.move_limit > 0 && !pattern_database.loaded()) {
+        if (pattern_database.Open(options.pattern_database) ||
+            pattern_database.Open("Test/freecell/solver/" + options.pattern_database)) {
+            if (!options.quiet) cout << "Pattern database loaded." << endl;
+        }
+    }
     AStarSolver solver;
     return solver.Solve(layout, options.challenge_code);
 }
 // --- END OF FIXED AStarSolver ---
 
-int main(int argc, char** argv) {
-  // Hardcoded options for the sample
-  options.seed = 2;
-  options.beam_size = 2048;
-  options.num_beams = 1;
-  options.quiet = false;
-  options.auto_play = true;
-  Node::Initialize();
-
-  // Determine solutions directory
-  string solutions_dir = "../Solutions/";
-  {
-      ifstream check_dir(solutions_dir + "sol_0");
-      if (!check_dir.good()) {
-          string alt_dir = "Test/freecell/Solutions/";
-          ifstream check_alt(alt_dir + "sol_0");
-          if (check_alt.good()) {
-              solutions_dir = alt_dir;
-          }
-      }
-  }
-
-  // Encoded Deck Configuration
-  string encoded_deck = "";
-  
-  if (argc > 1) {
-      encoded_deck = argv[1];
-  }
-
-  // Parse Challenge and Moves if present
-  size_t first_dollar = encoded_deck.find('$');
-  if (first_dollar != string::npos) {
-      size_t second_dollar = encoded_deck.find('$', first_dollar + 1);
-      if (second_dollar != string::npos) {
-          options.challenge_code = encoded_deck.substr(first_dollar + 1, second_dollar - first_dollar - 1);
-          string moves_str = encoded_deck.substr(second_dollar + 1);
-          try {
-              options.move_limit = stoi(moves_str);
-          } catch (...) {
-              options.move_limit = 0;
-          }
-          if (options.move_limit > 0) {
-              if (options.challenge_code != "00") {
-                  options.auto_play = false;
-                  cout << "AutoPlay disabled due to Move Limit in Challenge." << endl;
-              }
-          }
-          // Truncate deck string to just the deck part
-          encoded_deck = encoded_deck.substr(0, first_dollar);
-          
-          cout << "Challenge Detected: " << options.challenge_code << endl;
-          cout << "Move Limit: " << options.move_limit << endl;
-      }
-  }
-
+// Builds the layout of a deck string without its "$challenge$limit" suffix.
+Node ParseDeck(const string& encoded_deck) {
   // Parse Reserve (first 8 chars -> 4 slots)
   vector<Card> reserve_cards;
   for(int i=0; i<4; ++i) {
@@ -1088,9 +1846,11 @@ int main(int argc, char** argv) {
 
   Node layout;
   layout.LoadState(reserve_cards, foundation_tops, tableaus);
-  Node initial_layout = layout;
+  return layout;
+}
 
-  // Encode Deck Configuration for checking existing solutions
+// Encodes a layout in the deck string format read by ParseDeck.
+string EncodeDeck(const Node& layout) {
   string deck_encoded_str = "";
 
   // Reserve (4 slots)
@@ -1124,7 +1884,324 @@ int main(int argc, char** argv) {
           deck_encoded_str += t.card(j).ToCleanString();
       }
   }
+  return deck_encoded_str;
+}
+
+// Deck string of the classic numbered deal `deal` (Microsoft FreeCell,
+// DealRecognition.py generates the same layouts).
+string DealDeck(int deal) {
+  const int ms_suits[] = {CLUB, DIAMOND, HEART, SPADE};
+  vector<Card> deck;
+  for (int i = 0; i < kTotalCards; ++i) deck.push_back(Card(ms_suits[i % 4], i / 4));
+
+  unsigned seed = deal;
+  vector<Card> order;
+  for (int left = kTotalCards; left > 0; --left) {
+      seed = seed * 214013 + 2531011;
+      int j = ((seed >> 16) & 0x7fff) % left;
+      order.push_back(deck[j]);
+      deck[j] = deck[left - 1];
+  }
+
+  string encoded = string(16, '0');
+  const char* roman_numerals[] = {"i", "ii", "iii", "iv", "v", "vi", "vii", "viii"};
+  for (int col = 0; col < 8; ++col) {
+      encoded += roman_numerals[col];
+      for (int i = col; i < kTotalCards; i += 8) encoded += order[i].ToCleanString();
+  }
+  return encoded;
+}
+
+// --- Mid-game transposition cache (see solution_index.h) ---
+
+// Deck string with the free cells sorted, as their order does not matter.
+string CanonicalDeck(const Node& layout) {
+  string deck = EncodeDeck(layout);
+  vector<string> cells;
+  for (int i = 0; i < 4; ++i) cells.push_back(deck.substr(i * 2, 2));
+  // Occupied cells first, like Reserve keeps them.
+  sort(cells.begin(), cells.end(), [](const string& a, const string& b) {
+      if ((a == "00") != (b == "00")) return b == "00";
+      return a < b;
+  });
+  for (int i = 0; i < 4; ++i) deck.replace(i * 2, 2, cells[i]);
+  return deck;
+}
+
+// Splits a stored deck line "deck$challenge$limit".
+void SplitDeckLine(const string& line, string* deck, string* challenge, int* limit) {
+  *deck = line;
+  *challenge = "00";
+  *limit = 0;
+  size_t first_dollar = line.find('$');
+  if (first_dollar == string::npos) return;
+  *deck = line.substr(0, first_dollar);
+  size_t second_dollar = line.find('$', first_dollar + 1);
+  if (second_dollar == string::npos) return;
+  *challenge = line.substr(first_dollar + 1, second_dollar - first_dollar - 1);
+  *limit = atoi(line.substr(second_dollar + 1).c_str());
+}
+
+// Creates `path` only if it does not exist yet, so solvers running side by
+// side never save to the same sol_N. Sets *exists when another file is there.
+bool CreateNewFile(const string& path, bool* exists) {
+#ifdef _WIN32
+  int fd = _open(path.c_str(), _O_CREAT | _O_EXCL | _O_WRONLY, _S_IREAD | _S_IWRITE);
+  *exists = fd < 0 && errno == EEXIST;
+  if (fd < 0) return false;
+  _close(fd);
+#else
+  int fd = open(path.c_str(), O_CREAT | O_EXCL | O_WRONLY, 0644);
+  *exists = fd < 0 && errno == EEXIST;
+  if (fd < 0) return false;
+  close(fd);
+#endif
+  return true;
+}
+
+bool ReadStoredSolution(const string& solutions_dir, int n, string* deck_line, string* solution) {
+  ifstream f(solutions_dir + "sol_" + to_string(n));
+  if (!f.good()) return false;
+  deck_line->clear();
+  solution->clear();
+  getline(f, *deck_line);
+  getline(f, *solution);
+  for (string* line : {deck_line, solution}) {
+      if (!line->empty() && line->back() == '\r') line->pop_back();
+  }
+  return true;
+}
+
+// Replays a stored solution and adds every board along it to the index.
+void IndexSolution(SolutionIndex* index, int n, const string& deck_line,
+                   const string& solution, long long now) {
+  string deck, challenge;
+  int limit;
+  SplitDeckLine(deck_line, &deck, &challenge, &limit);
+  vector<unsigned long long> boards;
+  // Files that do not hold a deck are recorded without boards.
+  if (deck.length() > 16 && deck.find("viii") != string::npos) {
+      Node layout = ParseDeck(deck);
+      boards.push_back(SolutionIndex::HashKey(CanonicalDeck(layout)));
+      size_t pos = 0;
+      EncodedMove move;
+      while (pos < solution.length() && ParseEncodedMove(solution, &pos, &move) &&
+             ApplyEncodedMove(move, &layout)) {
+          boards.push_back(SolutionIndex::HashKey(CanonicalDeck(layout)));
+      }
+      // Nothing is left to play from the last board.
+      boards.pop_back();
+  }
+  index->AddSolution(n, boards, now);
+}
+
+// Every Node reads the cards dealt to its columns from
+// Tableau::init_tableau_, which ParseDeck overwrites. Boards of stored decks
+// are replayed with the dealt cards of the board being solved set aside and
+// put back when this goes out of scope.
+class SavedDeal {
+ public:
+  SavedDeal() { memcpy(cards_, Tableau::init_tableau_, sizeof(cards_)); }
+  ~SavedDeal() { memcpy(Tableau::init_tableau_, cards_, sizeof(cards_)); }
+
+ private:
+  Card cards_[8][52];
+};
+
+// Looks `layout` up among the boards of stored solutions for the same
+// challenge. Returns the moves left from it, or "" if none fits the move
+// limit; *source names the solution file used.
+string FindStoredSuffix(const string& solutions_dir, const Node& layout, string* source) {
+  const string index_path = solutions_dir + "index";
+  const long long now = time(nullptr);
+  const string key = CanonicalDeck(layout);
+  SavedDeal saved_deal;
+  SolutionIndex index;
+  index.Load(index_path);
+
+  // Solutions saved since the last lookup are indexed on the way.
+  bool changed = false;
+  string deck_line, solution;
+  for (int n = 0; ReadStoredSolution(solutions_dir, n, &deck_line, &solution); ++n) {
+      if (index.Indexed(n)) continue;
+      IndexSolution(&index, n, deck_line, solution, now);
+      changed = true;
+  }
+
+  string suffix;
+  for (auto* entry : index.Find(SolutionIndex::HashKey(key))) {
+      if (!ReadStoredSolution(solutions_dir, entry->solution, &deck_line, &solution)) continue;
+      string deck, challenge;
+      int limit;
+      SplitDeckLine(deck_line, &deck, &challenge, &limit);
+      if (challenge != options.challenge_code) continue;
+
+      // Replay to the indexed step and confirm the board, not just its hash.
+      Node board = ParseDeck(deck);
+      size_t pos = 0;
+      EncodedMove move;
+      bool valid = true;
+      for (int i = 0; i < entry->step && valid; ++i) {
+          valid = ParseEncodedMove(solution, &pos, &move) && ApplyEncodedMove(move, &board);
+      }
+      if (!valid || CanonicalDeck(board) != key) continue;
+
+      string rest = solution.substr(pos);
+      if (options.move_limit > 0) {
+          int moves_left = 0;
+          for (size_t p = 0; p < rest.length() && ParseEncodedMove(rest, &p, &move);)
+              ++moves_left;
+          if (moves_left > options.move_limit) continue;
+      }
+      SolutionIndex::Touch(entry, now);
+      *source = solutions_dir + "sol_" + to_string(entry->solution) + ", move " +
+                to_string(entry->step);
+      suffix = rest;
+      changed = true;
+      break;
+  }
+
+  if (changed) {
+      index.Evict(now);
+      index.Save(index_path);
+  }
+  return suffix;
+}
+
+// Applies `move` to `layout` (without AutoPlay) and returns it encoded as a
+// solution step, e.g. "8s_3_R" or "8s#3_3_~5~" for a stack of three.
+string ApplyAndEncodeMove(const Move& move, Node* layout) {
+  string encoded_step;
+  int dest_size_before = 0;
+
+  if (move.type == kTableauToReserve) {
+      Card c = layout->GetTableau(move.from).Top();
+      // Encode: card_col_R
+      encoded_step = c.ToCleanString() + "_" + to_string(move.from) + "_R";
+  } else if (move.type == kTableauToTableau) {
+      Card c = layout->GetTableau(move.from).Top();
+      dest_size_before = layout->GetTableau(move.to).size();
+      // Encode: card_col_~col~
+      encoded_step = c.ToCleanString() + "_" + to_string(move.from) + "_~" + to_string(move.to) + "~";
+  } else if (move.type == kTableauToFoundation) {
+      Card c = layout->GetTableau(move.from).Top();
+      // Encode: card_col_F
+      encoded_step = c.ToCleanString() + "_" + to_string(move.from) + "_F";
+  } else if (move.type == kReserveToTableau) {
+      Card c = layout->GetReserve()[move.from];
+      // Encode: card_R_~col~
+      encoded_step = c.ToCleanString() + "_R_~" + to_string(move.to) + "~";
+  } else if (move.type == kReserveToFoundation) {
+      Card c = layout->GetReserve()[move.from];
+      // Encode: card_R_F
+      encoded_step = c.ToCleanString() + "_R_F";
+  }
+
+  if (move.type == kTableauToReserve) layout->ApplyTableauToReserve(move.from);
+  else if (move.type == kTableauToTableau) layout->ApplyTableauToTableau(move.from, move.to);
+  else if (move.type == kTableauToFoundation) layout->ApplyTableauToFoundation(move.from);
+  else if (move.type == kReserveToTableau) layout->ApplyReserveToTableau(move.from, move.to);
+  else if (move.type == kReserveToFoundation) layout->ApplyReserveToFoundation(move.from);
+
+  // Check for stack move
+  if (move.type == kTableauToTableau) {
+      int dest_size_after = layout->GetTableau(move.to).size();
+      int moved_count = dest_size_after - dest_size_before;
+      if (moved_count > 1) {
+          // Update encoded step for stack move: card#count_col_~col~
+          // The bottom card of the moved stack is now at index
+          // dest_size_after - moved_count of the destination.
+          Card bottom_card = layout->GetTableau(move.to).card(dest_size_after - moved_count);
+          encoded_step = bottom_card.ToCleanString() + "#" + to_string(moved_count) + "_" + to_string(move.from) + "_~" + to_string(move.to) + "~";
+      }
+  }
+  return encoded_step;
+}
+
+// One machine-readable line per run, collected by SolverStats.py.
+void PrintStats() {
+  cout << "Stats: " << solve_stats.ToJson(PeakMemoryBytes()) << endl;
+}
+
+int main(int argc, char** argv) {
+  PhaseTimer phase_timer(&solve_stats);
+
+  // Hardcoded options for the sample
+  options.seed = 2;
+  options.beam_size = 2048;
+  options.num_beams = 1;
+  options.quiet = false;
+  options.auto_play = true;
+
+  // Optional flags ahead of the deck string, e.g. "-t 4" for parallel A*.
+  Options flags(argc, argv);
+  options.num_threads = max(1, flags.num_threads);
+  options.pattern_database = flags.pattern_database;
+  options.memory_budget_mb = max(0, flags.memory_budget_mb);
+  options.hint_ms = max(0, flags.hint_ms);
+  options.lower_bound = max(0, flags.lower_bound);
+  options.exact_duplicates = flags.exact_duplicates;
+  options.checkpoint_seconds = max(0, flags.checkpoint_seconds);
+  options.time_limit = max(0, flags.time_limit);
+  Node::Initialize();
+
+  // Determine solutions directory
+  string solutions_dir = "../Solutions/";
+  {
+      ifstream check_dir(solutions_dir + "sol_0");
+      if (!check_dir.good()) {
+          string alt_dir = "Test/freecell/Solutions/";
+          ifstream check_alt(alt_dir + "sol_0");
+          if (check_alt.good()) {
+              solutions_dir = alt_dir;
+          }
+      }
+  }
+
+  // Encoded Deck Configuration
+  string encoded_deck = "";
   
+  if (optind < argc) {
+      encoded_deck = argv[optind];
+  } else if (flags.deal > 0) {
+      // "-d N" alone solves the numbered deal N.
+      encoded_deck = DealDeck(flags.deal);
+  }
+  solve_stats.set_deal(flags.deal);
+  const string requested_deck = encoded_deck;
+
+  // Parse Challenge and Moves if present
+  size_t first_dollar = encoded_deck.find('$');
+  if (first_dollar != string::npos) {
+      size_t second_dollar = encoded_deck.find('$', first_dollar + 1);
+      if (second_dollar != string::npos) {
+          options.challenge_code = encoded_deck.substr(first_dollar + 1, second_dollar - first_dollar - 1);
+          string moves_str = encoded_deck.substr(second_dollar + 1);
+          try {
+              options.move_limit = stoi(moves_str);
+          } catch (...) {
+              options.move_limit = 0;
+          }
+          if (options.move_limit > 0) {
+              if (options.challenge_code != "00") {
+                  options.auto_play = false;
+                  cout << "AutoPlay disabled due to Move Limit in Challenge." << endl;
+              }
+          }
+          // Truncate deck string to just the deck part
+          encoded_deck = encoded_deck.substr(0, first_dollar);
+          
+          cout << "Challenge Detected: " << options.challenge_code << endl;
+          cout << "Move Limit: " << options.move_limit << endl;
+      }
+  }
+
+  Node layout = ParseDeck(encoded_deck);
+  Node initial_layout = layout;
+
+  // Encode Deck Configuration for checking existing solutions
+  string deck_encoded_str = EncodeDeck(layout);
+
   // Capture initial auto moves
   string initial_auto_moves = CaptureAutoMoves(layout);
   // layout is now in the state after initial auto moves
@@ -1215,6 +2292,9 @@ int main(int argc, char** argv) {
                       Node layout_replay = initial_layout;
                       
                       DecodeAndShow(full_solution, layout_replay);
+                      phase_timer.Lap("cache");
+                      solve_stats.set_result("cached");
+                      PrintStats();
                       return 0;
                   }
               }
@@ -1236,10 +2316,79 @@ int main(int argc, char** argv) {
       if (!options.quiet) cout << "Adjusted Move Limit (after " << initial_moves_count << " auto moves): " << options.move_limit << endl;
   }
 
+  // A board reached part way through a stored solution gets the rest of it.
+  {
+      string source;
+      string suffix = FindStoredSuffix(solutions_dir, layout, &source);
+      if (!suffix.empty()) {
+          cout << "Found position in existing solution " << source << "\n\n";
+
+          cout << "Encoded deck configuration\n" << requested_deck << "\n\n";
+
+          cout << "Readable deck configuration\n";
+          Node display_layout = initial_layout;
+          display_layout.Show();
+          cout << "\n";
+
+          string full_solution = initial_auto_moves + suffix;
+          cout << "Encoded solution\n" << full_solution << "\n\n";
+
+          cout << "Readable solution\n";
+          DecodeAndShow(full_solution, initial_layout);
+          phase_timer.Lap("cache");
+          solve_stats.set_result("cached");
+          solve_stats.set_search("solution_index");
+          PrintStats();
+          return 0;
+      }
+  }
+
   vector<Move> moves;
   string solution_str;
 
+  // Checkpoints sit next to the solutions, one per deck line.
+  if (options.checkpoint_seconds > 0 && options.hint_ms == 0) {
+      checkpoint_goal = deck_encoded_str + "$" + options.challenge_code + "$" +
+                        to_string(options.move_limit);
+      char name[32];
+      snprintf(name, sizeof(name), "checkpoint_%016llx",
+               SolutionIndex::HashKey(checkpoint_goal));
+      checkpoint_path = solutions_dir + name;
+      signal(SIGINT, RequestStop);
+      signal(SIGTERM, RequestStop);
+  }
+  if (options.time_limit > 0) {
+      search_deadline = std::chrono::steady_clock::now() + std::chrono::seconds(options.time_limit);
+  }
+
+  phase_timer.Lap("setup");
+  if (options.hint_ms > 0) {
+      // Hint mode: one good next move, fast; the full plan comes from a normal run.
+      solve_stats.set_search("hint");
+      Move hint;
+      AStarSolver hint_solver;
+      if (hint_solver.Hint(layout, options.challenge_code, options.hint_ms, &hint)) {
+          Node after_hint = layout;
+          string hint_str = initial_auto_moves + ApplyAndEncodeMove(hint, &after_hint);
+          cout << "Encoded hint\n" << hint_str << "\n\n";
+          cout << "Readable solution\n";
+          DecodeAndShow(hint_str, initial_layout);
+          solve_stats.set_result("hint");
+      } else {
+          cout << "No hint found." << endl;
+      }
+      phase_timer.Lap("hint");
+      PrintStats();
+      return 0;
+  }
   if (options.challenge_code == "00") {
+      if (options.memory_budget_mb > 0) {
+          // Two live levels plus the children being sorted into the next one.
+          long long per_beam = ((long long)options.memory_budget_mb << 20) /
+                               options.num_beams / (3 * sizeof(Node));
+          options.beam_size = min(options.beam_size, FloorPowerOfTwo(max(1LL, per_beam)));
+          if (!options.quiet) cout << "Beam size: " << options.beam_size << endl;
+      }
       for (int i = 0; i < options.num_beams; ++i)
         beams.emplace_back(
             new Beam(options.seed, options.beam_size, i, options.num_beams));
@@ -1255,8 +2404,29 @@ int main(int argc, char** argv) {
           // Note: In multi-threaded mode, we'd need to capture the solution from the winning thread.
           // For this sample, we assume single thread.
       }
+      solve_stats.set_search("beam");
+      solve_stats.set_threads(options.num_beams);
+      solve_stats.set_beam_size(options.beam_size);
+      for (const auto& beam : beams) beam->ReportStats(&solve_stats);
   } else {
+      // The subgoal planner names itself if its plan is used.
+      solve_stats.set_search(options.num_threads > 1 ? "parallel_astar" : "astar");
       solution_str = SolveByAStar(layout);
+      solve_stats.set_threads(options.num_threads);
+  }
+  phase_timer.Lap("search");
+  if (!solution_str.empty()) solve_stats.set_result("solved");
+  if (search_stopped && solution_str.empty()) {
+      // Picked up again by the next run on this deck line.
+      if (checkpoint_saved) {
+          solve_stats.set_result("checkpointed");
+          cout << "Search stopped, checkpoint saved to " << checkpoint_path << endl;
+      } else {
+          solve_stats.set_result("stopped");
+          cout << "Search stopped without a checkpoint." << endl;
+      }
+  } else if (!checkpoint_path.empty()) {
+      remove(checkpoint_path.c_str());
   }
 
   if (!solution_str.empty()) {
@@ -1268,112 +2438,11 @@ int main(int argc, char** argv) {
       int step = 1;
       string encoded_solution_string = initial_auto_moves;
 
-      // Helper lambda to print a move
-      // We will store the readable output in a buffer and print it AFTER the encoded string
-      // stringstream readable_output_buffer; // Removed
-      
-      auto PrintMove = [&](string card_name, string source, string dest, string on_card, bool is_auto = false, string encoded_step = "") {
-          // stringstream ss;
-          // string clean_card = StripAnsi(card_name);
-          // string clean_on_card = StripAnsi(on_card);
-          
-          if (!encoded_step.empty()) {
-              // Removed pipe separator as per request
-              encoded_solution_string += encoded_step;
-          }
-
-          // No printing here
-      };
-
       // Initial AutoPlay - Already done and captured in initial_auto_moves
       // ProcessAutoMoves(current_layout); 
 
       for (const auto& move : solution_moves) {
-          // Capture state before move
-          string card_name = "Unknown";
-          string source = "Unknown";
-          string dest = "Unknown";
-          string on_card = "";
-          string encoded_step = "";
-          int dest_size_before = 0;
-
-          if (move.type == kTableauToReserve) {
-              Card c = current_layout.GetTableau(move.from).Top();
-              card_name = c.ToString();
-              source = "Tableau " + to_string(move.from + 1);
-              dest = "Reserve";
-              // Encode: card_col_R
-              encoded_step = c.ToCleanString() + "_" + to_string(move.from) + "_R";
-
-          } else if (move.type == kTableauToTableau) {
-              Card c = current_layout.GetTableau(move.from).Top();
-              card_name = c.ToString();
-              source = "Tableau " + to_string(move.from + 1);
-              dest = "Tableau " + to_string(move.to + 1);
-              dest_size_before = current_layout.GetTableau(move.to).size();
-              if (!current_layout.GetTableau(move.to).empty()) {
-                  on_card = string(" (on ") + current_layout.GetTableau(move.to).Top().ToString() + ")";
-              } else {
-                  on_card = " (empty column)";
-              }
-              // Encode: card_col_~col~
-              encoded_step = c.ToCleanString() + "_" + to_string(move.from) + "_~" + to_string(move.to) + "~";
-
-          } else if (move.type == kTableauToFoundation) {
-              Card c = current_layout.GetTableau(move.from).Top();
-              card_name = c.ToString();
-              source = "Tableau " + to_string(move.from + 1);
-              dest = "Foundation";
-              // Encode: card_col_F
-              encoded_step = c.ToCleanString() + "_" + to_string(move.from) + "_F";
-
-          } else if (move.type == kReserveToTableau) {
-              Card c = current_layout.GetReserve()[move.from];
-              card_name = c.ToString();
-              source = "Reserve";
-              dest = "Tableau " + to_string(move.to + 1);
-              if (!current_layout.GetTableau(move.to).empty()) {
-                  on_card = string(" (on ") + current_layout.GetTableau(move.to).Top().ToString() + ")";
-              } else {
-                  on_card = " (empty column)";
-              }
-              // Encode: card_R_~col~
-              encoded_step = c.ToCleanString() + "_R_~" + to_string(move.to) + "~";
-
-          } else if (move.type == kReserveToFoundation) {
-              Card c = current_layout.GetReserve()[move.from];
-              card_name = c.ToString();
-              source = "Reserve";
-              dest = "Foundation";
-              // Encode: card_R_F
-              encoded_step = c.ToCleanString() + "_R_F";
-          }
-
-          // Apply the move manually (without AutoPlay)
-          if (move.type == kTableauToReserve) current_layout.ApplyTableauToReserve(move.from);
-          else if (move.type == kTableauToTableau) current_layout.ApplyTableauToTableau(move.from, move.to);
-          else if (move.type == kTableauToFoundation) current_layout.ApplyTableauToFoundation(move.from);
-          else if (move.type == kReserveToTableau) current_layout.ApplyReserveToTableau(move.from, move.to);
-          else if (move.type == kReserveToFoundation) current_layout.ApplyReserveToFoundation(move.from);
-
-          // Check for stack move
-          if (move.type == kTableauToTableau) {
-              int dest_size_after = current_layout.GetTableau(move.to).size();
-              int moved_count = dest_size_after - dest_size_before;
-              if (moved_count > 1) {
-                  card_name = "stack of " + to_string(moved_count) + " cards (" + card_name + ")";
-                  // Update encoded step for stack move: card#count_col_~col~
-                  // We need the bottom card of the stack being moved.
-                  // The cards moved are the top 'moved_count' cards from the source column (before move).
-                  // But we already applied the move.
-                  // The cards are now at the top of 'dest' column.
-                  // The bottom card of the moved stack is at index: dest_size_after - moved_count.
-                  Card bottom_card = current_layout.GetTableau(move.to).card(dest_size_after - moved_count);
-                  encoded_step = bottom_card.ToCleanString() + "#" + to_string(moved_count) + "_" + to_string(move.from) + "_~" + to_string(move.to) + "~";
-              }
-          }
-
-          PrintMove(card_name, source, dest, on_card, false, encoded_step);
+          encoded_solution_string += ApplyAndEncodeMove(move, &current_layout);
 
           // Check for Auto Moves triggered by this move
           encoded_solution_string += CaptureAutoMoves(current_layout);
@@ -1395,21 +2464,19 @@ int main(int argc, char** argv) {
       
       // Deck Configuration is already encoded in deck_encoded_str
 
-      // Find next available filename sol_n in solutions_dir
+      // Claim the next available filename sol_n in solutions_dir
       string filename;
       int n = 0;
       while (true) {
           filename = solutions_dir + "sol_" + to_string(n);
-          ifstream f(filename);
-          bool exists = f.good();
-          f.close();
-          if (!exists) break;
+          bool exists = false;
+          if (CreateNewFile(filename, &exists) || !exists) break;
           n++;
       }
       
       ofstream outfile(filename);
       if (outfile.is_open()) {
-          outfile << argv[1] << endl;
+          outfile << requested_deck << endl;
           outfile << encoded_solution_string << endl;
           cout << "Saved encoded solution to " << filename << "\n\n";
       } else {
@@ -1424,6 +2491,9 @@ int main(int argc, char** argv) {
       printf("-------------------------\n");
   }
 
+  phase_timer.Lap("output");
+  cout << "Peak memory: " << PeakMemoryBytes() / (1 << 20) << " MB" << endl;
+  PrintStats();
   cout << "Solver finished successfully." << endl;
   return 0;
 }
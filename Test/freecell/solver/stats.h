@@ -0,0 +1,121 @@
+#ifndef STATS_H
+#define STATS_H
+
+#include <algorithm>
+#include <chrono>
+#include <mutex>
+#include <sstream>
+#include <string>
+#include <utility>
+#include <vector>
+using namespace std;
+
+#include "hash_table.h"
+#include "node.h"
+
+// Statistics of one solver run, printed as a single "Stats: {...}" JSON line
+// for the Python client (see SolverStats.py). Searches running on several
+// threads add their own counters; the totals are summed.
+class SolveStats {
+ public:
+  void set_result(const string& result) { result_ = result; }
+  void set_search(const string& search) { search_ = search; }
+  void set_threads(int threads) { threads_ = threads; }
+  void set_beam_size(int beam_size) { beam_size_ = beam_size; }
+  void set_deal(int deal) { deal_ = deal; }
+
+  void AddSearch(long long generated, long long expanded) {
+    lock_guard<mutex> lock(mu_);
+    nodes_generated_ += generated;
+    nodes_expanded_ += expanded;
+  }
+
+  // `max_chain` is sampled by the caller, as tables are emptied as they go.
+  void AddTable(const HashTable& table, int max_chain) {
+    lock_guard<mutex> lock(mu_);
+    table_bins_ += table.num_bins();
+    hash_lookups_ += table.num_lookups();
+    hash_hits_ += table.num_hits();
+    hash_collisions_ += table.num_collisions();
+    max_chain_ = max(max_chain_, max_chain);
+  }
+
+  void AddPool(const Pool& pool) {
+    lock_guard<mutex> lock(mu_);
+    peak_pool_bytes_ += pool.allocated_bytes();
+  }
+
+  // Beams search the same levels side by side, so widths add up per level.
+  void AddBeamWidths(const vector<int>& widths) {
+    lock_guard<mutex> lock(mu_);
+    if (beam_widths_.size() < widths.size()) beam_widths_.resize(widths.size());
+    for (int i = 0; i < widths.size(); ++i) beam_widths_[i] += widths[i];
+  }
+
+  void AddPhase(const string& name, double seconds) {
+    lock_guard<mutex> lock(mu_);
+    phases_.emplace_back(name, seconds);
+  }
+
+  string ToJson(long long peak_memory_bytes) const {
+    lock_guard<mutex> lock(mu_);
+    ostringstream out;
+    out << "{\"result\":\"" << result_ << "\",\"search\":\"" << search_ << "\""
+        << ",\"deal\":" << deal_ << ",\"threads\":" << threads_ << ",\"beam_size\":" << beam_size_
+        << ",\"nodes_generated\":" << nodes_generated_
+        << ",\"nodes_expanded\":" << nodes_expanded_
+        << ",\"table_bins\":" << table_bins_
+        << ",\"hash_lookups\":" << hash_lookups_ << ",\"hash_hits\":" << hash_hits_
+        << ",\"hash_hit_rate\":"
+        << (hash_lookups_ ? double(hash_hits_) / hash_lookups_ : 0.0)
+        << ",\"hash_collisions\":" << hash_collisions_ << ",\"exact\":" << (options.exact_duplicates ? "true" : "false")
+        << ",\"max_chain\":" << max_chain_
+        << ",\"peak_pool_bytes\":" << peak_pool_bytes_
+        << ",\"peak_memory_bytes\":" << peak_memory_bytes << ",\"beam_widths\":[";
+    for (int i = 0; i < beam_widths_.size(); ++i)
+      out << (i ? "," : "") << beam_widths_[i];
+    out << "],\"phase_seconds\":{";
+    for (int i = 0; i < phases_.size(); ++i)
+      out << (i ? "," : "") << "\"" << phases_[i].first << "\":" << phases_[i].second;
+    out << "}}";
+    return out.str();
+  }
+
+ private:
+  mutable mutex mu_;
+  string result_ = "unsolved";
+  string search_ = "none";
+  int threads_ = 1;
+  int beam_size_ = 0;
+  int deal_ = 0;
+  long long nodes_generated_ = 0;
+  long long nodes_expanded_ = 0;
+  long long table_bins_ = 0;
+  long long hash_lookups_ = 0;
+  long long hash_hits_ = 0;
+  long long hash_collisions_ = 0;
+  int max_chain_ = 0;
+  long long peak_pool_bytes_ = 0;
+  vector<int> beam_widths_;
+  vector<pair<string, double>> phases_;
+};
+
+// Splits wall time into consecutive named phases of a SolveStats.
+class PhaseTimer {
+ public:
+  explicit PhaseTimer(SolveStats* stats)
+      : stats_(stats), start_(chrono::steady_clock::now()) {}
+
+  // Ends the running phase as `name` and starts the next one.
+  void Lap(const string& name) {
+    auto now = chrono::steady_clock::now();
+    stats_->AddPhase(name, chrono::duration<double>(now - start_).count());
+    start_ = now;
+  }
+
+ private:
+  SolveStats* const stats_;
+  chrono::steady_clock::time_point start_;
+};
+
+#endif
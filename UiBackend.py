@@ -0,0 +1,76 @@
+import contextlib
+import ctypes
+
+# Boundary between the solver logic and the Windows UI stack. Nothing here is
+# imported until a caller actually needs the UI, so encoding, solving and
+# parsing run (and start quickly) without uiautomation, flet or pywin32.
+
+_auto = None
+_dpi_aware = False
+
+
+def set_dpi_awareness():
+    """Makes UI Automation rectangles physical pixels. Safe to call repeatedly."""
+    global _dpi_aware
+    if _dpi_aware:
+        return
+    _dpi_aware = True
+    try:
+        ctypes.windll.shcore.SetProcessDpiAwareness(1)
+    except Exception:
+        try:
+            ctypes.windll.user32.SetProcessDPIAware()
+        except Exception:
+            pass
+
+
+def get_scale_factor():
+    if _auto is not None and hasattr(_auto, "scale_factor"):
+        return _auto.scale_factor
+    try:
+        hdc = ctypes.windll.user32.GetDC(0)
+        dpi = ctypes.windll.gdi32.GetDeviceCaps(hdc, 88) # LOGPIXELSX
+        ctypes.windll.user32.ReleaseDC(0, hdc)
+        return dpi / 96.0
+    except:
+        return 1.25
+
+
+def set_backend(backend):
+    """Replaces the uiautomation module with an object exposing the same API,
+    e.g. UiReplay.ReplayBackend."""
+    global _auto
+    _auto = backend
+
+
+def get_auto():
+    """The uiautomation module (or the backend set with set_backend)."""
+    global _auto
+    if _auto is None:
+        set_dpi_awareness()
+        import uiautomation
+        _auto = uiautomation
+    return _auto
+
+
+def thread_initializer():
+    """Context manager that prepares UI Automation for use on a new thread."""
+    auto = get_auto()
+    if hasattr(auto, "UIAutomationInitializerInThread"):
+        return auto.UIAutomationInitializerInThread()
+    return contextlib.nullcontext()
+
+
+def is_minimized(window):
+    if hasattr(get_auto(), "is_minimized"):
+        return get_auto().is_minimized(window)
+    import win32gui
+    return win32gui.IsIconic(window.NativeWindowHandle)
+
+
+def load_overlay_modules():
+    """Returns (flet, flet.canvas) for the overlay window."""
+    set_dpi_awareness()
+    import flet
+    import flet.canvas
+    return flet, flet.canvas
@@ -0,0 +1,448 @@
+import argparse
+import bisect
+import gzip
+import json
+import re
+import sys
+import time
+from collections import Counter
+
+import UiBackend
+
+# Recorded Solitaire control trees, and a stand-in for the uiautomation module
+# that serves them back, so scraping and overlay lookups can be profiled and
+# regression-tested without a Windows desktop.
+#
+# A recording is JSON lines (gzipped if the path ends in .gz). The first line
+# is a header; every other line is a snapshot of the window, written only when
+# the tree changed:
+#   {"t": <seconds since start>, "minimized": <bool>, "handle": <native
+#    window handle>, "root": <node>}
+# where <node> is [ControlTypeName, Name, AutomationId, [left, top, right,
+# bottom], RuntimeId, [<child node>, ...]].
+
+RECORDING_FORMAT = "solitaire-uia"
+RECORDING_VERSION = 1
+
+WINDOW_REGEX = ".*Solitaire.*"
+# Deep enough for the card stacks the overlay searches with searchDepth=25.
+MAX_RECORD_DEPTH = 25
+
+
+def open_recording(path, mode):
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t")
+    return open(path, mode)
+
+
+# --- RECORDING ---
+
+def encode_control(control, depth=0):
+    rect = control.BoundingRectangle
+    children = []
+    if depth < MAX_RECORD_DEPTH:
+        children = [encode_control(child, depth + 1) for child in control.GetChildren()]
+    return [control.ControlTypeName, control.Name, control.AutomationId,
+            [rect.left, rect.top, rect.right, rect.bottom],
+            list(control.GetRuntimeId()), children]
+
+
+def record(path, interval=0.1, duration=None):
+    """Snapshots the Solitaire window every `interval` seconds until
+    `duration` runs out or Ctrl+C. Returns the number of snapshots written."""
+    auto = UiBackend.get_auto()
+    window = auto.WindowControl(searchDepth=1, RegexName=WINDOW_REGEX)
+    if not window.Exists(0, 1):
+        print("Solitaire window not found.")
+        return 0
+
+    header = {"format": RECORDING_FORMAT, "version": RECORDING_VERSION,
+              "scale_factor": UiBackend.get_scale_factor()}
+    written = 0
+    last = None
+    start = time.perf_counter()
+    with open_recording(path, "w") as f:
+        f.write(json.dumps(header) + "\n")
+        try:
+            while duration is None or time.perf_counter() - start < duration:
+                try:
+                    minimized = bool(window.IsMinimize())
+                    root = encode_control(window)
+                except Exception as e:
+                    # The tree changes under us while cards move; try again.
+                    print(f"Skipped snapshot: {e}")
+                    time.sleep(interval)
+                    continue
+                if (minimized, root) != last:
+                    last = (minimized, root)
+                    snapshot = {"t": round(time.perf_counter() - start, 3),
+                                "minimized": minimized, "handle": window.NativeWindowHandle,
+                                "root": root}
+                    f.write(json.dumps(snapshot, separators=(",", ":")) + "\n")
+                    written += 1
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+    print(f"Recorded {written} snapshots to {path}")
+    return written
+
+
+# --- REPLAY ---
+
+class Rect:
+    def __init__(self, left, top, right, bottom):
+        self.left = left
+        self.top = top
+        self.right = right
+        self.bottom = bottom
+
+    def width(self):
+        return self.right - self.left
+
+    def height(self):
+        return self.bottom - self.top
+
+    def xcenter(self):
+        return (self.left + self.right) // 2
+
+    def ycenter(self):
+        return (self.top + self.bottom) // 2
+
+
+class Node:
+    __slots__ = ("type", "name", "automation_id", "rect", "runtime_id", "children", "parent")
+
+    def __init__(self, encoded, parent):
+        self.type, self.name, self.automation_id, rect, runtime_id, children = encoded
+        self.rect = Rect(*rect)
+        self.runtime_id = tuple(runtime_id)
+        self.parent = parent
+        self.children = [Node(child, self) for child in children]
+
+
+class Snapshot:
+    def __init__(self, record):
+        self.time = record["t"]
+        self.minimized = record.get("minimized", False)
+        self.handle = record.get("handle", 0)
+        # The desktop is the parent of the recorded window, as in UIA.
+        self.desktop = Node(["PaneControl", "Desktop", "", [0, 0, 0, 0], [], []], None)
+        self.desktop.children.append(Node(record["root"], self.desktop))
+        self.by_runtime_id = {(): self.desktop}
+        stack = list(self.desktop.children)
+        while stack:
+            node = stack.pop()
+            self.by_runtime_id[node.runtime_id] = node
+            stack.extend(node.children)
+
+
+def matches(node, criteria):
+    for key, value in criteria.items():
+        if key == "Name" and node.name != value:
+            return False
+        if key == "RegexName" and not re.match(value, node.name):
+            return False
+        if key == "AutomationId" and node.automation_id != value:
+            return False
+        if key == "ControlTypeName" and node.type != value:
+            return False
+    return True
+
+
+def find_descendant(node, criteria, max_depth):
+    """First match in pre-order, children at depth 1, like uiautomation."""
+    for child in node.children:
+        if matches(child, criteria):
+            return child
+        if max_depth > 1:
+            found = find_descendant(child, criteria, max_depth - 1)
+            if found:
+                return found
+    return None
+
+
+class ReplayControl:
+    """A control in the replayed tree. Like a uiautomation Control, a searched
+    control finds its element on first use and again on every Exists(), and a
+    found element reads its properties from the current snapshot."""
+
+    def __init__(self, backend, parent=None, criteria=None, search_depth=0xFFFFFFFF, runtime_id=None):
+        self._backend = backend
+        self._parent = parent
+        self._criteria = criteria or {}
+        self._search_depth = search_depth
+        self._runtime_id = runtime_id
+
+    def _search(self):
+        root = self._parent._node() if self._parent else self._backend.snapshot.desktop
+        found = find_descendant(root, self._criteria, self._search_depth)
+        self._runtime_id = found.runtime_id if found else None
+        return found
+
+    def _node(self):
+        node = None
+        if self._runtime_id is not None:
+            node = self._backend.snapshot.by_runtime_id.get(self._runtime_id)
+        if node is None and self._criteria:
+            node = self._search()
+        if node is None:
+            raise LookupError(f"Control not found: {self._criteria or self._runtime_id}")
+        return node
+
+    def Exists(self, maxSearchSeconds=5, searchIntervalSeconds=0.5):
+        self._backend.call("Exists")
+        deadline = time.perf_counter() + maxSearchSeconds
+        while True:
+            try:
+                found = self._search() if self._criteria else self._node()
+            except LookupError:
+                found = None
+            if found or not self._backend.realtime or time.perf_counter() >= deadline:
+                return found is not None
+            time.sleep(searchIntervalSeconds)
+
+    def Control(self, searchDepth=0xFFFFFFFF, **criteria):
+        return ReplayControl(self._backend, self, criteria, searchDepth)
+
+    def WindowControl(self, searchDepth=0xFFFFFFFF, **criteria):
+        return self.Control(searchDepth, ControlTypeName="WindowControl", **criteria)
+
+    def GroupControl(self, searchDepth=0xFFFFFFFF, **criteria):
+        return self.Control(searchDepth, ControlTypeName="GroupControl", **criteria)
+
+    def ListItemControl(self, searchDepth=0xFFFFFFFF, **criteria):
+        return self.Control(searchDepth, ControlTypeName="ListItemControl", **criteria)
+
+    def GetChildren(self):
+        self._backend.call("GetChildren")
+        return [ReplayControl(self._backend, runtime_id=child.runtime_id)
+                for child in self._node().children]
+
+    def GetParentControl(self):
+        self._backend.call("GetParentControl")
+        parent = self._node().parent
+        if parent is None or parent.parent is None:
+            return None
+        return ReplayControl(self._backend, runtime_id=parent.runtime_id)
+
+    def GetRuntimeId(self):
+        self._backend.call("GetRuntimeId")
+        return list(self._node().runtime_id)
+
+    def SetFocus(self):
+        self._backend.call("SetFocus")
+        return True
+
+    def IsMinimize(self):
+        self._backend.call("IsMinimize")
+        return self._backend.snapshot.minimized
+
+    @property
+    def Name(self):
+        self._backend.call("Name")
+        return self._node().name
+
+    @property
+    def ControlTypeName(self):
+        self._backend.call("ControlTypeName")
+        return self._node().type
+
+    @property
+    def AutomationId(self):
+        self._backend.call("AutomationId")
+        return self._node().automation_id
+
+    @property
+    def BoundingRectangle(self):
+        self._backend.call("BoundingRectangle")
+        return self._node().rect
+
+    @property
+    def NativeWindowHandle(self):
+        node = self._node()
+        if node.parent is self._backend.snapshot.desktop:
+            return self._backend.snapshot.handle
+        return 0
+
+
+class ReplayBackend:
+    """Serves a recording through the part of the uiautomation API that
+    CaptureAndSolve and SolutionOverlay use; install it with
+    UiBackend.set_backend().
+
+    latency_ms is added to every call, either one value or a dict per call
+    name ("Exists", "GetChildren", "Name", "BoundingRectangle", ...).
+    With realtime=True snapshots advance with the wall clock as recorded;
+    otherwise they only change on next_snapshot()/seek().
+    """
+
+    def __init__(self, path, latency_ms=0.0, realtime=False, speed=1.0):
+        with open_recording(path, "r") as f:
+            header = json.loads(f.readline())
+            if header.get("format") != RECORDING_FORMAT:
+                raise ValueError(f"{path} is not a Solitaire UI recording")
+            self.records = [json.loads(line) for line in f if line.strip()]
+        if not self.records:
+            raise ValueError(f"{path} has no snapshots")
+        self.scale_factor = header.get("scale_factor", 1.25)
+        self.times = [record["t"] for record in self.records]
+        self.latency_ms = latency_ms
+        self.realtime = realtime
+        self.speed = speed
+        self.calls = Counter()
+        self._snapshots = {}
+        self._index = 0
+        self._start = time.perf_counter()
+
+    def __len__(self):
+        return len(self.records)
+
+    @property
+    def index(self):
+        if self.realtime:
+            elapsed = (time.perf_counter() - self._start) * self.speed + self.times[0]
+            return max(0, bisect.bisect_right(self.times, elapsed) - 1)
+        return self._index
+
+    @property
+    def snapshot(self):
+        index = self.index
+        if index not in self._snapshots:
+            self._snapshots = {index: Snapshot(self.records[index])}
+        return self._snapshots[index]
+
+    def seek(self, index):
+        self._index = min(max(0, index), len(self.records) - 1)
+
+    def next_snapshot(self):
+        if self._index + 1 >= len(self.records):
+            return False
+        self._index += 1
+        return True
+
+    def call(self, name):
+        self.calls[name] += 1
+        if isinstance(self.latency_ms, dict):
+            latency = self.latency_ms.get(name, 0.0)
+        else:
+            latency = self.latency_ms
+        if latency > 0:
+            time.sleep(latency / 1000.0)
+
+    def is_minimized(self, window):
+        return self.snapshot.minimized
+
+    # Module-level uiautomation entry points.
+    def GetRootControl(self):
+        return ReplayControl(self, runtime_id=())
+
+    def ControlFromHandle(self, handle):
+        if handle != self.snapshot.handle:
+            return None
+        return ReplayControl(self, runtime_id=self.snapshot.desktop.children[0].runtime_id)
+
+    def WindowControl(self, searchDepth=0xFFFFFFFF, **criteria):
+        return ReplayControl(self, None, dict(criteria, ControlTypeName="WindowControl"), searchDepth)
+
+    def Control(self, searchDepth=0xFFFFFFFF, **criteria):
+        return ReplayControl(self, None, criteria, searchDepth)
+
+
+# --- BENCHMARK ---
+
+def bench(path, latency_ms=0.0):
+    """Scrapes every snapshot of a recording and prints the encoded boards with
+    per-scrape time and UIA call counts. Returns a process exit code."""
+    import CaptureAndSolve
+
+    backend = ReplayBackend(path, latency_ms)
+    UiBackend.set_backend(backend)
+    total_calls = Counter()
+    total_seconds = 0.0
+    failed = 0
+    for index in range(len(backend)):
+        backend.seek(index)
+        backend.calls.clear()
+        start = time.perf_counter()
+        state = CaptureAndSolve.scrape_game_state()
+        seconds = time.perf_counter() - start
+        total_seconds += seconds
+        total_calls.update(backend.calls)
+        if state is None:
+            failed += 1
+            encoded = "-"
+        else:
+            encoded = CaptureAndSolve.generate_encoded_string(state)
+        print(f"{index:4} t={backend.times[index]:8.3f}  {seconds * 1000:7.1f} ms  "
+              f"{sum(backend.calls.values()):5} calls  {encoded}")
+
+    print(f"{len(backend)} snapshots, {total_seconds * 1000 / len(backend):.1f} ms per scrape")
+    for name, count in total_calls.most_common():
+        print(f"  {name:20} {count / len(backend):8.1f} per scrape")
+    return 1 if failed else 0
+
+
+def bench_overlay(path, steps, latency_ms=0.0):
+    """Times the overlay's card and slot lookups for every move step against
+    every snapshot. Returns a process exit code."""
+    import SolutionOverlay
+
+    backend = ReplayBackend(path, latency_ms)
+    UiBackend.set_backend(backend)
+    plan = SolutionOverlay.compile_plan(steps)
+    overlay = SolutionOverlay.SolutionOverlay(plan)
+    overlay.connect()
+    moves = [step for step in plan if step.card and not step.automove]
+    if not moves:
+        print("No move steps to look up.")
+        return 1
+
+    total_calls = Counter()
+    total_seconds = 0.0
+    for index in range(len(backend)):
+        backend.seek(index)
+        backend.calls.clear()
+        found = 0
+        start = time.perf_counter()
+        for step in moves:
+            if (overlay.get_card_rect(step.name, step.source_kind, step.source_index)
+                    or overlay.is_card_in_foundation(step)):
+                found += 1
+        seconds = time.perf_counter() - start
+        total_seconds += seconds
+        total_calls.update(backend.calls)
+        print(f"{index:4} t={backend.times[index]:8.3f}  {seconds * 1000 / len(moves):7.2f} ms per step  "
+              f"{sum(backend.calls.values()) / len(moves):7.1f} calls per step  {found}/{len(moves)} cards found")
+
+    lookups = len(backend) * len(moves)
+    print(f"{lookups} lookups, {total_seconds * 1000 / lookups:.2f} ms each")
+    for name, count in total_calls.most_common():
+        print(f"  {name:20} {count / lookups:8.1f} per lookup")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Record and replay the Solitaire UI Automation tree")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    rec = commands.add_parser("record", help="record the live Solitaire window")
+    rec.add_argument("path", help="output file (.jsonl, or .jsonl.gz to compress)")
+    rec.add_argument("--interval", type=float, default=0.1, help="seconds between snapshots")
+    rec.add_argument("--duration", type=float, help="seconds to record (default: until Ctrl+C)")
+
+    replay = commands.add_parser("bench", help="scrape (or run overlay lookups on) every snapshot of a recording")
+    replay.add_argument("path")
+    replay.add_argument("--latency", type=float, default=0.0, help="ms added to every UIA call")
+    replay.add_argument("--steps", help="time the overlay lookups for this solution file instead of scraping")
+
+    args = parser.parse_args()
+    if args.command == "record":
+        return 0 if record(args.path, args.interval, args.duration) else 1
+    if args.steps:
+        import SolutionOverlay
+        return bench_overlay(args.path, SolutionOverlay.read_steps(args.steps), args.latency)
+    return bench(args.path, args.latency)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
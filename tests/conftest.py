@@ -0,0 +1,54 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SOURCE_DIR = os.path.join(REPO_DIR, "Test", "freecell", "solver")
+SOLVER_SOURCES = ["solver.cc", "node.cc", "move.cc", "options.cc", "stock.cc", "tableau.cc"]
+
+sys.path.insert(0, REPO_DIR)
+
+
+@pytest.fixture(scope="session")
+def solver(tmp_path_factory):
+    """Path of the solver built from Test/freecell/solver with g++; tests that
+    run it are skipped where there is no compiler."""
+    return build(tmp_path_factory, "solver", SOLVER_SOURCES)
+
+
+@pytest.fixture(scope="session")
+def pattern_database(tmp_path_factory):
+    """Path of a challenge pattern database written by pdb_builder."""
+    builder = build(tmp_path_factory, "pdb_builder", ["pdb_builder.cc"])
+    path = str(tmp_path_factory.mktemp("pdb") / "challenge.pdb")
+    subprocess.run([builder, path], check=True, capture_output=True)
+    return path
+
+
+def build(tmp_path_factory, name, sources):
+    compiler = shutil.which("g++")
+    if compiler is None:
+        pytest.skip(f"g++ is needed to build {name}")
+    binary = str(tmp_path_factory.mktemp("build") / name)
+    subprocess.run([compiler, "-O2", "-std=c++17", "-pthread", *sources, "-o", binary],
+                   cwd=SOURCE_DIR, check=True)
+    return binary
+
+
+@pytest.fixture
+def solver_run(solver, tmp_path):
+    """Runs the solver on an encoded board from a scratch directory, with its
+    solution store (../Solutions) next to it; returns the CompletedProcess."""
+    run_dir = tmp_path / "run"
+    run_dir.mkdir()
+    (tmp_path / "Solutions").mkdir()
+
+    def run(encoded_string, *args, timeout=120):
+        return subprocess.run([solver, "-q", *args, encoded_string], cwd=run_dir,
+                              capture_output=True, text=True, timeout=timeout)
+    run.run_dir = run_dir
+    run.solutions_dir = tmp_path / "Solutions"
+    return run
@@ -0,0 +1,70 @@
+import re
+
+import pytest
+
+import ChallengePreflight
+import DealRecognition
+
+CHALLENGES = ["1h", "a4", "3s", "54", "73", "qs", "jd", "k2", "t1", "k4"]
+
+
+def test_parse_board():
+    board = "001h0000003s0000" + "i2s3h" + "".join(DealRecognition.COLUMN_PREFIXES[1:]) + "$52$40"
+    reserve, foundation, columns, challenge, move_limit = ChallengePreflight.parse_board(board)
+    assert reserve == [ChallengePreflight.card_index("1h")]
+    assert foundation == [ChallengePreflight.card_index("3s")]
+    assert columns[0] == [ChallengePreflight.card_index("2s"), ChallengePreflight.card_index("3h")]
+    assert columns[1:] == [[]] * 7
+    assert (challenge, move_limit) == ("52", 40)
+    with pytest.raises(ValueError):
+        ChallengePreflight.parse_board("0000000000000000ii$00$0")
+
+
+def test_parse_targets():
+    assert ChallengePreflight.parse_targets("3h") == ([(2, 2)], 1)
+    assert ChallengePreflight.parse_targets("A2") == ([(0, s) for s in range(4)], 2)
+    assert ChallengePreflight.parse_targets("zz") == ([], 0)
+    assert ChallengePreflight.parse_targets("k") == ([], 0)
+
+
+def test_verdicts():
+    board = lambda limit: DealRecognition.deal_encoded_string(1, "1h", limit)
+    _, bound = ChallengePreflight.preflight(board(1))
+    assert bound > 1
+    assert ChallengePreflight.preflight(board(0)) == (ChallengePreflight.UNLIMITED, 0)
+    assert ChallengePreflight.preflight(board(bound - 1)) == (ChallengePreflight.IMPOSSIBLE, bound)
+    assert ChallengePreflight.preflight(board(bound)) == (ChallengePreflight.BORDERLINE, bound)
+    assert ChallengePreflight.preflight(board(bound + 2)) == (ChallengePreflight.BORDERLINE, bound)
+    assert ChallengePreflight.preflight(board(bound + 3)) == (ChallengePreflight.FEASIBLE, bound)
+    assert ChallengePreflight.preflight(DealRecognition.deal_encoded_string(1)) == \
+        (ChallengePreflight.UNLIMITED, 0)
+    # Five of the four aces.
+    assert ChallengePreflight.preflight(DealRecognition.deal_encoded_string(1, "15", 40)) == \
+        (ChallengePreflight.IMPOSSIBLE, 0)
+
+
+def test_foundation_cards_count_as_played():
+    _, foundation, columns, _, _ = ChallengePreflight.parse_board(
+        DealRecognition.deal_encoded_string(1, "3h", 30))
+    targets, count = ChallengePreflight.parse_targets("3h")
+    bound = ChallengePreflight.lower_bound(foundation, columns, targets, count)
+    # With the ace and two of hearts played, the three is two moves closer.
+    played = [ChallengePreflight.card_index("1h"), ChallengePreflight.card_index("2h")]
+    columns = [[c for c in column if c not in played] for column in columns]
+    assert ChallengePreflight.lower_bound(played[1:], columns, targets, count) <= bound - 2
+
+
+@pytest.mark.parametrize("deal", [1, 5, 11, 617, 31465])
+def test_bound_matches_solver(solver_run, deal):
+    # With a limit of one move the solver reports its bound and stops.
+    for challenge in CHALLENGES:
+        board = DealRecognition.deal_encoded_string(deal, challenge, 1)
+        verdict, bound = ChallengePreflight.preflight(board)
+        output = solver_run(board).stdout
+        match = re.search(r"Preflight: the challenge needs at least (\d+) moves", output)
+        if bound <= 1:
+            assert match is None, (board, output)
+            continue
+        assert verdict == ChallengePreflight.IMPOSSIBLE
+        assert match, (board, output)
+        assert int(match.group(1)) == bound, board
@@ -0,0 +1,112 @@
+import os
+import signal
+import subprocess
+import time
+
+import pytest
+
+import CaptureAndSolve
+import DealRecognition
+import SolverStats
+
+# A challenge the A* search takes a few seconds to solve, long enough to be
+# stopped part way and resumed.
+BOARD = DealRecognition.deal_encoded_string(11, "k2", 70)
+
+
+def fnv1a(text):
+    """SolutionIndex::HashKey, which names the checkpoint files."""
+    value = 14695981039346656037
+    for byte in text.encode():
+        value = ((value ^ byte) * 1099511628211) & 0xFFFFFFFFFFFFFFFF
+    return value
+
+
+def checkpoint_path(solver_run):
+    return solver_run.solutions_dir / f"checkpoint_{fnv1a(BOARD):016x}"
+
+
+def clear_store(solver_run):
+    for path in solver_run.solutions_dir.iterdir():
+        path.unlink()
+
+
+def result_of(output):
+    stats = SolverStats.parse_stats(output)
+    return stats["result"] if stats else None
+
+
+@pytest.fixture
+def uninterrupted(solver_run):
+    """Steps of a run that is never stopped (and saves no checkpoint)."""
+    output = solver_run(BOARD, "-k", "0").stdout
+    assert result_of(output) == "solved"
+    clear_store(solver_run)
+    return CaptureAndSolve.parse_steps(output)
+
+
+def test_stopped_search_resumes(solver_run, uninterrupted):
+    output = solver_run(BOARD, "-k", "1", "-T", "1").stdout
+    assert result_of(output) == "checkpointed", output
+    assert "A* stopped after" in output
+    assert checkpoint_path(solver_run).exists()
+    assert not any(path.name.endswith(".tmp") for path in solver_run.solutions_dir.iterdir())
+
+    output = solver_run(BOARD, "-k", "1").stdout
+    assert f"Resuming from ../Solutions/{checkpoint_path(solver_run).name}" in output
+    assert result_of(output) == "solved"
+    assert CaptureAndSolve.parse_steps(output) == uninterrupted
+    # A finished search leaves no checkpoint behind.
+    assert not checkpoint_path(solver_run).exists()
+
+
+def test_checkpoint_of_other_goal_is_ignored(solver_run, uninterrupted):
+    assert result_of(solver_run(BOARD, "-k", "1", "-T", "1").stdout) == "checkpointed"
+    # The same challenge with another move limit has its own checkpoint file;
+    # this one copied there is rejected by its key.
+    other = BOARD.replace("$70", "$69")
+    other_path = solver_run.solutions_dir / f"checkpoint_{fnv1a(other):016x}"
+    other_path.write_bytes(checkpoint_path(solver_run).read_bytes())
+    output = solver_run(other, "-k", "1", "-T", "1").stdout
+    assert "Resuming" not in output
+
+
+def test_damaged_checkpoint_starts_over(solver_run, uninterrupted):
+    assert result_of(solver_run(BOARD, "-k", "1", "-T", "1").stdout) == "checkpointed"
+    path = checkpoint_path(solver_run)
+    data = path.read_bytes()
+    path.write_bytes(data[:len(data) // 2])
+
+    output = solver_run(BOARD, "-k", "0").stdout
+    assert "Resuming" not in output
+    assert result_of(output) == "solved"
+    assert CaptureAndSolve.parse_steps(output) == uninterrupted
+
+
+@pytest.mark.skipif(os.name == "nt", reason="needs POSIX signals")
+def test_interrupted_search_resumes(solver, solver_run, uninterrupted):
+    # The periodic checkpoint is far off: the one resumed from is written on
+    # the signal.
+    process = subprocess.Popen([solver, "-q", "-k", "100", BOARD], cwd=solver_run.run_dir,
+                               stdout=subprocess.PIPE, text=True)
+    time.sleep(1)
+    process.send_signal(signal.SIGINT)
+    output, _ = process.communicate(timeout=60)
+    assert result_of(output) == "checkpointed", output
+    assert checkpoint_path(solver_run).exists()
+
+    output = solver_run(BOARD).stdout
+    assert "Resuming from" in output
+    assert result_of(output) == "solved"
+    assert CaptureAndSolve.parse_steps(output) == uninterrupted
+
+
+def test_parallel_search_stops_at_time_limit(solver_run):
+    # Out of reach in 35 moves; parallel A* would search for a few seconds.
+    board = DealRecognition.deal_encoded_string(11, "jd", 35)
+    start = time.perf_counter()
+    output = solver_run(board, "-t", "2", "-k", "1", "-T", "1").stdout
+    assert time.perf_counter() - start < 10
+    # It is not checkpointed, but stops all the same.
+    assert result_of(output) == "stopped", output
+    assert "Search stopped without a checkpoint." in output
@@ -0,0 +1,78 @@
+import numpy as np
+import pytest
+
+import DealRecognition
+
+
+def tableau_of(deal):
+    """The starting tableau of `deal` as CaptureAndSolve captures it."""
+    order = DealRecognition.generate_deal(deal)
+    return [[(c // 4 + 1, DealRecognition.DEAL_SUITS[c % 4]) for c in order[col::8]]
+            for col in range(8)]
+
+
+def test_generate_deal_is_a_permutation():
+    assert sorted(DealRecognition.generate_deal(1)) == list(range(DealRecognition.NUM_CARDS))
+
+
+def test_deal_1_starting_layout():
+    # The first row of Microsoft FreeCell deal #1.
+    order = DealRecognition.generate_deal(1)
+    assert [DealRecognition.card_code(c) for c in order[:8]] == [
+        "jd", "2d", "9h", "jc", "5d", "7h", "7c", "5h"]
+    assert DealRecognition.deal_encoded_string(1, "k2", 70).startswith("0000000000000000ijd")
+    assert DealRecognition.deal_encoded_string(1, "k2", 70).endswith("$k2$70")
+
+
+@pytest.mark.parametrize("start,stop", [(1, 2), (1, 300), (31460, 31470), (999990, 1000001)])
+def test_generate_deals_matches_generate_deal(start, stop):
+    deals = DealRecognition.generate_deals(start, stop)
+    assert deals.dtype == np.int8
+    assert deals.shape == (stop - start, DealRecognition.NUM_CARDS)
+    for row, deal in enumerate(range(start, stop)):
+        assert deals[row].tolist() == DealRecognition.generate_deal(deal)
+
+
+@pytest.fixture
+def deal_cache(tmp_path, monkeypatch):
+    monkeypatch.setattr(DealRecognition, "CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(DealRecognition, "BLOCK_SIZE", 1000)
+    monkeypatch.setattr(DealRecognition, "LOADED_BLOCKS", {})
+    return tmp_path
+
+
+def test_recognize_fresh_deal(deal_cache, monkeypatch):
+    assert DealRecognition.recognize(tableau_of(1234), max_deal=3000) == (1234, 52)
+    # Blocks are cached and read back on the next lookup.
+    assert (deal_cache / "deals_1.npy").exists()
+    monkeypatch.setattr(DealRecognition, "LOADED_BLOCKS", {})
+    assert DealRecognition.recognize(tableau_of(1234), max_deal=3000) == (1234, 52)
+
+
+def test_recognize_keeps_blocks_in_memory(deal_cache, monkeypatch):
+    assert DealRecognition.recognize(tableau_of(2500), max_deal=3000) == (2500, 52)
+
+    def fail(*args):
+        raise AssertionError(f"block read again: {args}")
+    monkeypatch.setattr(np, "load", fail)
+    monkeypatch.setattr(DealRecognition, "generate_deals", fail)
+    assert DealRecognition.recognize(tableau_of(1234), max_deal=3000) == (1234, 52)
+
+
+def test_recognize_after_a_few_moves(deal_cache):
+    tableau = tableau_of(2500)
+    moved = tableau[0].pop()
+    tableau[1].append(moved)
+    tableau[2].pop()
+    deal, matches = DealRecognition.recognize(tableau, max_deal=3000)
+    assert deal == 2500
+    assert DealRecognition.MIN_MATCHES <= matches < 52
+
+
+def test_recognize_unknown_tableau(deal_cache):
+    tableau = tableau_of(2500)
+    # Rotate the columns: no deal has them in this order.
+    tableau = tableau[1:] + tableau[:1]
+    deal, matches = DealRecognition.recognize(tableau, max_deal=3000)
+    assert deal is None
+    assert matches < DealRecognition.MIN_MATCHES
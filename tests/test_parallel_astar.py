@@ -0,0 +1,35 @@
+import pytest
+
+import DealRecognition
+import SolverStats
+
+# Kings can't all be cleared in 80 moves: every worker has to run out of
+# work for the search to end.
+EXHAUSTED = DealRecognition.deal_encoded_string(11, "k4", 80)
+SOLVABLE = DealRecognition.deal_encoded_string(11, "jd", 50)
+
+
+def result_of(solver_run, board, threads):
+    output = solver_run(board, "-t", str(threads), "-k", "0", timeout=60).stdout
+    stats = SolverStats.parse_stats(output)
+    assert stats["search"] == "parallel_astar"
+    assert stats["threads"] == threads
+    return stats["result"]
+
+
+@pytest.mark.parametrize("threads", [2, 4, 8])
+def test_exhausted_search_terminates(solver_run, threads):
+    # Miscounted work either stops workers while nodes are still queued or
+    # leaves the others waiting forever; repeat to give the race between
+    # handing nodes over and dropping duplicates a chance.
+    for _ in range(5):
+        assert result_of(solver_run, EXHAUSTED, threads) == "unsolved"
+
+
+@pytest.mark.parametrize("threads", [2, 4, 8])
+def test_solution_is_found(solver_run, threads):
+    # A worker that stopped early would take part of the search space with it.
+    for _ in range(3):
+        assert result_of(solver_run, SOLVABLE, threads) == "solved"
+        for path in solver_run.solutions_dir.iterdir():
+            path.unlink()
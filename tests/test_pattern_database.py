@@ -0,0 +1,45 @@
+import re
+
+import CaptureAndSolve
+import SolverStats
+
+# Kings of diamonds and hearts in the first column, the queens of both suits
+# on the foundation, every free cell taken and no empty column.
+KING_ON_QUEEN = "kcqcksqsqh4cqd5sikdkhii6c7ciii8c9civtcjcv6s7svi8s9sviitsjsviii5c"
+# The same with the queen of hearts still on the eighth column.
+KING_BLOCKED = "kcqcksqsjh4cqd5sikdkhii6c7ciii8c9civtcjcv6s7svi8s9sviitsjsviii5cqh"
+
+
+def bound(output):
+    match = re.search(r"Preflight: (?:the challenge needs )?at least (\d+) moves", output)
+    return int(match.group(1))
+
+
+def test_king_follows_its_queen(solver_run, pattern_database):
+    # The king of hearts covering the target goes straight to the foundation:
+    # two moves, which the pattern database must not rule out.
+    output = solver_run(KING_ON_QUEEN + "$kd$2", "-p", pattern_database).stdout
+    assert bound(output) == 2
+    assert SolverStats.parse_stats(output)["result"] == "solved"
+    assert CaptureAndSolve.parse_steps(output) == [
+        "Step 1: Move KH from Tableau 1 to Foundation",
+        "Step 2: Move KD from Tableau 1 to Foundation",
+    ]
+
+
+def test_database_tightens_bound(solver_run, pattern_database):
+    # Here the king has to wait for its queen (or a free cell or column),
+    # which only the pattern database sees.
+    board = KING_BLOCKED + "$kd$2"
+    output = solver_run(board, "-p", "missing.pdb").stdout
+    assert bound(output) == 2
+    assert SolverStats.parse_stats(output)["result"] == "unsolved"
+    output = solver_run(board, "-p", pattern_database).stdout
+    assert bound(output) == 3
+    assert SolverStats.parse_stats(output)["result"] == "infeasible"
+
+    # Once the queen is played the king follows it; the search must not
+    # prune that branch.
+    output = solver_run(KING_BLOCKED + "$kd$3", "-p", pattern_database).stdout
+    assert bound(output) == 3
+    assert SolverStats.parse_stats(output)["result"] == "solved"
@@ -0,0 +1,76 @@
+import CaptureAndSolve
+import DealRecognition
+import SolutionOverlay
+import SolverStats
+
+FOUNDATION_ORDER = "hcds"  # order of the foundation slots in an encoded board
+
+
+def deal_columns(deal):
+    order = DealRecognition.generate_deal(deal)
+    return [[DealRecognition.card_code(c) for c in order[col::8]] for col in range(8)]
+
+
+def encode(reserve, foundation, columns, goal):
+    deck = "".join(reserve + ["00"] * (4 - len(reserve)))
+    deck += "".join(foundation.get(suit, "00") for suit in FOUNDATION_ORDER)
+    for prefix, column in zip(DealRecognition.COLUMN_PREFIXES, columns):
+        deck += prefix + "".join(column)
+    return deck + goal
+
+
+def play(columns, steps):
+    """Plays single card steps from the tableau onto the reserve or the
+    foundation; returns the reserve and foundation tops."""
+    reserve, foundation = [], {}
+    for step in SolutionOverlay.compile_plan(steps):
+        assert step.source_kind == SolutionOverlay.TABLEAU and step.stack_size == 1
+        card = columns[step.source_index].pop()
+        assert card == step.card.lower()
+        if step.dest_kind == SolutionOverlay.RESERVE:
+            reserve.append(card)
+        else:
+            assert step.dest_kind == SolutionOverlay.FOUNDATION
+            foundation[card[1]] = card
+    return reserve, foundation
+
+
+def solve(solver_run, board):
+    output = solver_run(board).stdout
+    return SolverStats.parse_stats(output), CaptureAndSolve.parse_steps(output)
+
+
+def test_board_part_way_through_a_stored_solution(solver_run):
+    board = DealRecognition.deal_encoded_string(11, "jd", 50)
+    stats, steps = solve(solver_run, board)
+    assert stats["result"] == "solved"
+
+    columns = deal_columns(11)
+    reserve, foundation = play(columns, steps[:2])
+    stats, rest = solve(solver_run, encode(reserve, foundation, columns, "$jd$50"))
+    assert (stats["result"], stats["search"]) == ("cached", "solution_index")
+    assert [SolutionOverlay.step_move(s) for s in rest] == \
+        [SolutionOverlay.step_move(s) for s in steps[2:]]
+
+    # Another challenge on the same board is not served from it.
+    stats, _ = solve(solver_run, encode(reserve, foundation, columns, "$jd$1"))
+    assert stats["result"] != "cached"
+
+
+def test_indexing_leaves_the_board_alone(solver_run):
+    # Indexing replays stored decks; the board being solved must come out of
+    # it unchanged, so its preflight bound is the same with and without a
+    # solution to index.
+    board = DealRecognition.deal_encoded_string(5, "k2", 1)
+    before = solver_run(board).stdout
+    assert SolverStats.parse_stats(before)["result"] == "infeasible"
+
+    stats, _ = solve(solver_run, DealRecognition.deal_encoded_string(11, "jd", 50))
+    assert stats["result"] == "solved"
+    # The next run indexes the new solution.
+    assert not (solver_run.solutions_dir / "index").exists()
+
+    after = solver_run(board).stdout
+    preflight = [line for line in before.splitlines() if line.startswith("Preflight")]
+    assert preflight
+    assert [line for line in after.splitlines() if line.startswith("Preflight")] == preflight
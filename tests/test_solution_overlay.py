@@ -0,0 +1,121 @@
+import json
+import os
+
+import CaptureAndSolve
+import SolutionOverlay
+
+STEPS = [
+    "Step 1: Move 5D from Tableau 8 to Reserve",
+    "Step 2 (Automove): Move 1H from Tableau 7 to Foundation",
+    "Step 3 (Automove): Move 2H from Tableau 3 to Foundation",
+    "Step 4: Move stack of 2 cards (QS) from Tableau 4 to Tableau 7 (on KH)",
+    "Step 5: Move 6H from Reserve to Foundation",
+    "Step 6: Move 6S from Tableau 1 to Tableau 8 (empty column)",
+    "Step 7 (Automove): Move 2S from Tableau 1 to Foundation",
+    "Solver gave up",
+]
+
+
+def test_compile_plan():
+    plan = SolutionOverlay.compile_plan(STEPS)
+    assert [step.text for step in plan] == STEPS
+    assert [step.automove for step in plan] == [False, True, True, False, False, False, True, False]
+    # Automoves point at the last step of their run, other steps at themselves.
+    assert [step.group_end for step in plan] == [0, 2, 2, 3, 4, 5, 6, 7]
+
+    reserve, automove, _, stack, from_reserve, empty_column, _, other = plan
+    assert reserve.move == "Move 5D from Tableau 8 to Reserve"
+    assert (reserve.card, reserve.name, reserve.rank, reserve.suit) == ("5D", "Five of Diamonds", 5, "D")
+    assert (reserve.source_kind, reserve.source_index) == (SolutionOverlay.TABLEAU, 7)
+    assert (reserve.dest_kind, reserve.dest_index) == (SolutionOverlay.RESERVE, -1)
+
+    assert automove.move == "Move 1H from Tableau 7 to Foundation"
+    assert (automove.dest_kind, automove.dest_index) == \
+        (SolutionOverlay.FOUNDATION, SolutionOverlay.FOUNDATION_SUITS.index("H"))
+
+    assert (stack.card, stack.rank, stack.stack_size) == ("QS", 12, 2)
+    assert (stack.dest_kind, stack.dest_index, stack.parent) == \
+        (SolutionOverlay.TABLEAU, 6, "King of Hearts")
+
+    assert (from_reserve.source_kind, from_reserve.source_index) == (SolutionOverlay.RESERVE, -1)
+    assert (empty_column.dest_index, empty_column.parent) == (7, None)
+
+    assert other.card is None
+    assert other.move == "Solver gave up"
+
+
+def test_plan_round_trip(tmp_path):
+    steps_file = str(tmp_path / "steps.txt")
+    CaptureAndSolve.write_steps(steps_file, STEPS)
+    assert SolutionOverlay.read_steps(steps_file) == STEPS
+    with open(SolutionOverlay.plan_file_for(steps_file)) as f:
+        saved = json.load(f)
+    assert saved["fields"] == list(SolutionOverlay.PlanStep._fields)
+
+    plan = SolutionOverlay.load_plan(steps_file)
+    assert plan == SolutionOverlay.compile_plan(STEPS)
+    assert all(isinstance(step, SolutionOverlay.PlanStep) for step in plan)
+
+
+def test_load_plan_checks_plan_file(tmp_path):
+    steps_file = str(tmp_path / "steps.txt")
+    CaptureAndSolve.write_steps(steps_file, STEPS)
+    plan_file = SolutionOverlay.plan_file_for(steps_file)
+
+    # A plan written for other steps is not used.
+    with open(steps_file, "w") as f:
+        f.write("\n".join(STEPS[:3]) + "\n")
+    assert SolutionOverlay.load_plan(steps_file) == SolutionOverlay.compile_plan(STEPS[:3])
+
+    # A plan file for the same steps is used as saved (the tampered
+    # group_end shows it was not compiled again)...
+    with open(steps_file, "w") as f:
+        f.write("\n".join(STEPS) + "\n")
+    SolutionOverlay.save_plan(plan_file, SolutionOverlay.compile_plan(STEPS))
+    with open(plan_file) as f:
+        saved = json.load(f)
+    saved["steps"][0][SolutionOverlay.PlanStep._fields.index("group_end")] = 5
+    with open(plan_file, "w") as f:
+        json.dump(saved, f)
+    assert SolutionOverlay.load_plan(steps_file)[0].group_end == 5
+
+    # ...but not one from another version of PlanStep, or a damaged one.
+    saved["fields"] = saved["fields"][:-1]
+    with open(plan_file, "w") as f:
+        json.dump(saved, f)
+    assert SolutionOverlay.load_plan(steps_file) == SolutionOverlay.compile_plan(STEPS)
+
+    with open(plan_file, "w") as f:
+        f.write('{"fields": ')
+    assert SolutionOverlay.load_plan(steps_file) == SolutionOverlay.compile_plan(STEPS)
+
+
+def rewrite_steps(steps_file, steps, overlay):
+    CaptureAndSolve.write_steps(steps_file, steps)
+    # Make the change visible however coarse the file times are.
+    os.utime(steps_file, (overlay.steps_mtime + 1, overlay.steps_mtime + 1))
+
+
+def test_hint_overlay_takes_full_plan(tmp_path):
+    steps_file = str(tmp_path / "steps.txt")
+    CaptureAndSolve.write_steps(steps_file, STEPS[:1])
+    overlay = SolutionOverlay.SolutionOverlay(SolutionOverlay.load_plan(steps_file), steps_file,
+                                              provisional=True)
+    assert overlay.reload_steps() and overlay.provisional
+
+    rewrite_steps(steps_file, STEPS, overlay)
+    assert overlay.reload_steps()
+    assert not overlay.provisional
+    assert overlay.plan == SolutionOverlay.compile_plan(STEPS)
+
+
+def test_hint_overlay_closes_without_full_plan(tmp_path):
+    steps_file = str(tmp_path / "steps.txt")
+    CaptureAndSolve.write_steps(steps_file, STEPS[:1])
+    overlay = SolutionOverlay.SolutionOverlay(SolutionOverlay.load_plan(steps_file), steps_file,
+                                              provisional=True)
+    # The full solve found nothing: the empty plan closes the overlay rather
+    # than leaving it waiting for one.
+    rewrite_steps(steps_file, [], overlay)
+    assert not overlay.reload_steps()
+    assert not overlay.provisional
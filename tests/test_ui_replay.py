@@ -0,0 +1,165 @@
+import json
+import time
+import zlib
+
+import pytest
+
+import CaptureAndSolve
+import DealRecognition
+import UiBackend
+import UiReplay
+
+HANDLE = 4242
+RANK_NAMES = {rank: name for name, rank in CaptureAndSolve.NAME_TO_RANK.items()}
+SUIT_NAMES = {suit: name for name, suit in CaptureAndSolve.NAME_TO_SUIT.items()}
+
+
+def card_name(card):
+    rank, suit = card
+    return f"{RANK_NAMES[rank]} of {SUIT_NAMES[suit]}"
+
+
+def window_tree(tableau, freecells=(), moves=70, goal="Clear 2 Kings"):
+    """Encoded control tree of a Solitaire window showing this board, laid
+    out like the real one: card names on the cards, columns left to right.
+    Runtime ids are stable, the same element keeps its id between trees."""
+    def node(control_type, name, rect, children=(), automation_id=""):
+        return [control_type, name, automation_id, list(rect), [42, zlib.crc32(name.encode())],
+                list(children)]
+
+    columns = []
+    for col, column in enumerate(tableau):
+        left = 100 + col * 120
+        cards = [node("ListItemControl", card_name(card), (left, 300 + row * 30, left + 100, 440 + row * 30))
+                 for row, card in enumerate(column)]
+        columns.append(node("ListControl", f"Column {col + 1}", (left, 300, left + 100, 900), cards))
+    # Read from right to left in the tree, like the game does after a move.
+    columns.reverse()
+
+    free = []
+    for slot in range(4):
+        left = 100 + slot * 120
+        card = freecells[slot] if slot < len(freecells) else None
+        name = card_name(card) if card else f"Empty free cell {slot + 1}"
+        free.append(node("ListItemControl", name, (left, 100, left + 100, 240)))
+    foundation = [node("ListItemControl", f"Empty foundation {i + 1}", (580 + i * 120, 100, 680 + i * 120, 240))
+                  for i in range(4)]
+
+    return node("WindowControl", "Solitaire & Casual Games", (0, 0, 1200, 1000), [
+        node("TextControl", goal, (20, 20, 300, 40)),
+        node("TextControl", f"Moves: {moves}", (320, 20, 420, 40)),
+        node("GroupControl", "Free cells", (100, 100, 580, 240), free, "Group_Free"),
+        node("GroupControl", "Foundation", (580, 100, 1060, 240), foundation, "Group_Foundation"),
+        node("GroupControl", "Tableau", (100, 300, 1060, 900), columns, "Group_Tableau"),
+    ])
+
+
+def write_recording(path, roots):
+    with UiReplay.open_recording(str(path), "w") as f:
+        f.write(json.dumps({"format": UiReplay.RECORDING_FORMAT,
+                            "version": UiReplay.RECORDING_VERSION, "scale_factor": 1.5}) + "\n")
+        for i, root in enumerate(roots):
+            f.write(json.dumps({"t": i * 0.5, "minimized": False, "handle": HANDLE, "root": root}) + "\n")
+
+
+def deal_tableau(deal):
+    order = DealRecognition.generate_deal(deal)
+    return [[(c // 4 + 1, DealRecognition.DEAL_SUITS[c % 4]) for c in order[col::8]]
+            for col in range(8)]
+
+
+@pytest.fixture
+def use_backend(monkeypatch):
+    """Installs a backend for the test, with fresh board captures."""
+    monkeypatch.setattr(CaptureAndSolve, "board_captures", {})
+
+    def install(backend):
+        monkeypatch.setattr(UiBackend, "_auto", backend)
+        return backend
+    return install
+
+
+@pytest.mark.parametrize("suffix", [".jsonl", ".jsonl.gz"])
+def test_replay_scrapes_recorded_board(tmp_path, use_backend, suffix):
+    tableau = deal_tableau(617)
+    # The second snapshot: the top card of the first column went to a free cell.
+    moved = [list(column) for column in tableau]
+    card = moved[0].pop()
+    path = tmp_path / ("board" + suffix)
+    write_recording(path, [window_tree(tableau), window_tree(moved, freecells=[card])])
+    backend = use_backend(UiReplay.ReplayBackend(str(path)))
+    assert len(backend) == 2
+    assert UiBackend.get_scale_factor() == 1.5
+    assert CaptureAndSolve.find_windows() == [HANDLE]
+
+    state = CaptureAndSolve.scrape_game_state()
+    assert CaptureAndSolve.generate_encoded_string(state) == \
+        DealRecognition.deal_encoded_string(617, "k2", 70)
+
+    assert backend.next_snapshot()
+    assert not backend.next_snapshot()
+    state = CaptureAndSolve.scrape_game_state(CaptureAndSolve.get_window(HANDLE))
+    assert state["freecells"] == [card, None, None, None]
+    assert state["tableau"] == moved
+    # Only the column that changed was read again.
+    capture = CaptureAndSolve.board_captures[HANDLE]
+    assert capture.fresh == {"freecells", "foundation", ("column", 0)}
+
+
+def test_replay_counts_calls_and_adds_latency(tmp_path, use_backend):
+    path = tmp_path / "board.jsonl"
+    write_recording(path, [window_tree(deal_tableau(1))])
+    backend = use_backend(UiReplay.ReplayBackend(str(path), latency_ms={"GetChildren": 2.0}))
+    start = time.perf_counter()
+    assert CaptureAndSolve.scrape_game_state() is not None
+    seconds = time.perf_counter() - start
+    assert backend.calls["GetChildren"] >= 8
+    assert backend.calls["Name"] >= 52
+    assert seconds >= backend.calls["GetChildren"] * 0.002
+
+
+def test_replay_missing_control(tmp_path, use_backend):
+    path = tmp_path / "board.jsonl"
+    write_recording(path, [window_tree(deal_tableau(1))])
+    backend = use_backend(UiReplay.ReplayBackend(str(path)))
+    window = backend.WindowControl(searchDepth=1, RegexName=".*Solitaire.*")
+    assert window.Exists(0, 0)
+    missing = window.GroupControl(AutomationId="Group_Stock")
+    assert not missing.Exists(0, 0)
+    with pytest.raises(LookupError):
+        missing.GetChildren()
+    assert backend.ControlFromHandle(HANDLE + 1) is None
+
+
+def test_record_replay_round_trip(tmp_path, use_backend):
+    source = tmp_path / "source.jsonl"
+    roots = [window_tree(deal_tableau(1)), window_tree(deal_tableau(2))]
+    write_recording(source, roots)
+    # The recorder reads IsMinimize first on every pass; step to the next
+    # tree there, so each pass sees one whole tree.
+    class SteppingBackend(UiReplay.ReplayBackend):
+        def call(self, name):
+            if name == "IsMinimize" and self.calls[name]:
+                self.next_snapshot()
+            super().call(name)
+
+    use_backend(SteppingBackend(str(source)))
+
+    # Recording the replayed window writes one snapshot per distinct tree.
+    copy = tmp_path / "copy.jsonl.gz"
+    assert UiReplay.record(str(copy), interval=0, duration=0.05) == 2
+    replayed = UiReplay.ReplayBackend(str(copy))
+    assert replayed.scale_factor == 1.5
+    assert [record["root"] for record in replayed.records] == roots
+    assert all(record["handle"] == HANDLE for record in replayed.records)
+    assert replayed.times[0] <= replayed.times[1]
+
+
+def test_replay_rejects_other_files(tmp_path):
+    path = tmp_path / "other.jsonl"
+    path.write_text(json.dumps({"format": "something-else"}) + "\n")
+    with pytest.raises(ValueError):
+        UiReplay.ReplayBackend(str(path))
+    write_recording(path, [])
+    with pytest.raises(ValueError):
+        UiReplay.ReplayBackend(str(path))